@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner for weekly Dumroo reports
+Runs every question for every admin user: SQL is generated once per question,
+then RBAC scoping and execution fan out across a process pool.
+
+Usage:
+    python batch_report.py --questions questions.txt --output-dir reports/
+    python batch_report.py --users priya_sharma teacher_grade7b --format parquet --workers 8
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence
+
+from columnar import ARROW_AVAILABLE, EXPORT_FORMATS, export_frame
+from permissions import PermissionRegistry
+
+# Per-process state, created once by the pool initializer
+_WORKER: Dict = {}
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty sequence"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def load_questions(path: Optional[str]) -> List[str]:
+    """Questions from a .txt (one per line, # comments) or .json list; defaults to the sample set"""
+    if not path:
+        from dumroo_advanced_app import AdvancedDumrooNL2SQL
+        return AdvancedDumrooNL2SQL.get_sample_questions()
+    with open(path, encoding='utf-8') as handle:
+        if path.endswith('.json'):
+            return [str(q) for q in json.load(handle)]
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith('#')]
+
+
+def _slug(text: str, limit: int = 48) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')[:limit] or 'question'
+
+
+def build_system(db_path: str, admin_users_path: str):
+    """An engine on the batch's own database and users (not the shared query service's)"""
+    from dumroo_advanced_app import AdvancedDumrooNL2SQL
+    return AdvancedDumrooNL2SQL(db_path, admin_users_path=admin_users_path)
+
+
+def _init_worker(db_path: str, admin_users_path: str):
+    """Build this worker's engine: catalog, RBAC, cost guard, rollup routing and one pooled connection"""
+    _WORKER['system'] = build_system(db_path, admin_users_path)
+
+
+def run_task(task: Dict) -> Dict:
+    """Scope, execute and write one (user, question) result; never raises
+
+    Runs through the same rollup routing, RBAC, cost guard and row cap as
+    the app, so a report matches what the user would see there.
+    """
+    record = {key: task[key] for key in ('user', 'question_id', 'question', 'generation_ms')}
+    record.update(rows=0, file=None, error=None)
+    start = time.perf_counter()
+    try:
+        system = _WORKER['system']
+        run_sql, rollup = system.route_query(task['sql_query'])
+        secured = system.secure_query(run_sql, task['user'], task['params'])
+        if secured is None:
+            raise ValueError(f"unknown user {task['user']}")
+        rbac_done = time.perf_counter()
+
+        guard = system.guard_query(secured)
+        frame = system._execute_secured(secured, run_sql, guard=guard, username=task['user'])[0]
+        exec_done = time.perf_counter()
+
+        os.makedirs(os.path.dirname(task['output_path']), exist_ok=True)
+        if task['format'] == 'csv':
+            frame.to_csv(task['output_path'], index=False)
+        elif ARROW_AVAILABLE:
+            with open(task['output_path'], 'wb') as f:
+                f.write(export_frame(frame, task['format']))
+        else:
+            frame.to_parquet(task['output_path'], index=False)
+        write_done = time.perf_counter()
+
+        record.update(
+            rows=len(frame),
+            file=task['output_path'],
+            sql_query=secured.display_sql,
+            rollup=rollup,
+            truncated=guard.truncated,
+            rbac_ms=(rbac_done - start) * 1000,
+            execution_ms=(exec_done - rbac_done) * 1000,
+            write_ms=(write_done - exec_done) * 1000,
+        )
+    except Exception as e:
+        record['error'] = str(e)
+    record['task_ms'] = (time.perf_counter() - start) * 1000
+    return record
+
+
+def generate_sql_for_questions(system, questions: List[str]) -> List[Dict]:
+    """Generate raw SQL once per question; only the RBAC scope differs between users"""
+    generated = []
+    for question in questions:
+        start = time.perf_counter()
+        result = system.generate_sql(question)
+        result['generation_ms'] = (time.perf_counter() - start) * 1000
+        generated.append(result)
+        status = "❌ " + result['error'] if 'error' in result else (
+            "⚡ cached" if result.get('cache_hit') else f"✅ {result['mode']}")
+        print(f"{status} ({result['generation_ms']:.0f} ms): {question}")
+    return generated
+
+
+def run_batch(questions: List[str], users: List[str], output_dir: str, db_path: str,
+              admin_users_path: str, fmt: str = 'csv', workers: Optional[int] = None) -> Dict:
+    """Run questions x users, write results and a JSONL manifest; returns the summary"""
+    if fmt == 'parquet' and not (importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet')):
+        print("⚠️ Parquet needs pyarrow or fastparquet; writing CSV instead")
+        fmt = 'csv'
+    if fmt == 'arrow' and not ARROW_AVAILABLE:
+        print("⚠️ Arrow IPC needs pyarrow; writing CSV instead")
+        fmt = 'csv'
+
+    os.makedirs(output_dir, exist_ok=True)
+    batch_start = time.perf_counter()
+    system = build_system(db_path, admin_users_path)
+    try:
+        generated = generate_sql_for_questions(system, questions)
+    finally:
+        system.executor.close()
+
+    tasks, records = [], []
+    for question_id, (question, gen) in enumerate(zip(questions, generated), start=1):
+        for user in users:
+            if 'error' in gen:
+                records.append({'user': user, 'question_id': question_id, 'question': question,
+                                'generation_ms': gen['generation_ms'], 'rows': 0, 'file': None,
+                                'error': gen['error'], 'task_ms': 0.0})
+                continue
+            file_name = f"q{question_id:02d}_{_slug(question)}{os.path.splitext(EXPORT_FORMATS[fmt][0])[1]}"
+            tasks.append({
+                'user': user, 'question_id': question_id, 'question': question,
+                'sql_query': gen['sql_query'], 'params': gen['params'], 'generation_ms': gen['generation_ms'],
+                'output_path': os.path.join(output_dir, user, file_name), 'format': fmt,
+            })
+
+    fanout_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(db_path, admin_users_path)) as pool:
+        futures = [pool.submit(run_task, task) for task in tasks]
+        for future in as_completed(futures):
+            records.append(future.result())
+    fanout_seconds = time.perf_counter() - fanout_start
+    total_seconds = time.perf_counter() - batch_start
+
+    records.sort(key=lambda r: (r['user'], r['question_id']))
+    manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+    with open(manifest_path, 'w', encoding='utf-8') as handle:
+        for record in records:
+            handle.write(json.dumps(record, default=str) + '\n')
+
+    latencies = [r['task_ms'] for r in records if not r['error']]
+    summary = {
+        'questions': len(questions),
+        'users': len(users),
+        'queries': len(records),
+        'failed': sum(1 for r in records if r['error']),
+        'workers': workers or os.cpu_count(),
+        'total_seconds': total_seconds,
+        'fanout_seconds': fanout_seconds,
+        'throughput_qps': len(tasks) / fanout_seconds if fanout_seconds else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else 0.0,
+        },
+        'manifest': manifest_path,
+    }
+    with open(os.path.join(output_dir, 'summary.json'), 'w', encoding='utf-8') as handle:
+        json.dump(summary, handle, indent=2)
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run report questions for many admin users")
+    parser.add_argument('--questions', help="questions file (.txt one per line, or .json list); "
+                                            "defaults to the sample questions")
+    parser.add_argument('--users', nargs='+', help="usernames to run for (default: every admin user)")
+    parser.add_argument('--admin-users', default=os.getenv('ADMIN_USERS_PATH', 'data/admin_users.csv'),
+                        help="admin users CSV (default: %(default)s)")
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'dumroo_education.db'),
+                        help="SQLite database (default: %(default)s)")
+    parser.add_argument('--output-dir', default='reports', help="where results and manifest.jsonl go")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--workers', type=int, help="process pool size (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    questions = load_questions(args.questions)
+    registry = PermissionRegistry(args.admin_users)
+    users = args.users or [user.username for user in registry.users()]
+    unknown = [user for user in users if user not in registry]
+    if unknown:
+        print(f"❌ Unknown users: {', '.join(unknown)}")
+        return 1
+
+    summary = run_batch(questions, users, args.output_dir, args.db, args.admin_users,
+                        fmt=args.format, workers=args.workers)
+
+    latency = summary['latency_ms']
+    print(f"\n🎉 {summary['queries']} queries ({summary['failed']} failed) in {summary['total_seconds']:.2f}s")
+    print(f"   Throughput: {summary['throughput_qps']:.1f} queries/s across {summary['workers']} workers")
+    print(f"   Latency ms: p50 {latency['p50']:.1f} | p95 {latency['p95']:.1f} | "
+          f"p99 {latency['p99']:.1f} | max {latency['max']:.1f}")
+    print(f"   Manifest: {summary['manifest']}")
+    return 0 if summary['failed'] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
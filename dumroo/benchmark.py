@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the Dumroo NL2SQL system
+Drives query_natural_language for a fixed question corpus and every admin user
+through the LangChain path (backed by a fake chat model with configurable
+latency, so no Gemini key is needed) and the basic path, at several
+concurrency levels. Reports p50/p95/p99 per stage (from each result's
+timings_ms) and throughput, and saves JSON that can be compared across commits.
+
+Usage:
+    python benchmark.py                                   # both paths, concurrency 1 4 16
+    python benchmark.py --paths langchain --llm-latency-ms 800 --concurrency 1 8 32
+    python benchmark.py --compare benchmark_results/previous.json --fail-on-regression 20
+    python benchmark.py --paths langchain --no-intents --token-ms 20 --explanation-words 150 [--no-streaming]
+    python benchmark.py --paths langchain --no-intents --models flash:300:0:0.1:4000 pro:700   # hedging/failover
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import codecs
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from batch_report import percentile
+from query_cache import NLQueryCache, normalize_question
+
+# Question corpus with the SQL the fake chat model answers for each one
+CORPUS: Dict[str, str] = {
+    "Which students haven't submitted their homework yet?":
+        "SELECT DISTINCT s.student_name, s.grade, s.section, h.title, h.due_date FROM students s "
+        "JOIN submissions sub ON s.student_id = sub.student_id JOIN homework h ON sub.homework_id = h.homework_id "
+        "WHERE sub.is_submitted = 0",
+    "Show performance summary by grade":
+        "SELECT s.grade, AVG(p.percentage) AS avg_percentage, COUNT(*) AS assessments FROM performance p "
+        "JOIN students s ON p.student_id = s.student_id GROUP BY s.grade",
+    "Which students have low attendance?":
+        "SELECT student_name, grade, section, attendance_percentage FROM students WHERE attendance_percentage < 80",
+    "List upcoming quizzes":
+        "SELECT quiz_title, subject, grade, section, scheduled_date FROM quizzes WHERE scheduled_date >= date('now')",
+    "Top 10 students in Mathematics":
+        "SELECT s.student_name, AVG(p.percentage) AS avg_percentage FROM performance p JOIN students s "
+        "ON p.student_id = s.student_id WHERE p.subject = 'Mathematics' GROUP BY s.student_id "
+        "ORDER BY avg_percentage DESC LIMIT 10",
+    "Which students submitted homework late in Science?":
+        "SELECT s.student_name, h.title, sub.submitted_date FROM submissions sub JOIN students s "
+        "ON sub.student_id = s.student_id JOIN homework h ON sub.homework_id = h.homework_id "
+        "WHERE sub.is_late = 1 AND h.subject = 'Science'",
+    "Show all students":
+        "SELECT * FROM students",
+    "Compare average homework marks between regions":
+        "SELECT s.region, AVG(sub.marks_obtained * 100.0 / sub.total_marks) AS avg_marks FROM submissions sub "
+        "JOIN students s ON sub.student_id = s.student_id WHERE sub.is_submitted = 1 GROUP BY s.region",
+    "Which homework assignments have the lowest submission rate?":
+        "SELECT h.title, h.subject, AVG(sub.is_submitted) AS submission_rate FROM homework h "
+        "JOIN submissions sub ON h.homework_id = sub.homework_id GROUP BY h.homework_id "
+        "ORDER BY submission_rate LIMIT 10",
+    "How many quizzes are scheduled per subject?":
+        "SELECT subject, COUNT(*) AS quizzes FROM quizzes GROUP BY subject",
+}
+
+# Stages as reported in the result's timings_ms
+STAGES = ('permissions', 'intent', 'schema', 'cache', 'llm', 'route', 'rbac', 'guard', 'result_cache', 'sqlite',
+          'scatter', 'merge', 'dataframe', 'total')
+
+
+class FakeChatModel:
+    """Stand-in for the LangChain SQL chain: canned SQL after a simulated delay
+
+    Latency is latency_ms +/- jitter_ms (uniform, seeded) to the first token,
+    then token_ms per whitespace-separated token; a tail_rate share of calls
+    takes tail_ms instead, and an error_rate share fails after the latency.
+    Replies use the "SQLQuery: ...;" shape so clean_generated_sql and the
+    streaming extractor are exercised as in production; explanation_words
+    appends the kind of prose verbose models add after the SQL.
+    """
+
+    def __init__(self, responses: Dict[str, str], latency_ms: float = 300.0, jitter_ms: float = 50.0,
+                 default_sql: str = "SELECT * FROM students LIMIT 20", seed: int = 42,
+                 token_ms: float = 0.0, explanation_words: int = 0, error_rate: float = 0.0,
+                 tail_rate: float = 0.0, tail_ms: float = 0.0):
+        self.responses = {normalize_question(q): sql for q, sql in responses.items()}
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.default_sql = default_sql
+        self.token_ms = token_ms
+        self.explanation_words = explanation_words
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.calls = 0
+        self.errors = 0
+        self.tokens_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _reply(self, inputs: Dict):
+        """(reply, seconds to first token, whether this call fails)"""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            if self._random.random() < self.tail_rate:
+                delay = self.tail_ms / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        sql = self.responses.get(normalize_question(inputs["question"]), self.default_sql)
+        reply = f"SQLQuery: {sql};"
+        if self.explanation_words:
+            words = "this query joins the tables it needs and keeps the rows in scope".split()
+            reply += "\n\nExplanation: " + " ".join(words[i % len(words)] for i in range(self.explanation_words))
+        return reply, delay, failed
+
+    def _tokens(self, reply: str) -> List[str]:
+        return re.findall(r'\s*\S+', reply)
+
+    def _count(self, tokens: int):
+        with self._lock:
+            self.tokens_sent += tokens
+
+    def invoke(self, inputs: Dict, config=None) -> str:
+        reply, delay, failed = self._reply(inputs)
+        tokens = self._tokens(reply)
+        time.sleep(delay)
+        _raise_if(failed)
+        time.sleep(len(tokens) * self.token_ms / 1000)
+        self._count(len(tokens))
+        return reply
+
+    async def ainvoke(self, inputs: Dict, config=None) -> str:
+        reply, delay, failed = self._reply(inputs)
+        tokens = self._tokens(reply)
+        await asyncio.sleep(delay)
+        _raise_if(failed)
+        await asyncio.sleep(len(tokens) * self.token_ms / 1000)
+        self._count(len(tokens))
+        return reply
+
+    def stream(self, inputs: Dict, config=None):
+        reply, delay, failed = self._reply(inputs)
+        time.sleep(delay)
+        _raise_if(failed)
+        for token in self._tokens(reply):
+            time.sleep(self.token_ms / 1000)
+            self._count(1)
+            yield token
+
+    async def astream(self, inputs: Dict, config=None):
+        reply, delay, failed = self._reply(inputs)
+        await asyncio.sleep(delay)
+        _raise_if(failed)
+        for token in self._tokens(reply):
+            await asyncio.sleep(self.token_ms / 1000)
+            self._count(1)
+            yield token
+
+
+def _raise_if(failed: bool):
+    if failed:
+        raise RuntimeError("503 Service Unavailable: injected model error")
+
+
+class FakeChatServer:
+    """Local HTTP chat-model server: one FakeChatModel per model name, faults adjustable while running
+
+    POST /models/<name>/generate   {"question": ...}  -> reply tokens, written and flushed one at a time
+    POST /models/<name>/configure  {"latency_ms": ..., "error_rate": ..., "tail_rate": ...}
+    A client that disconnects mid-reply stops the stream, as a cancelled API call would.
+    """
+
+    def __init__(self, models: Dict[str, FakeChatModel], host: str = '127.0.0.1', port: int = 0):
+        self.models = models
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                parts = self.path.strip('/').split('/')
+                model = server.models.get(parts[1]) if len(parts) == 3 and parts[0] == 'models' else None
+                if model is None:
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if parts[2] == 'configure':
+                    server.configure(parts[1], **body)
+                    self.send_response(204)
+                    self.end_headers()
+                elif parts[2] == 'generate':
+                    self._generate(model, body)
+                else:
+                    self.send_error(404)
+
+            def _generate(self, model: FakeChatModel, inputs: Dict):
+                reply, delay, failed = model._reply(inputs)
+                time.sleep(delay)
+                if failed:
+                    self.send_error(503, "injected model error")
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.end_headers()
+                try:
+                    for token in model._tokens(reply):
+                        time.sleep(model.token_ms / 1000)
+                        self.wfile.write(token.encode('utf-8'))
+                        self.wfile.flush()
+                        model._count(1)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass    # client cancelled
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256    # hedges double the connection bursts
+
+        self.httpd = Server((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, name='fake-chat-server', daemon=True).start()
+
+    def configure(self, name: str, **settings):
+        """Change a model's latency_ms, jitter_ms, token_ms, error_rate, tail_rate or tail_ms"""
+        model = self.models[name]
+        with model._lock:
+            for key, value in settings.items():
+                if key not in ('latency_ms', 'jitter_ms', 'token_ms', 'error_rate', 'tail_rate', 'tail_ms'):
+                    raise ValueError(f"unknown setting {key}")
+                setattr(model, key, float(value))
+
+    def client(self, name: str) -> 'HttpChatModel':
+        return HttpChatModel(self.url, name)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class HttpChatModel:
+    """Chain stand-in that calls a FakeChatServer model over HTTP (invoke/stream and async variants)"""
+
+    def __init__(self, base_url: str, model: str, timeout_s: float = 60.0):
+        self.url = f"{base_url}/models/{model}/generate"
+        self.model = model
+        self.timeout_s = timeout_s
+
+    @staticmethod
+    def _payload(inputs: Dict) -> bytes:
+        return json.dumps({'question': inputs['question']}).encode('utf-8')
+
+    def _open(self, inputs: Dict):
+        payload = self._payload(inputs)
+        request = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout_s)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{self.model}: HTTP {e.code} {e.reason}") from None
+
+    def invoke(self, inputs: Dict, config=None) -> str:
+        with self._open(inputs) as response:
+            return response.read().decode('utf-8')
+
+    def stream(self, inputs: Dict, config=None):
+        response = self._open(inputs)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            while True:
+                chunk = response.read1(1024)
+                if not chunk:
+                    break
+                yield decoder.decode(chunk)
+        finally:
+            response.close()    # disconnects, which stops the server's stream
+
+    async def ainvoke(self, inputs: Dict, config=None) -> str:
+        return ''.join([chunk async for chunk in self.astream(inputs)])
+
+    async def astream(self, inputs: Dict, config=None):
+        # Plain asyncio streams, so a cancelled task closes the socket without tying up a thread
+        url = urllib.parse.urlsplit(self.url)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(url.hostname, url.port), self.timeout_s)
+        try:
+            payload = self._payload(inputs)
+            writer.write(f"POST {url.path} HTTP/1.0\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\n\r\n".encode('latin-1') + payload)
+            await writer.drain()
+            status = (await reader.readline()).decode('latin-1').split(' ', 2)
+            while (await reader.readline()).strip():
+                pass    # headers
+            if len(status) < 2 or status[1] != '200':
+                raise RuntimeError(f"{self.model}: HTTP {' '.join(status[1:]).strip() or 'no response'}")
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            while True:
+                chunk = await reader.read(1024)
+                if not chunk:
+                    break
+                yield decoder.decode(chunk)
+        finally:
+            writer.close()
+
+
+def parse_model_spec(spec: str) -> Dict:
+    """NAME[:LATENCY_MS[:ERROR_RATE[:TAIL_RATE[:TAIL_MS]]]] -> FakeChatModel settings"""
+    name, *values = spec.split(':')
+    keys = ('latency_ms', 'error_rate', 'tail_rate', 'tail_ms')
+    return {'name': name, **{key: float(value) for key, value in zip(keys, values) if value != ''}}
+
+
+def _summarize(values: List[float]) -> Dict:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'max': max(values) if values else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_system(path: str, fake_model: Optional[FakeChatModel], cache_dir: str, use_intents: bool,
+                 streaming: bool = True, server: Optional[FakeChatServer] = None):
+    """A fresh system wired for one benchmark path"""
+    from dumroo_advanced_app import AdvancedDumrooNL2SQL
+
+    system = AdvancedDumrooNL2SQL()
+    system.query_cache = NLQueryCache(os.path.join(cache_dir, f'{path}_nl2sql_cache.db'))
+    if path == 'langchain' and server is not None:
+        system.attach_models([(name, server.client(name)) for name in server.models])
+    elif path == 'langchain':
+        system.attach_query_chain(fake_model)
+    else:
+        # Basic mode even when LangChain and an API key are present: never build the real models
+        system._llm_init_attempted = True
+    if not use_intents:
+        system.intent_threshold = float('inf')
+    system.llm_streaming = streaming
+    return system
+
+
+def run_level(system, tasks: List[tuple], concurrency: int, page_size: Optional[int]) -> Dict:
+    """Run every (question, user) task with `concurrency` threads; returns the run summary"""
+    system.query_cache.invalidate()
+    system.result_cache.clear()
+    system.rbac_engine.clear()
+    samples, errors = [], []
+    local_answers = cache_hits = result_cache_hits = rollup_answers = 0
+    lock = threading.Lock()
+
+    def run_one(task):
+        nonlocal local_answers, cache_hits, result_cache_hits, rollup_answers
+        question, user = task
+        result = system.query_natural_language(question, user, page_size=page_size)
+        with lock:
+            samples.append(result.get('timings_ms', {}))
+            if 'error' in result:
+                errors.append(result['error'])
+            if result.get('intent'):
+                local_answers += 1
+            if result.get('cache_hit'):
+                cache_hits += 1
+            if result.get('result_cache_hit'):
+                result_cache_hits += 1
+            if result.get('rollup'):
+                rollup_answers += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_one, tasks))
+    seconds = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'queries': len(tasks),
+        'errors': len(errors),
+        'error_examples': sorted(set(errors))[:3],
+        'seconds': seconds,
+        'throughput_qps': len(tasks) / seconds if seconds else 0.0,
+        'local_answers': local_answers,
+        'cache_hits': cache_hits,
+        'result_cache_hits': result_cache_hits,
+        'rollup_answers': rollup_answers,
+        'stages_ms': {stage: _summarize([s[stage] for s in samples if stage in s]) for stage in STAGES},
+    }
+
+
+def run_benchmark(paths: Sequence[str], concurrency_levels: Sequence[int], llm_latency_ms: float,
+                  llm_jitter_ms: float, page_size: Optional[int], use_intents: bool = True,
+                  users: Optional[List[str]] = None, questions: Optional[List[str]] = None,
+                  token_ms: float = 0.0, explanation_words: int = 0, streaming: bool = True,
+                  model_specs: Optional[List[Dict]] = None) -> Dict:
+    """Benchmark each path at each concurrency level
+
+    With model_specs the LangChain path talks HTTP to a local FakeChatServer
+    with one model per spec, routed (hedged, failed over) in spec order.
+    """
+    questions = questions or list(CORPUS)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': os.getenv('DATABASE_PATH', 'dumroo_education.db'),
+            'questions': len(questions),
+            'llm_latency_ms': llm_latency_ms,
+            'llm_jitter_ms': llm_jitter_ms,
+            'llm_token_ms': token_ms,
+            'llm_explanation_words': explanation_words,
+            'llm_streaming': streaming,
+            'page_size': page_size,
+            'intents_enabled': use_intents,
+            'models': model_specs,
+        },
+        'runs': [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix='dumroo_bench_') as cache_dir:
+        for path in paths:
+            fake_model = FakeChatModel(CORPUS, latency_ms=llm_latency_ms, jitter_ms=llm_jitter_ms,
+                                       token_ms=token_ms, explanation_words=explanation_words)
+            server = None
+            if model_specs and path == 'langchain':
+                models = {}
+                for i, spec in enumerate(model_specs):
+                    settings = {'latency_ms': llm_latency_ms, 'jitter_ms': llm_jitter_ms, 'token_ms': token_ms,
+                                'explanation_words': explanation_words, 'seed': 42 + i}
+                    settings.update((key, value) for key, value in spec.items() if key != 'name')
+                    models[spec['name']] = FakeChatModel(CORPUS, **settings)
+                server = FakeChatServer(models)
+                fakes = list(server.models.values())
+            else:
+                fakes = [fake_model]
+            system = build_system(path, fake_model, cache_dir, use_intents, streaming, server)
+            run_users = users or [user.username for user in system.permission_registry.users()]
+            report['meta']['users'] = len(run_users)
+            tasks = [(question, user) for user in run_users for question in questions]
+
+            for concurrency in concurrency_levels:
+                calls_before = sum(fake.calls for fake in fakes)
+                tokens_before = sum(fake.tokens_sent for fake in fakes)
+                run = run_level(system, tasks, concurrency, page_size)
+                run['path'] = path
+                run['llm_calls'] = sum(fake.calls for fake in fakes) - calls_before
+                run['llm_tokens'] = sum(fake.tokens_sent for fake in fakes) - tokens_before
+                if server is not None:
+                    run['models'] = system.model_router.stats()
+                report['runs'].append(run)
+                total = run['stages_ms']['total']
+                print(f"✅ {path:9} x{concurrency:<3} {run['queries']} queries in {run['seconds']:.2f}s "
+                      f"({run['throughput_qps']:.1f} q/s) | p50 {total['p50']:.1f} p95 {total['p95']:.1f} "
+                      f"p99 {total['p99']:.1f} ms | local {run['local_answers']} | rollup {run['rollup_answers']} "
+                      f"| result cache {run['result_cache_hits']} | llm calls {run['llm_calls']}"
+                      + (f" | ❌ {run['errors']} errors" if run['errors'] else ""))
+                if server is not None:
+                    routing = run['models']
+                    print(f"   🔀 hedged {routing['hedges']} (hedge won {routing['hedge_wins']}) | " + " | ".join(
+                        f"{name} {stats['state']} err {stats['error_rate']:.0%} p95 {stats['p95_ms'] or 0:.0f} ms"
+                        for name, stats in routing['models'].items()))
+            if server is not None:
+                server.close()
+    return report
+
+
+def print_report(report: Dict):
+    for run in report['runs']:
+        print(f"\n📊 {run['path']} @ concurrency {run['concurrency']}: {run['throughput_qps']:.1f} q/s")
+        print(f"   {'stage':<11}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+        for stage in STAGES:
+            stats = run['stages_ms'][stage]
+            if stats['count']:
+                print(f"   {stage:<11}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}{stats['max']:>9.2f}")
+
+
+def compare_reports(baseline: Dict, current: Dict, tolerance_pct: Optional[float] = None) -> bool:
+    """Print throughput and p95 deltas per (path, concurrency); False if any exceeds tolerance"""
+    previous = {(run['path'], run['concurrency']): run for run in baseline.get('runs', [])}
+    ok = True
+    print(f"\n🔍 Against {baseline['meta'].get('git_commit') or 'baseline'} ({baseline['meta'].get('timestamp')}):")
+    for run in current['runs']:
+        old = previous.get((run['path'], run['concurrency']))
+        if old is None:
+            continue
+        qps_delta = (run['throughput_qps'] / old['throughput_qps'] - 1) * 100 if old['throughput_qps'] else 0.0
+        old_p95, new_p95 = old['stages_ms']['total']['p95'], run['stages_ms']['total']['p95']
+        p95_delta = (new_p95 / old_p95 - 1) * 100 if old_p95 else 0.0
+        regressed = tolerance_pct is not None and (qps_delta < -tolerance_pct or p95_delta > tolerance_pct)
+        ok = ok and not regressed
+        print(f"   {'❌' if regressed else '✅'} {run['path']:9} x{run['concurrency']:<3} "
+              f"throughput {qps_delta:+.1f}% | p95 {old_p95:.1f} -> {new_p95:.1f} ms ({p95_delta:+.1f}%)")
+    return ok
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the NL2SQL pipeline with a fake chat model")
+    parser.add_argument('--paths', nargs='+', choices=['langchain', 'basic'], default=['langchain', 'basic'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0, help="fake model latency per call")
+    parser.add_argument('--llm-jitter-ms', type=float, default=50.0)
+    parser.add_argument('--token-ms', type=float, default=0.0, help="fake model time per output token")
+    parser.add_argument('--explanation-words', type=int, default=0,
+                        help="prose the fake model appends after the SQL")
+    parser.add_argument('--no-streaming', action='store_true', help="wait for the whole reply instead of streaming")
+    parser.add_argument('--models', nargs='+', metavar='NAME[:LATENCY_MS[:ERROR_RATE[:TAIL_RATE[:TAIL_MS]]]]',
+                        help="serve these fake models over local HTTP and route between them (hedging, failover)")
+    parser.add_argument('--page-size', type=int, default=int(os.getenv('RESULT_PAGE_SIZE', '500')),
+                        help="result page size as in the UI; 0 fetches full results")
+    parser.add_argument('--no-intents', action='store_true', help="send every question to the (fake) LLM")
+    parser.add_argument('--users', nargs='+', help="usernames to run for (default: every admin user)")
+    parser.add_argument('--output', help="JSON results path (default: benchmark_results/<timestamp>_<commit>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    parser.add_argument('--fail-on-regression', type=float, metavar='PCT',
+                        help="exit 3 if throughput drops or p95 rises by more than PCT percent")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.paths, args.concurrency, args.llm_latency_ms, args.llm_jitter_ms,
+                           args.page_size or None, use_intents=not args.no_intents, users=args.users,
+                           token_ms=args.token_ms, explanation_words=args.explanation_words,
+                           streaming=not args.no_streaming,
+                           model_specs=[parse_model_spec(spec) for spec in args.models or []] or None)
+    print_report(report)
+
+    output = args.output or os.path.join(
+        'benchmark_results',
+        f"{time.strftime('%Y%m%d_%H%M%S')}_{report['meta']['git_commit'] or 'nogit'}.json"
+    )
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        if not compare_reports(baseline, report, args.fail_on_regression):
+            return 3
+    return 0 if all(run['errors'] == 0 for run in report['runs']) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
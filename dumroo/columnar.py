@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Typed, columnar results for the Dumroo NL2SQL system
+Builds DataFrames column by column from SQLite rows with compact dtypes chosen
+from the schema catalog's declared types and the values themselves:
+dictionary-encoded categoricals for low-cardinality text (grade, section,
+region, subject, ...), nullable booleans for 0/1 flags, NumPy integers and
+floats, and Arrow-backed strings. Also writes results as Parquet or Arrow IPC
+(pyarrow is optional; without it only CSV export is offered).
+"""
+
+import os
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:      # pragma: no cover - pyarrow ships with streamlit
+    pa = pq = None
+    ARROW_AVAILABLE = False
+
+TYPED_RESULTS = os.getenv('TYPED_RESULTS', '1') != '0'
+
+# Text columns that are always dictionary-encoded
+CATEGORY_COLUMNS = {'grade', 'section', 'region', 'subject', 'assessment_type', 'grade_letter', 'role'}
+# Other text columns are dictionary-encoded when they repeat this much (distinct / rows)
+CATEGORY_MAX_RATIO = 0.05
+CATEGORY_MIN_ROWS = 64
+
+_FLAG_PREFIXES = ('is_', 'has_')
+_TRUE = {1, '1', 'true', 'True', 'TRUE', True}
+_FALSE = {0, '0', 'false', 'False', 'FALSE', False}
+_STRING_DTYPE = pd.StringDtype('pyarrow') if ARROW_AVAILABLE else pd.StringDtype()
+
+EXPORT_FORMATS = {
+    'csv': ('query_results.csv', 'text/csv'),
+    'parquet': ('query_results.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('query_results.arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+class ColumnTyper:
+    """Chooses a dtype per result column from declared types and the fetched values"""
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+
+    def declared_type(self, column: str) -> str:
+        """Declared SQLite type of a same-named column in any table ('' when unknown)"""
+        if self.catalog is None:
+            return ''
+        lowered = column.lower()
+        for table in self.catalog.tables.values():
+            declared = table.column_type(lowered)
+            if declared is not None:
+                return declared.upper()
+        return ''
+
+    def to_series(self, column: str, values: Sequence[Any]) -> pd.Series:
+        """One typed column; falls back to object dtype for mixed values"""
+        kinds = {type(value) for value in values if value is not None}
+        has_null = any(value is None for value in values)
+        declared = self.declared_type(column)
+        lowered = column.lower()
+
+        flag = lowered.startswith(_FLAG_PREFIXES) or 'BOOL' in declared
+        if flag and kinds <= {int, str, bool} and \
+                all(value is None or value in _TRUE or value in _FALSE for value in values):
+            return pd.Series(pd.array([None if value is None else value in _TRUE for value in values],
+                                      dtype='boolean'), name=column)
+        if not kinds:
+            return pd.Series(pd.array(values, dtype=_empty_dtype(declared)), name=column)
+        if kinds == {int} and not _is_real(declared):
+            if has_null:
+                return pd.Series(pd.array(values, dtype='Int64'), name=column)
+            return pd.Series(np.fromiter(values, dtype=np.int64, count=len(values)), name=column)
+        if kinds <= {int, float}:
+            return pd.Series(np.array([np.nan if value is None else value for value in values],
+                                      dtype=np.float64), name=column)
+        if kinds == {str}:
+            if lowered in CATEGORY_COLUMNS or self._repetitive(values):
+                # Categories in first-seen order keep the ORDER BY in groupby/value_counts output
+                # (lexical order would put "Grade 10" before "Grade 6")
+                categories = [value for value in dict.fromkeys(values) if value is not None]
+                return pd.Series(pd.Categorical(values, categories=categories, ordered=False), name=column)
+            return pd.Series(pd.array(values, dtype=_STRING_DTYPE), name=column)
+        return pd.Series(list(values), dtype=object, name=column)
+
+    @staticmethod
+    def _repetitive(values: Sequence[Any]) -> bool:
+        if len(values) < CATEGORY_MIN_ROWS:
+            return False
+        limit = int(len(values) * CATEGORY_MAX_RATIO)
+        seen = set()
+        for value in values:
+            seen.add(value)
+            if len(seen) > limit:
+                return False
+        return True
+
+    def frame(self, columns: List[str], rows: List[Tuple]) -> pd.DataFrame:
+        """DataFrame built column by column, never as an intermediate object-dtype frame"""
+        if rows:
+            arrays = [self.to_series(column, values).array for column, values in zip(columns, zip(*rows))]
+        else:
+            arrays = [pd.array([], dtype=_empty_dtype(self.declared_type(column))) for column in columns]
+        # Positional keys keep duplicate column names (e.g. two "grade" columns from a join)
+        frame = pd.DataFrame(dict(enumerate(arrays)))
+        frame.columns = columns
+        return frame
+
+
+def _is_real(declared: str) -> bool:
+    return any(kind in declared for kind in ('REAL', 'FLOA', 'DOUB', 'NUM', 'DEC'))
+
+
+def _empty_dtype(declared: str):
+    if 'INT' in declared:
+        return 'Int64'
+    if _is_real(declared):
+        return 'Float64'
+    return _STRING_DTYPE
+
+
+def _ipc_options():
+    return pa.ipc.IpcWriteOptions(compression='zstd')
+
+
+def export_columns(columns: Sequence[str]) -> List[str]:
+    """Column names made unique for Parquet/Arrow ("grade", "grade_2", ...)"""
+    seen = {}
+    names = []
+    for column in columns:
+        count = seen.get(column, 0) + 1
+        seen[column] = count
+        names.append(column if count == 1 else f"{column}_{count}")
+    return names
+
+
+def arrow_table(frame: pd.DataFrame):
+    """Arrow table for a typed frame; categoricals become dictionary arrays"""
+    if frame.columns.duplicated().any():
+        frame = frame.set_axis(export_columns(list(frame.columns)), axis=1)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def _stable_schema(table, typer: ColumnTyper):
+    """Schema every chunk of a streamed export is cast to: int32 dictionary indices, no null-typed columns"""
+    fields = []
+    for field in table.schema:
+        field_type = field.type
+        declared = typer.declared_type(field.name)
+        if pa.types.is_dictionary(field_type):
+            field_type = pa.dictionary(pa.int32(), field_type.value_type)
+        elif pa.types.is_integer(field_type) and 'INT' not in declared:
+            field_type = pa.float64()   # computed column: a later chunk may hold non-integers
+        elif pa.types.is_null(field_type):
+            field_type = pa.int64() if 'INT' in declared else pa.float64() if 'REAL' in declared else pa.string()
+        fields.append(pa.field(field.name, field_type))
+    return pa.schema(fields)
+
+
+def write_export(fmt: str, sink, columns: List[str], row_chunks: Iterable[List[Tuple]],
+                 typer: Optional[ColumnTyper] = None):
+    """Write row chunks to a binary sink as Parquet or an Arrow IPC stream"""
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required for Parquet and Arrow exports")
+    typer = typer or ColumnTyper()
+    writer = schema = None
+    try:
+        for rows in row_chunks:
+            if not rows:
+                continue
+            table = arrow_table(typer.frame(columns, rows))
+            if schema is None:
+                schema = _stable_schema(table, typer)
+                if fmt == 'parquet':
+                    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+                else:
+                    writer = pa.ipc.new_stream(sink, schema, options=_ipc_options())
+            writer.write_table(table.cast(schema))
+        if writer is None:
+            # Empty result: still write a valid file with the column names
+            table = arrow_table(typer.frame(columns, []))
+            if fmt == 'parquet':
+                pq.write_table(table, sink, compression='zstd')
+            else:
+                with pa.ipc.new_stream(sink, table.schema, options=_ipc_options()) as empty:
+                    empty.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_frame(frame: pd.DataFrame, fmt: str) -> bytes:
+    """Whole-frame export for bounded results"""
+    if fmt == 'csv':
+        return frame.to_csv(index=False).encode('utf-8')
+    sink = pa.BufferOutputStream()
+    table = arrow_table(frame)
+    if fmt == 'parquet':
+        pq.write_table(table, sink, compression='zstd')
+    else:
+        with pa.ipc.new_stream(sink, table.schema, options=_ipc_options()) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Query execution engine for the Dumroo NL2SQL system
+Runs each statement once over a pool of long-lived read-only SQLite connections
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from columnar import ColumnTyper, TYPED_RESULTS
+from metrics import span
+
+# Wall-clock budget per statement in milliseconds; 0 disables
+QUERY_TIMEOUT_MS = float(os.getenv('QUERY_TIMEOUT_MS', '5000'))
+# SQLite VM instructions between deadline checks
+PROGRESS_STEPS = 10000
+
+
+class QueryTimeout(Exception):
+    """A statement ran past its wall-clock budget and was interrupted"""
+
+
+class QueryResult:
+    """Rows and column names from a single statement execution"""
+
+    def __init__(self, columns: List[str], rows: List[Tuple], elapsed_ms: float,
+                 typer: Optional[ColumnTyper] = None):
+        self.columns = columns
+        self.rows = rows
+        self.elapsed_ms = elapsed_ms
+        self.typer = typer
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Build a DataFrame from the fetched rows, with compact typed columns when a typer is set"""
+        with span('dataframe'):
+            if self.typer is not None and TYPED_RESULTS:
+                return self.typer.frame(self.columns, self.rows)
+            return pd.DataFrame.from_records(self.rows, columns=self.columns)
+
+    def to_string(self) -> str:
+        """String form matching what LangChain's SQLDatabase.run returns"""
+        if not self.rows:
+            return ""
+        return str([tuple(row) for row in self.rows])
+
+
+class ReadOnlyConnectionPool:
+    """Thread-safe pool of long-lived read-only SQLite connections"""
+
+    def __init__(self, db_path: str, size: int = None, cached_statements: int = 256):
+        self.db_path = os.path.abspath(db_path)
+        self.size = size or int(os.getenv('DB_POOL_SIZE', '4'))
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=self.size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a read-only connection; readers never block WAL writers"""
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA query_only = 1")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self, timeout: float = 30.0):
+        """Borrow a connection from the pool, creating one if capacity allows"""
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._pool.get(timeout=timeout)
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def close(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class QueryExecutor:
+    """Single execution path shared by the LangChain and basic query modes"""
+
+    def __init__(self, db_path: str, pool_size: int = None, timeout_ms: float = None,
+                 typer: Optional[ColumnTyper] = None):
+        self.db_path = db_path
+        self.pool = ReadOnlyConnectionPool(db_path, size=pool_size)
+        self.timeout_ms = QUERY_TIMEOUT_MS if timeout_ms is None else timeout_ms
+        # Column dtypes for to_dataframe(); set once a schema catalog exists
+        self.typer = typer
+
+    def execute(self, sql_query: str, params: Optional[Sequence[Any]] = None,
+                timeout_ms: float = None, max_rows: Optional[int] = None) -> QueryResult:
+        """Run a statement exactly once and return its rows (at most max_rows of them)
+
+        A progress handler interrupts it once it runs past timeout_ms
+        (default: the executor's budget) and QueryTimeout is raised. Stopping
+        at max_rows leaves the statement and its column names untouched.
+        """
+        budget_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        with span('sqlite'), self.pool.connection() as conn:
+            if budget_ms:
+                conn.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_STEPS)
+            try:
+                cursor = conn.execute(sql_query, tuple(params or ()))
+                try:
+                    rows = cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows)
+                    columns = [col[0] for col in cursor.description or []]
+                finally:
+                    cursor.close()
+            except sqlite3.OperationalError as e:
+                if budget_ms and time.perf_counter() > deadline and 'interrupt' in str(e):
+                    raise QueryTimeout(f"Query exceeded its {budget_ms:.0f} ms time budget") from e
+                raise
+            finally:
+                if budget_ms:
+                    conn.set_progress_handler(None, 0)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return QueryResult(columns, rows, elapsed_ms, self.typer)
+
+    def close(self):
+        """Release pooled connections"""
+        self.pool.close()
@@ -6,38 +6,196 @@ Enhanced implementation with better error handling and agent capabilities
 
 import os
 import sys
-import sqlite3
+import asyncio
+import threading
+import functools
+import importlib.util
 import pandas as pd
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import streamlit as st
 from dotenv import load_dotenv
 import warnings
 warnings.filterwarnings("ignore")
 
+from query_cache import NLQueryCache, normalize_question
+from db_engine import QueryExecutor
+from columnar import ARROW_AVAILABLE, EXPORT_FORMATS, ColumnTyper, export_frame
+from schema_catalog import SchemaCatalog
+from rbac import RBACEngine, SecuredQuery
+from rollups import RollupRouter
+from query_guard import GuardDecision, QueryGuard, QueryRejected
+from result_cache import ResultCache
+from permissions import PermissionRegistry
+from pagination import ResultHandle, detect_keyset_column
+from model_selection import ModelSelectionCache
+from intent_engine import IntentEngine, IntentMatch, load_vocabulary, INTENT_CONFIDENCE_THRESHOLD
+from schema_pruning import SchemaPruner, SCHEMA_PRUNING, estimate_tokens
+from sql_stream import SqlStreamExtractor
+from model_router import ModelRouter
+from query_service import QueryService, get_service
+from quick_queries import QuickQuery
+from single_flight import SingleFlight
+from sharding import ShardRouter
+import metrics
+from metrics import SlowQueryLog, span
+
 # Load environment variables
 load_dotenv()
 
-try:
-    from langchain_community.utilities.sql_database import SQLDatabase
-    from langchain.chains import create_sql_query_chain
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-    from langchain.prompts import ChatPromptTemplate, PromptTemplate
-    from langchain.schema.runnable import RunnablePassthrough
-    from langchain.schema.output_parser import StrOutputParser
-    LANGCHAIN_AVAILABLE = True
-except ImportError:
-    LANGCHAIN_AVAILABLE = False
+# Rows per page when results are delivered through a ResultHandle
+RESULT_PAGE_SIZE = int(os.getenv('RESULT_PAGE_SIZE', '500'))
+
+# Stream LLM output and stop generating once the SQL statement is complete
+LLM_STREAMING = os.getenv('LLM_STREAMING', '1') != '0'
+
+# Maximum LLM generations in flight for the async API
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '4'))
+
+# Serve Prometheus metrics on this port when set (e.g. 9108)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Candidate LangChain models, in order of preference
+LANGCHAIN_MODELS = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-pro"]
+
+# SQL generation prompt; {table_info} is the (pruned) schema for the question
+SQL_PROMPT_TEMPLATE = """You are an expert SQL assistant for an educational management system.
+
+Given the following database schema and a user question, generate a valid SQLite SQL query.
+
+Database Schema:
+{table_info}
+
+IMPORTANT GUIDELINES:
+1. ALWAYS use table aliases: s for students, h for homework, sub for submissions, p for performance, q for quizzes
+2. When referencing grade/section in WHERE clauses, ALWAYS specify table alias (e.g., s.grade, h.grade)
+3. performance table does NOT have grade/section/region - JOIN with students table to get these
+4. For homework submissions: is_submitted = 0 means not submitted, is_submitted = 1 means submitted
+5. For unsubmitted homework: LEFT JOIN submissions and check WHERE sub.submission_id IS NULL
+6. Current date: Use date('now') for current date comparisons
+7. Grades format: 'Grade 6', 'Grade 7', 'Grade 8', 'Grade 9', 'Grade 10'
+8. Sections: 'A', 'B', 'C'
+9. Regions: 'North Delhi', 'South Delhi', 'East Delhi', 'West Delhi', 'Central Delhi'
+
+COMMON QUERY PATTERNS:
+- Unsubmitted homework: SELECT s.student_name FROM students s JOIN homework h ON s.grade = h.grade AND s.section = h.section LEFT JOIN submissions sub ON s.student_id = sub.student_id AND h.homework_id = sub.homework_id WHERE sub.submission_id IS NULL
+- Performance by grade: SELECT s.grade, p.subject, AVG(p.percentage) FROM performance p JOIN students s ON p.student_id = s.student_id GROUP BY s.grade, p.subject
+
+User Question: {question}
+
+Generate ONLY the SQL query without any markdown formatting, explanations, or code blocks. Return just the raw SQL:"""
+
+
+def _module_available(name: str) -> bool:
+    """Check that a package is installed without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# The LLM stacks are only imported when the first question needs them
+LANGCHAIN_AVAILABLE = all(
+    _module_available(name) for name in ("langchain", "langchain_community", "langchain_google_genai")
+)
+GENAI_AVAILABLE = _module_available("google.generativeai")
+if not LANGCHAIN_AVAILABLE:
     # Only show warning in Streamlit context, not during import
     if 'streamlit' in sys.modules:
         st.warning("⚠️ LangChain not available. Using basic implementation.")
 
+
+def clean_generated_sql(sql_text: str) -> str:
+    """Strip LangChain/markdown formatting from LLM-generated SQL"""
+    clean_query = sql_text
+
+    # Remove "SQLQuery:" prefix
+    if "SQLQuery:" in clean_query:
+        clean_query = clean_query.split("SQLQuery:")[-1].strip()
+
+    # Remove markdown code blocks (```sqlite ... ```)
+    if "```" in clean_query:
+        # Extract SQL from between code blocks
+        lines = clean_query.split('\n')
+        sql_lines = []
+        in_code_block = False
+
+        for line in lines:
+            if line.strip().startswith('```'):
+                in_code_block = not in_code_block
+                continue
+            if in_code_block or (not any(line.strip().startswith(x) for x in ['```', 'SQLQuery:']) and line.strip()):
+                sql_lines.append(line)
+
+        clean_query = '\n'.join(sql_lines).strip()
+
+    # Final cleanup - remove any remaining prefixes
+    return clean_query.strip()
+
+
 class AdvancedDumrooNL2SQL:
     """Advanced Natural Language to SQL system using LangChain"""
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, result_cache: Optional[ResultCache] = None,
+                 admin_users_path: str = None):
         self.db_path = db_path or os.getenv('DATABASE_PATH', 'dumroo_education.db')
-        self.admin_df = pd.read_csv('data/admin_users.csv')
+        self.permission_registry = PermissionRegistry(admin_users_path)
+
+        # Pooled read-only connections shared by every query path
+        self.executor = QueryExecutor(self.db_path)
+
+        # Schema snapshot shared by the prompt builder, RBAC and validation
+        self.schema_catalog = SchemaCatalog(self.db_path)
+
+        # Results come back with compact dtypes chosen from the declared column types
+        self.executor.typer = ColumnTyper(self.schema_catalog)
+
+        # Parses generated SQL and scopes every table reference per user
+        self.rbac_engine = RBACEngine(self.schema_catalog, self.get_user_permissions)
+
+        # Sends aggregate SQL to fresh rollup tables ahead of RBAC
+        self.rollup_router = RollupRouter(self.schema_catalog, self.executor)
+
+        # EXPLAIN-based admission check and row cap for every secured query
+        self.query_guard = QueryGuard(self.executor, self.schema_catalog)
+
+        # Region shards (SHARD_DIR); None keeps every query on the main database
+        self.shard_router = ShardRouter.open(self.schema_catalog, self.executor.typer)
+
+        # Concurrent identical generations and executions share one call
+        self.in_flight = SingleFlight()
+
+        # Results of secured SQL, shared across sessions when the caller passes one in
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+
+        # Answers the common question shapes locally, without the LLM
+        vocabulary = load_vocabulary(self.executor)
+        self.intent_engine = IntentEngine(vocabulary)
+        self.intent_threshold = INTENT_CONFIDENCE_THRESHOLD
+
+        # Sends the LLM only the tables and columns a question needs
+        self.schema_pruner = SchemaPruner(self.schema_catalog, vocabulary)
+        self.schema_pruning = SCHEMA_PRUNING
+        self.llm_streaming = LLM_STREAMING
+
+        # Hedges and fails over between LLMs; set up with the LangChain models
+        self.model_router: Optional[ModelRouter] = None
+
+        # Requests slower than SLOW_QUERY_MS go to a rotating JSON-lines log
+        self.slow_query_log = SlowQueryLog()
+        if METRICS_PORT:
+            try:
+                metrics.start_http_server(METRICS_PORT)
+            except OSError as e:
+                print(f"⚠️ Metrics endpoint not started on port {METRICS_PORT}: {e}")
+
+        # Generated SQL is cached before RBAC so one entry serves every admin
+        self.query_cache = NLQueryCache()
+
+        # Model choice persists across sessions; nothing is probed at startup
+        self.model_selection = ModelSelectionCache()
+        self._llm_lock = threading.Lock()
+        self._llm_init_attempted = False
+        self.has_genai = False
 
         # Initialize Gemini
         self.api_key = os.getenv('GEMINI_API_KEY')
@@ -45,12 +203,7 @@ class AdvancedDumrooNL2SQL:
             st.warning("⚠️ Gemini API key not found. Please set GEMINI_API_KEY in your environment.")
             return
 
-        # Always setup basic queries as fallback
-        self.setup_basic_queries()
-        
-        if LANGCHAIN_AVAILABLE:
-            self.setup_langchain()
-        else:
+        if not LANGCHAIN_AVAILABLE:
             self.setup_basic_implementation()
             if 'streamlit' in sys.modules:
                 if hasattr(self, 'has_genai') and self.has_genai:
@@ -64,39 +217,70 @@ class AdvancedDumrooNL2SQL:
                     ```
                     """)
 
+    def _langchain_ready(self) -> bool:
+        """Initialize LangChain on first use; True if the LLM path can serve queries"""
+        if not self._llm_init_attempted:
+            if not (LANGCHAIN_AVAILABLE and self.api_key):
+                return False
+            with self._llm_lock:
+                if not self._llm_init_attempted:
+                    try:
+                        self.setup_langchain()
+                    except Exception:
+                        # Fall back to the basic implementation for this instance
+                        self.setup_basic_implementation()
+                    finally:
+                        self._llm_init_attempted = True
+        return hasattr(self, 'llm')
+
+    def attach_query_chain(self, query_chain, llm=None):
+        """Serve the LLM path from a prebuilt chain (anything with invoke/ainvoke)
+
+        Used by the benchmark harness to stand in a fake chat model; skips
+        setup_langchain and does not need an API key or LangChain installed.
+        """
+        self.attach_models([("attached", query_chain)], llm)
+
+    def attach_models(self, models: List[Tuple[str, Any]], llm=None):
+        """Serve the LLM path from (name, chain) pairs in preference order, hedged and with failover"""
+        with self._llm_lock:
+            self.llm = llm if llm is not None else models[0][1]
+            self.query_chain = models[0][1]
+            self.model_router = ModelRouter(models)
+            self._llm_init_attempted = True
+
     def setup_langchain(self):
         """Setup LangChain components"""
         try:
-            # Initialize LLM - try multiple model names
-            model_names = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-pro"]
-            
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            # Initialize every candidate model, last good choice first; the router hedges between them
+            model_names = self.model_selection.ordered("langchain", LANGCHAIN_MODELS)
+            llms = []
             for model_name in model_names:
                 try:
-                    self.llm = ChatGoogleGenerativeAI(
+                    llms.append((model_name, ChatGoogleGenerativeAI(
                         model=model_name,
                         temperature=0,
                         google_api_key=self.api_key
-                    )
-                    print(f"✅ Successfully initialized with model: {model_name}")
-                    break
+                    )))
+                    print(f"✅ Successfully initialized model: {model_name}")
                 except Exception as e:
                     print(f"⚠️ Failed to initialize {model_name}: {str(e)[:100]}...")
                     continue
-            else:
+            if not llms:
                 raise Exception("Failed to initialize any Gemini model")
-
-            # Setup SQL Database
-            self.sql_database = SQLDatabase.from_uri(f"sqlite:///{self.db_path}")
-
-            # Create SQL query chain
-            self.query_chain = create_sql_query_chain(self.llm, self.sql_database)
-
-            # Create query execution tool
-            self.execute_query_tool = QuerySQLDataBaseTool(db=self.sql_database)
+            self.model_name = llms[0][0]
+            self.model_selection.put("langchain", self.model_name)
 
             # Setup custom prompt for educational domain
             self.setup_custom_prompt()
 
+            # One SQL query chain per model; the schema comes from _generation_input, pruned per question
+            self.attach_models([(name, self.custom_prompt | llm | StrOutputParser()) for name, llm in llms],
+                               llm=llms[0][1])
+
             print("✅ LangChain components initialized successfully")
 
         except Exception as e:
@@ -104,195 +288,217 @@ class AdvancedDumrooNL2SQL:
             raise
 
     def setup_basic_implementation(self):
-        """Setup basic implementation without LangChain"""
-        try:
-            # Try to initialize basic Gemini client if available
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_key)
-                
-                # Try multiple model names
-                model_names = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro"]
-                for model_name in model_names:
-                    try:
-                        self.basic_model = genai.GenerativeModel(model_name)
-                        # Test the model with a simple request
-                        test_response = self.basic_model.generate_content("Hello")
-                        print(f"✅ Google Generative AI available with model: {model_name}")
-                        self.has_genai = True
-                        break
-                    except Exception as e:
-                        print(f"⚠️ Model {model_name} failed: {str(e)[:50]}...")
-                        continue
-                else:
-                    print("⚠️ No working Gemini models found")
-                    self.basic_model = None
-                    self.has_genai = False
-                    
-            except ImportError:
-                self.basic_model = None
-                self.has_genai = False
-                print("ℹ️ Google Generative AI not available - using template-only mode")
-            
-            # Load basic query templates (these work without any AI)
-            self.basic_queries = {
-                "homework": "SELECT DISTINCT s.student_name, s.grade, s.section, h.title as homework_title, h.due_date, h.subject FROM students s JOIN submissions sub ON s.student_id = sub.student_id JOIN homework h ON sub.homework_id = h.homework_id WHERE sub.is_submitted = 0",
-                "performance": "SELECT s.student_name, s.grade, s.section, p.subject, p.assessment_type, p.assessment_date, p.percentage FROM performance p JOIN students s ON p.student_id = s.student_id",
-                "attendance": "SELECT s.student_name, s.grade, s.section, s.attendance_percentage FROM students s WHERE s.attendance_percentage < 80",
-                "quizzes": "SELECT q.quiz_title, q.subject, q.grade, q.section, q.scheduled_date, q.scheduled_time FROM quizzes q"
-            }
-            
-            print("✅ Basic implementation initialized successfully")
-            
-        except Exception as e:
-            print(f"❌ Error setting up basic implementation: {e}")
-            # Don't raise - we can still work with predefined queries
-            self.basic_model = None
-            self.has_genai = False
-
-    def setup_basic_queries(self):
-        """Setup basic query templates (always available)"""
-        self.basic_queries = {
-            "homework": "SELECT DISTINCT s.student_name, s.grade, s.section, h.title as homework_title, h.due_date, h.subject FROM students s JOIN submissions sub ON s.student_id = sub.student_id JOIN homework h ON sub.homework_id = h.homework_id WHERE sub.is_submitted = 0",
-            "performance": "SELECT s.student_name, s.grade, s.section, p.subject, p.assessment_type, p.assessment_date, p.percentage FROM performance p JOIN students s ON p.student_id = s.student_id",
-            "attendance": "SELECT s.student_name, s.grade, s.section, s.attendance_percentage FROM students s WHERE s.attendance_percentage < 80",
-            "quizzes": "SELECT q.quiz_title, q.subject, q.grade, q.section, q.scheduled_date, q.scheduled_time FROM quizzes q"
-        }
+        """Setup basic implementation without LangChain
+
+        Questions are answered by the intent engine; has_genai only records
+        whether google-generativeai and an API key are present. Nothing is
+        probed, so startup spends no network round trips or tokens.
+        """
+        self.has_genai = GENAI_AVAILABLE and bool(self.api_key)
+        if self.has_genai:
+            print("✅ Google Generative AI available (model selected on first use)")
+        else:
+            print("ℹ️ Google Generative AI not available - using template-only mode")
+        print("✅ Basic implementation initialized successfully")
 
     def setup_custom_prompt(self):
         """Setup domain-specific prompt template"""
-
-        template = """You are an expert SQL assistant for an educational management system. 
-
-        Given the following database schema and a user question, generate a valid SQLite SQL query.
-
-        Database Schema:
-        {table_info}
-
-        CRITICAL SCHEMA RULES:
-        1. students table: student_id, student_name, grade, section, region, attendance_percentage
-        2. homework table: homework_id, title, subject, grade, section, assigned_date, due_date, total_marks  
-        3. submissions table: submission_id, homework_id, student_id, submitted_date, is_submitted, is_late, marks_obtained, total_marks
-        4. performance table: performance_id, student_id, subject, assessment_type, assessment_date, marks_obtained, total_marks, percentage, grade_letter
-        5. quizzes table: quiz_id, quiz_title, subject, grade, section, scheduled_date, scheduled_time, duration_minutes, total_marks
-
-        IMPORTANT GUIDELINES:
-        1. ALWAYS use table aliases: s for students, h for homework, sub for submissions, p for performance, q for quizzes
-        2. When referencing grade/section in WHERE clauses, ALWAYS specify table alias (e.g., s.grade, h.grade)
-        3. performance table does NOT have grade/section/region - JOIN with students table to get these
-        4. For homework submissions: is_submitted = 0 means not submitted, is_submitted = 1 means submitted
-        5. For unsubmitted homework: LEFT JOIN submissions and check WHERE sub.submission_id IS NULL
-        6. Current date: Use date('now') for current date comparisons
-        7. Grades format: 'Grade 6', 'Grade 7', 'Grade 8', 'Grade 9', 'Grade 10'
-        8. Sections: 'A', 'B', 'C'
-        9. Regions: 'North Delhi', 'South Delhi', 'East Delhi', 'West Delhi', 'Central Delhi'
-
-        COMMON QUERY PATTERNS:
-        - Unsubmitted homework: SELECT s.student_name FROM students s JOIN homework h ON s.grade = h.grade AND s.section = h.section LEFT JOIN submissions sub ON s.student_id = sub.student_id AND h.homework_id = sub.homework_id WHERE sub.submission_id IS NULL
-        - Performance by grade: SELECT s.grade, p.subject, AVG(p.percentage) FROM performance p JOIN students s ON p.student_id = s.student_id GROUP BY s.grade, p.subject
-
-        User Question: {input}
-
-        Generate ONLY the SQL query without any markdown formatting, explanations, or code blocks. Return just the raw SQL:"""
+        from langchain.prompts import PromptTemplate
 
         self.custom_prompt = PromptTemplate(
-            input_variables=["table_info", "input"],
-            template=template
+            input_variables=["table_info", "question"],
+            template=SQL_PROMPT_TEMPLATE
         )
 
+    def get_schema_fingerprint(self) -> str:
+        """Hash of the database DDL from the shared schema catalog"""
+        return self.schema_catalog.get_fingerprint()
+
+    @property
+    def admin_df(self) -> pd.DataFrame:
+        """Admin users as a DataFrame, built from the permission registry"""
+        return pd.DataFrame([
+            {'username': user.username, 'full_name': user.full_name, 'role': user.role,
+             'assigned_grades': user.assigned_grades, 'assigned_sections': user.assigned_sections,
+             'assigned_regions': user.assigned_regions}
+            for user in self.permission_registry.users()
+        ])
+
     def get_user_permissions(self, username: str) -> Dict:
         """Get user permissions for RBAC"""
-        user = self.admin_df[self.admin_df['username'] == username]
-        if user.empty:
+        user = self.permission_registry.get(username)
+        if user is None:
             return None
+        return user.to_dict()
 
-        user_data = user.iloc[0]
-        return {
-            'role': user_data['role'],
-            'assigned_grades': user_data['assigned_grades'],
-            'assigned_sections': user_data['assigned_sections'],
-            'assigned_regions': user_data['assigned_regions'],
-            'full_name': user_data['full_name']
-        }
+    def secure_query(self, sql_query: str, username: str, params: Tuple = ()) -> Optional[SecuredQuery]:
+        """Scope every table in the query to the user's grades, sections and regions"""
+        with span('rbac'):
+            return self.rbac_engine.secure(sql_query, username, params)
 
     def apply_rbac_filter(self, sql_query: str, username: str) -> str:
         """Apply role-based access control to SQL query"""
-        permissions = self.get_user_permissions(username)
-        if not permissions or permissions['role'] == 'super_admin':
+        secured = self.secure_query(sql_query, username)
+        if secured is None:
             return sql_query
-
-        # Build filter conditions with proper table aliases
-        conditions = []
-
-        if permissions['assigned_grades'] != 'ALL':
-            grades = [f"'{grade.strip()}'" for grade in permissions['assigned_grades'].split(',')]
-            # Always use s.grade to avoid ambiguity
-            conditions.append(f"s.grade IN ({','.join(grades)})")
-
-        if permissions['assigned_sections'] != 'ALL':
-            sections = [f"'{section.strip()}'" for section in permissions['assigned_sections'].split(',')]
-            # Always use s.section to avoid ambiguity
-            conditions.append(f"s.section IN ({','.join(sections)})")
-
-        if permissions['assigned_regions'] != 'ALL':
-            regions = [f"'{region.strip()}'" for region in permissions['assigned_regions'].split(',')]
-            # Always use s.region to avoid ambiguity
-            conditions.append(f"s.region IN ({','.join(regions)})")
-
-        # Apply filters to the query
-        if conditions:
-            filter_clause = " AND ".join(conditions)
-
-            # More robust approach: handle different query structures
-            sql_upper = sql_query.upper()
-            
-            if "WHERE" in sql_upper:
-                # Find the WHERE clause and add our conditions
-                where_pos = sql_upper.find("WHERE")
-                before_where = sql_query[:where_pos + 5]  # Include "WHERE"
-                after_where = sql_query[where_pos + 5:]
-                sql_query = f"{before_where} ({filter_clause}) AND {after_where}"
+        return secured.display_sql
+
+    def route_query(self, sql_query: str) -> Tuple[str, Optional[str]]:
+        """(SQL to run, rollup table or None): aggregates are answered from a rollup when one fits"""
+        with span('route'):
+            routed = self.rollup_router.route(sql_query)
+        if routed is None:
+            return sql_query, None
+        return routed.sql, routed.rollup
+
+    def guard_query(self, secured: SecuredQuery, page_size: Optional[int] = None) -> GuardDecision:
+        """Cost guard decision for a secured query (paged queries get no row cap)"""
+        with span('guard'):
+            return self.query_guard.check(secured.sql, secured.params, paged=bool(page_size))
+
+    def shard_route(self, secured: SecuredQuery, sql_query: str, username: str):
+        """Shard route for a secured query, or None to run it on the main database"""
+        if self.shard_router is None:
+            return None
+        policy = self.rbac_engine.policy_for(username)
+        regions = policy.scope.get('region') if policy is not None else ()
+        return self.shard_router.route(sql_query, secured.sql, regions)
+
+    def _execute_secured(self, secured: SecuredQuery, sql_query: str, page_size: Optional[int] = None,
+                         guard: Optional[GuardDecision] = None, username: str = "super_admin"):
+        """Run a secured query in full, or lazily as a paged ResultHandle
+
+        Raises QueryRejected when the guard refused the plan. Returns
+        (DataFrame, string form, handle, result cache hit); both are the first
+        page when paging. Paged queries bypass the result cache. With shards,
+        a single-region user reads only their shard; scattered queries are
+        merged in full (capped like an unpaged query) rather than paged.
+        """
+        guard = guard or self.guard_query(secured, page_size)
+        if guard.rejected:
+            raise QueryRejected(guard)
+        route = self.shard_route(secured, sql_query, username)
+        executor = self.executor
+        if route is not None:
+            metrics.annotate(shards=route.mode)
+            if route.mode == 'single':
+                executor = self.shard_router.executors[route.regions[0]]
+            elif page_size:
+                page_size = None
+                guard.row_cap = self.query_guard.row_cap
+        if page_size:
+            handle = ResultHandle(
+                executor, secured.sql, secured.params, page_size=page_size,
+                keyset_column=detect_keyset_column(sql_query, self.schema_catalog)
+            )
+            result_df = handle.first_page()
+            return result_df, handle.first_page_result.to_string(), handle, False
+
+        with span('result_cache'):
+            cache_key = self.result_cache.key(executor.db_path, secured.sql, secured.params, guard.row_cap)
+            cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            guard.truncated = cached.truncated
+            return cached.frame, cached.text, None, True
+
+        def run():
+            if route is not None:
+                query_result, truncated = self.shard_router.execute(route, secured.sql, secured.params,
+                                                                    guard.row_cap)
             else:
-                # Find a good place to add WHERE clause
-                # Look for FROM students table (with or without alias)
-                if "FROM students" in sql_query.lower():
-                    # Find the position after FROM students or FROM students s
-                    import re
-                    pattern = r'(FROM\s+students\s*(?:s\s*)?)'
-                    match = re.search(pattern, sql_query, re.IGNORECASE)
-                    if match:
-                        end_pos = match.end()
-                        before_from = sql_query[:end_pos]
-                        after_from = sql_query[end_pos:]
-                        sql_query = f"{before_from} WHERE {filter_clause} {after_from}"
+                query_result = self.query_guard.execute(guard, secured.sql, secured.params)
+                truncated = guard.truncated
+            frame, text = query_result.to_dataframe(), query_result.to_string()
+            self.result_cache.put(cache_key, frame, text, truncated)
+            return frame, text, truncated
+
+        # Users whose secured SQL and parameters match exactly share one execution
+        (result_df, result, guard.truncated), shared = self.in_flight.do(
+            ('execute', executor.db_path, secured.sql, secured.params, guard.row_cap), run)
+        if shared:
+            self._count_coalesced('execute')
+        return result_df, result, None, False
+
+    def query_natural_language(self, question: str, username: str = "super_admin",
+                               page_size: Optional[int] = None,
+                               on_progress: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Process natural language query
+
+        With page_size set, "result" holds only the first page and
+        "result_handle" fetches the rest on demand. "timings_ms" holds the
+        per-stage breakdown. on_progress(event, text) is called with
+        ("sql_partial", SQL so far) while the model streams and ("sql",
+        secured SQL) just before execution.
+        """
+        with metrics.trace() as trace:
+            result = self._query_natural_language(question, username, page_size, on_progress)
+        return self._finish_trace(trace, question, username, result)
+
+    def run_quick_query(self, query: QuickQuery, username: str = "super_admin") -> Dict:
+        """Run a precompiled Quick Query under the user's RBAC scope, skipping intent matching and the LLM"""
+        with metrics.trace() as trace:
+            try:
+                with span('permissions'):
+                    permissions = self.get_user_permissions(username)
+                if not permissions:
+                    result = {"error": "User not found or access denied"}
                 else:
-                    # Fallback: add WHERE clause before any ORDER BY, GROUP BY, etc.
-                    keywords = ['ORDER BY', 'GROUP BY', 'HAVING', 'LIMIT']
-                    insert_pos = len(sql_query)
-                    
-                    for keyword in keywords:
-                        pos = sql_query.upper().find(keyword)
-                        if pos != -1 and pos < insert_pos:
-                            insert_pos = pos
-                    
-                    before = sql_query[:insert_pos].rstrip()
-                    after = sql_query[insert_pos:]
-                    sql_query = f"{before} WHERE {filter_clause} {after}"
-
-        return sql_query
-
-    def query_natural_language(self, question: str, username: str = "super_admin") -> Dict:
-        """Process natural language query"""
+                    metrics.annotate(path="quick")
+                    result = self._execute_generated_sql(query.question, query.sql, False, username, permissions,
+                                                         params=query.bind(), intent=query.key)
+            except Exception as e:
+                result = {"error": f"Query execution failed: {str(e)}", "question": query.question}
+        return self._finish_trace(trace, query.question, username, result)
+
+    def _finish_trace(self, trace: metrics.Trace, question: str, username: str, result: Dict) -> Dict:
+        """Attach stage timings to the result, count it and log it if slow"""
+        timings = {stage: round(ms, 3) for stage, ms in trace.timings_ms.items()}
+        result["timings_ms"] = timings
+        failed = "error" in result or str(result.get("raw_result", "")).startswith("Error:")
+        path = trace.labels.get("path", "none")
+        metrics.REGISTRY.count_request(path, "error" if failed else "ok")
+        if "model" in trace.labels:
+            result["model"] = trace.labels["model"]
+
+        frame = result.get("result")
+        self.slow_query_log.maybe_log({
+            "user": username,
+            "question": question,
+            "path": path,
+            "model": result.get("model"),
+            "sql_query": result.get("sql_query"),
+            "rows": len(frame) if frame is not None else 0,
+            "error": result.get("error"),
+            "total_ms": timings["total"],
+            "timings_ms": timings,
+        })
+        metrics.write_prometheus_file()
+        return result
+
+    def _query_natural_language(self, question: str, username: str, page_size: Optional[int] = None,
+                                on_progress: Optional[Callable[[str, str], None]] = None) -> Dict:
         try:
             # Get user permissions
-            permissions = self.get_user_permissions(username)
+            with span('permissions'):
+                permissions = self.get_user_permissions(username)
             if not permissions:
                 return {"error": "User not found or access denied"}
 
-            if LANGCHAIN_AVAILABLE and hasattr(self, 'llm'):
-                return self._query_with_langchain(question, username, permissions)
+            # Confident local matches skip the LLM round trip entirely
+            local = self._local_intent(question)
+            if local is not None:
+                metrics.annotate(path="intent")
+                return self._execute_generated_sql(question, local.sql, False, username, permissions,
+                                                   page_size, params=local.params, intent=local.intent,
+                                                   on_progress=on_progress)
+
+            if self._langchain_ready():
+                metrics.annotate(path="langchain")
+                return self._query_with_langchain(question, username, permissions, page_size, on_progress)
             else:
-                return self._query_with_basic_implementation(question, username, permissions)
+                metrics.annotate(path="basic")
+                return self._query_with_basic_implementation(question, username, permissions, page_size,
+                                                             on_progress)
 
         except Exception as e:
             return {
@@ -300,117 +506,341 @@ class AdvancedDumrooNL2SQL:
                 "question": question
             }
 
-    def _query_with_langchain(self, question: str, username: str, permissions: Dict) -> Dict:
-        """Process query using LangChain"""
-        # Generate SQL query using LangChain
-        chain_input = {
-            "question": question,
-            "table_info": self.sql_database.get_table_info()
-        }
-
-        sql_query = self.query_chain.invoke(chain_input)
+    def _local_intent(self, question: str) -> Optional[IntentMatch]:
+        """Intent engine match confident enough to answer without the LLM"""
+        with span('intent'):
+            match = self.intent_engine.match(question)
+        if match is not None and match.confidence >= self.intent_threshold:
+            return match
+        return None
+
+    def _generation_input(self, question: str) -> Dict:
+        """Prompt inputs for a question, with the schema pruned to what it needs"""
+        with span('schema'):
+            full_info = self.schema_catalog.get_table_info()
+            if not self.schema_pruning:
+                return {"question": question, "table_info": full_info}
+            pruned = self.schema_pruner.prune(question)
+            full_tokens = estimate_tokens(SQL_PROMPT_TEMPLATE.format(table_info=full_info, question=question))
+            sent_tokens = estimate_tokens(SQL_PROMPT_TEMPLATE.format(table_info=pruned.table_info, question=question))
+        metrics.REGISTRY.count_prompt_tokens(full_tokens, sent_tokens)
+        scope = ', '.join(pruned.tables) if pruned.pruned else "full schema (no table matched)"
+        print(f"✂️ Prompt schema: {scope}; ~{full_tokens:,} → ~{sent_tokens:,} tokens")
+        return {"question": question, "table_info": pruned.table_info}
+
+    @staticmethod
+    def _count_coalesced(stage: str):
+        metrics.REGISTRY.count_coalesced(stage)
+        metrics.annotate(coalesced=stage)
+
+    def _cached_sql(self, question: str):
+        """(fingerprint, cached SQL or None) for the current schema"""
+        with span('schema'):
+            fingerprint = self.get_schema_fingerprint()
+        with span('cache'):
+            return fingerprint, self.query_cache.get(question, fingerprint)
+
+    def _run_chain(self, generation_input: Dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """SQL from the first model to answer (see ModelRouter); partial SQL goes to on_token"""
+        sql_query, model_name = self.model_router.call(
+            lambda name, chain, cancelled, emit: self._stream_sql(chain, generation_input, cancelled, emit),
+            on_token
+        )
+        metrics.annotate(model=model_name)
+        return sql_query
 
-        # Apply RBAC filters
-        secured_query = self.apply_rbac_filter(sql_query, username)
+    async def _arun_chain(self, generation_input: Dict) -> str:
+        """Async counterpart of _run_chain"""
+        sql_query, model_name = await self.model_router.acall(
+            lambda name, chain: self._astream_sql(chain, generation_input)
+        )
+        metrics.annotate(model=model_name)
+        return sql_query
 
-        # Execute the query
-        result = self.execute_query_tool.invoke(secured_query)
+    def _stream_sql(self, chain, generation_input: Dict, cancelled: Optional[threading.Event] = None,
+                    on_token: Optional[Callable[[str], None]] = None) -> str:
+        """SQL from one chain; when streaming, generation is cut off as soon as the statement ends"""
+        if not (self.llm_streaming and hasattr(chain, 'stream')):
+            return clean_generated_sql(chain.invoke(generation_input))
+        extractor = SqlStreamExtractor()
+        stream = chain.stream(generation_input)
+        try:
+            for chunk in stream:
+                if extractor.feed(chunk) is not None or (cancelled is not None and cancelled.is_set()):
+                    break
+                if on_token is not None:
+                    on_token(extractor.partial_sql)
+        finally:
+            # Closing the generator cancels the rest of the model response
+            if hasattr(stream, 'close'):
+                stream.close()
+        return extractor.finish() or clean_generated_sql(extractor.text)
+
+    async def _astream_sql(self, chain, generation_input: Dict) -> str:
+        """Async counterpart of _stream_sql; task cancellation closes the stream"""
+        if not (self.llm_streaming and hasattr(chain, 'astream')):
+            return clean_generated_sql(await chain.ainvoke(generation_input))
+        extractor = SqlStreamExtractor()
+        stream = chain.astream(generation_input)
+        try:
+            async for chunk in stream:
+                if extractor.feed(chunk) is not None:
+                    break
+        finally:
+            if hasattr(stream, 'aclose'):
+                await stream.aclose()
+        return extractor.finish() or clean_generated_sql(extractor.text)
+
+    def _generate_sql(self, question: str, on_token: Optional[Callable[[str], None]] = None):
+        """Return (raw SQL, cache_hit), calling the LLM only on a cache miss"""
+        # Reuse previously generated SQL for the same question and schema
+        fingerprint, sql_query = self._cached_sql(question)
+        if sql_query is not None:
+            return sql_query, True
+
+        def generate():
+            # A caller that just finished generating may have filled the cache
+            cached = self.query_cache.get(question, fingerprint)
+            if cached is not None:
+                return cached, True
+            # Generate SQL query using LangChain
+            generation_input = self._generation_input(question)
+            try:
+                with span('llm'):
+                    sql_query = self._run_chain(generation_input, on_token)
+            except Exception:
+                # The cached model may have been retired; re-select next session
+                self.model_selection.invalidate("langchain")
+                raise
+            with span('cache'):
+                self.query_cache.put(question, fingerprint, sql_query)
+            return sql_query, False
+
+        # Identical questions asked at the same time wait on one generation
+        (sql_query, cache_hit), shared = self.in_flight.do(
+            ('generate', normalize_question(question), fingerprint), generate)
+        if shared:
+            self._count_coalesced('generate')
+        return sql_query, cache_hit
+
+    async def _agenerate_sql(self, question: str):
+        """Async counterpart of _generate_sql; the LLM call does not block the loop"""
+        fingerprint, sql_query = self._cached_sql(question)
+        if sql_query is not None:
+            return sql_query, True
+
+        async def generate():
+            cached = self.query_cache.get(question, fingerprint)
+            if cached is not None:
+                return cached, True
+            generation_input = self._generation_input(question)
+            try:
+                with span('llm'):
+                    sql_query = await self._arun_chain(generation_input)
+            except Exception:
+                self.model_selection.invalidate("langchain")
+                raise
+            with span('cache'):
+                self.query_cache.put(question, fingerprint, sql_query)
+            return sql_query, False
+
+        (sql_query, cache_hit), shared = await self.in_flight.ado(
+            ('generate', normalize_question(question), fingerprint), generate)
+        if shared:
+            self._count_coalesced('generate')
+        return sql_query, cache_hit
+
+    def _discard_generated(self, question: str, intent: Optional[str]):
+        """Forget the cached LLM SQL for a question (intent-engine SQL is never cached)"""
+        if intent is None:
+            self.query_cache.discard(question, self.get_schema_fingerprint())
+
+    def _query_with_langchain(self, question: str, username: str, permissions: Dict,
+                              page_size: Optional[int] = None,
+                              on_progress: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Process query using LangChain"""
+        on_token = (lambda partial: on_progress("sql_partial", partial)) if on_progress else None
+        sql_query, cache_hit = self._generate_sql(question, on_token)
+        return self._execute_generated_sql(question, sql_query, cache_hit, username, permissions, page_size,
+                                           on_progress=on_progress)
+
+    def _execute_generated_sql(self, question: str, sql_query: str, cache_hit: bool, username: str,
+                               permissions: Dict, page_size: Optional[int] = None, params: Tuple = (),
+                               intent: Optional[str] = None,
+                               on_progress: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Secure and run generated SQL (LLM or intent engine), building the result dict
+
+        LLM SQL that cannot be scoped or fails to run is dropped from the
+        question cache, so the next ask generates it afresh.
+        """
+        run_sql, rollup = self.route_query(sql_query)
 
-        # Parse result into DataFrame if possible
+        # Apply RBAC filters
         try:
-            conn = sqlite3.connect(self.db_path)
-            # Clean the SQL query - remove LangChain formatting
-            clean_query = secured_query
-            
-            # Remove "SQLQuery:" prefix
-            if "SQLQuery:" in clean_query:
-                clean_query = clean_query.split("SQLQuery:")[-1].strip()
-            
-            # Remove markdown code blocks (```sqlite ... ```)
-            if "```" in clean_query:
-                # Extract SQL from between code blocks
-                lines = clean_query.split('\n')
-                sql_lines = []
-                in_code_block = False
-                
-                for line in lines:
-                    if line.strip().startswith('```'):
-                        in_code_block = not in_code_block
-                        continue
-                    if in_code_block or (not any(line.strip().startswith(x) for x in ['```', 'SQLQuery:']) and line.strip()):
-                        sql_lines.append(line)
-                
-                clean_query = '\n'.join(sql_lines).strip()
-            
-            # Final cleanup - remove any remaining prefixes
-            clean_query = clean_query.strip()
-            
-            result_df = pd.read_sql_query(clean_query, conn)
-            conn.close()
+            secured = self.secure_query(run_sql, username, params)
+        except Exception:
+            self._discard_generated(question, intent)
+            raise
+        secured_query = secured.display_sql
+        if on_progress is not None:
+            on_progress("sql", secured_query)
+
+        # Execute the query once; DataFrame and string form share the same rows
+        handle = None
+        result_cached = False
+        failed = False
+        guard = self.guard_query(secured, page_size)
+        try:
+            result_df, result, handle, result_cached = self._execute_secured(secured, run_sql, page_size, guard,
+                                                                                        username)
             print(f"✅ Query executed successfully: {len(result_df)} rows returned")
         except Exception as e:
             print(f"❌ Error executing query: {e}")
-            print(f"   Original query: {secured_query}")
-            print(f"   Cleaned query: {clean_query}")
+            print(f"   Query: {secured_query}")
             result_df = pd.DataFrame()  # Empty DataFrame on error
+            result = f"Error: {e}"
+            failed = True
+            self._discard_generated(question, intent)
 
         return {
-            "success": True,
+            "success": not failed,
             "question": question,
             "sql_query": secured_query,
             "result": result_df,
             "raw_result": result,
+            "result_handle": handle,
+            "cache_hit": cache_hit,
+            "result_cache_hit": result_cached,
+            "intent": intent,
+            "rollup": rollup,
+            "guard": guard.to_dict(),
             "user": permissions['full_name'],
             "role": permissions['role']
         }
 
-    def _query_with_basic_implementation(self, question: str, username: str, permissions: Dict) -> Dict:
-        """Process query using basic implementation"""
-        # Simple keyword matching for basic queries
-        question_lower = question.lower()
-        
-        # Check if we have the query available
-        if "homework" in question_lower and ("not submitted" in question_lower or "missing" in question_lower):
-            if "homework" in self.basic_queries:
-                sql_query = self.basic_queries["homework"]
-            else:
-                return {"error": "Homework query not available in current mode"}
-        elif "performance" in question_lower or "grade" in question_lower:
-            if "performance" in self.basic_queries:
-                sql_query = self.basic_queries["performance"]
-            else:
-                return {"error": "Performance query not available in current mode"}
-        elif "attendance" in question_lower and "low" in question_lower:
-            if "attendance" in self.basic_queries:
-                sql_query = self.basic_queries["attendance"]
-            else:
-                return {"error": "Attendance query not available in current mode"}
-        elif "quiz" in question_lower or "upcoming" in question_lower:
-            if "quizzes" in self.basic_queries:
-                sql_query = self.basic_queries["quizzes"]
-            else:
-                return {"error": "Quiz query not available in current mode"}
-        else:
-            # Default to homework query if available
-            if "homework" in self.basic_queries:
-                sql_query = self.basic_queries["homework"]
+    async def aquery_natural_language(self, question: str, username: str = "super_admin",
+                                      page_size: Optional[int] = None,
+                                      semaphore: Optional[asyncio.Semaphore] = None) -> Dict:
+        """Async version of query_natural_language with the same result shape
+
+        LLM generation runs on the event loop (bounded by semaphore); RBAC and
+        SQL execution run in the default thread executor.
+        """
+        with metrics.trace() as trace:
+            result = await self._aquery_natural_language(question, username, page_size, semaphore)
+        return self._finish_trace(trace, question, username, result)
+
+    async def _aquery_natural_language(self, question: str, username: str, page_size: Optional[int],
+                                       semaphore: Optional[asyncio.Semaphore]) -> Dict:
+        try:
+            with span('permissions'):
+                permissions = self.get_user_permissions(username)
+            if not permissions:
+                return {"error": "User not found or access denied"}
+
+            local = self._local_intent(question)
+            if local is not None:
+                metrics.annotate(path="intent")
+                return await asyncio.to_thread(
+                    self._execute_generated_sql, question, local.sql, False, username, permissions,
+                    page_size, local.params, local.intent
+                )
+
+            if not self._langchain_ready():
+                metrics.annotate(path="basic")
+                return await asyncio.to_thread(
+                    self._query_with_basic_implementation, question, username, permissions, page_size
+                )
+
+            metrics.annotate(path="langchain")
+
+            if semaphore is None:
+                sql_query, cache_hit = await self._agenerate_sql(question)
             else:
-                return {"error": "No matching query template available. Please use the Quick Queries tab for available options."}
+                async with semaphore:
+                    sql_query, cache_hit = await self._agenerate_sql(question)
+
+            return await asyncio.to_thread(
+                self._execute_generated_sql, question, sql_query, cache_hit, username, permissions, page_size
+            )
+
+        except Exception as e:
+            return {
+                "error": f"Query execution failed: {str(e)}",
+                "question": question
+            }
+
+    async def aquery_batch(self, questions: List[str], username: str = "super_admin",
+                           page_size: Optional[int] = None, concurrency: Optional[int] = None) -> List[Dict]:
+        """Answer several questions concurrently; results keep the input order"""
+        semaphore = asyncio.Semaphore(concurrency or LLM_CONCURRENCY)
+        return await asyncio.gather(*(
+            self.aquery_natural_language(question, username, page_size=page_size, semaphore=semaphore)
+            for question in questions
+        ))
+
+    def query_batch(self, questions: List[str], username: str = "super_admin",
+                    page_size: Optional[int] = None, concurrency: Optional[int] = None) -> List[Dict]:
+        """Synchronous entry point for aquery_batch (e.g. from the Streamlit script thread)"""
+        return asyncio.run(self.aquery_batch(questions, username, page_size, concurrency))
+
+    def _select_basic_query(self, question: str) -> Dict:
+        """Best intent engine match regardless of confidence; {"sql_query", "params", "intent"} or {"error"}"""
+        with span('intent'):
+            match = self.intent_engine.match(question)
+        if match is None:
+            return {"error": "Could not match this question to a known query type (homework, late submissions, "
+                             "performance, attendance, quizzes, top performers). "
+                             "Please rephrase or use the Quick Queries tab."}
+        return {"sql_query": match.sql, "params": match.params, "intent": match.intent}
+
+    def generate_sql(self, question: str) -> Dict:
+        """Raw (pre-RBAC) SQL for a question from whichever mode is active
+
+        Returns {"sql_query", "params", "cache_hit", "mode"} or {"error"}. The
+        SQL is the same for every user, so callers can reuse it across RBAC scopes.
+        """
+        try:
+            local = self._local_intent(question)
+            if local is not None:
+                return {"sql_query": local.sql, "params": local.params, "cache_hit": False, "mode": "intent"}
+            if self._langchain_ready():
+                sql_query, cache_hit = self._generate_sql(question)
+                return {"sql_query": sql_query, "params": (), "cache_hit": cache_hit, "mode": "langchain"}
+            selected = self._select_basic_query(question)
+            if "error" in selected:
+                return selected
+            return {"sql_query": selected["sql_query"], "params": selected["params"],
+                    "cache_hit": False, "mode": "basic"}
+        except Exception as e:
+            return {"error": f"SQL generation failed: {str(e)}"}
+
+    def _query_with_basic_implementation(self, question: str, username: str, permissions: Dict,
+                                         page_size: Optional[int] = None,
+                                         on_progress: Optional[Callable[[str, str], None]] = None) -> Dict:
+        """Process query using basic implementation"""
+        selected = self._select_basic_query(question)
+        if "error" in selected:
+            return selected
+        sql_query, rollup = self.route_query(selected["sql_query"])
 
         # Apply RBAC filters
-        secured_query = self.apply_rbac_filter(sql_query, username)
+        secured = self.secure_query(sql_query, username, selected["params"])
+        secured_query = secured.display_sql
+        if on_progress is not None:
+            on_progress("sql", secured_query)
 
         # Execute the query
+        guard = self.guard_query(secured, page_size)
         try:
-            conn = sqlite3.connect(self.db_path)
-            result_df = pd.read_sql_query(secured_query, conn)
-            conn.close()
+            result_df, _, handle, result_cached = self._execute_secured(secured, sql_query, page_size, guard,
+                                                                             username)
         except Exception as e:
-            return {"error": f"Database query failed: {str(e)}"}
+            return {"error": f"Database query failed: {str(e)}", "guard": guard.to_dict()}
 
         # Determine the note based on available features
         if hasattr(self, 'has_genai') and self.has_genai:
-            note = "Using basic implementation with keyword matching - install LangChain for advanced NL processing"
+            note = "Using basic implementation with local intent matching - install LangChain for advanced NL processing"
         else:
             note = "Using template-only mode - install google-generativeai and LangChain for full NL processing"
 
@@ -419,12 +849,18 @@ class AdvancedDumrooNL2SQL:
             "question": question,
             "sql_query": secured_query,
             "result": result_df,
+            "result_handle": handle,
+            "result_cache_hit": result_cached,
+            "intent": selected["intent"],
+            "rollup": rollup,
+            "guard": guard.to_dict(),
             "user": permissions['full_name'],
             "role": permissions['role'],
             "note": note
         }
 
-    def get_sample_questions(self) -> List[str]:
+    @staticmethod
+    def get_sample_questions() -> List[str]:
         """Get sample natural language questions"""
         return [
             "Which students haven't submitted their homework yet?",
@@ -439,6 +875,108 @@ class AdvancedDumrooNL2SQL:
             "Which students submitted homework late last week?"
         ]
 
+def render_downloads(export, key: str):
+    """CSV, Parquet and Arrow download buttons; export(fmt) runs only when one is clicked"""
+    formats = [fmt for fmt in EXPORT_FORMATS if fmt == 'csv' or ARROW_AVAILABLE]
+    for column, fmt in zip(st.columns(len(formats)), formats):
+        file_name, mime = EXPORT_FORMATS[fmt]
+        column.download_button(
+            f"📥 {fmt.upper() if fmt == 'csv' else fmt.title()}",
+            functools.partial(export, fmt),
+            file_name=file_name,
+            mime=mime,
+            key=f"{key}_download_{fmt}"
+        )
+
+
+def render_paged_result(result: Dict, key: str):
+    """Show one page of a result with a total-count estimate and streamed downloads"""
+    handle = result.get('result_handle')
+    if handle is None:
+        st.subheader(f"📋 Results ({len(result['result'])} records)")
+        st.dataframe(result['result'], use_container_width=True)
+        render_downloads(functools.partial(export_frame, result['result']), key)
+        return
+
+    total = handle.total_estimate()
+    total_label = f"{total['rows']}" if total['exact'] else f"{total['rows']}+"
+    st.subheader(f"📋 Results ({total_label} records)")
+
+    page_number = 0
+    if handle.page_count() > 1:
+        page_number = st.number_input(
+            f"Page (of {handle.page_count()}{'' if total['exact'] else '+'})",
+            min_value=1, max_value=handle.page_count(), value=1, step=1, key=f"{key}_page"
+        ) - 1
+    st.dataframe(handle.page(page_number), use_container_width=True)
+
+    # Downloads stream from the cursor only when clicked
+    render_downloads(handle.export_file, key)
+
+
+def render_debug_panel(system: AdvancedDumrooNL2SQL, result: Optional[Dict]):
+    """Stage timings for the last question plus process-wide histograms and slow queries"""
+    st.header("🐞 Debug Panel")
+    if result and result.get('timings_ms'):
+        timings = result['timings_ms']
+        st.subheader(f"⏱️ Last question: {timings.get('total', 0):.1f} ms")
+        stages = pd.DataFrame(
+            [{'stage': stage, 'ms': ms} for stage, ms in timings.items() if stage != 'total']
+        )
+        if not stages.empty:
+            st.bar_chart(stages.set_index('stage'))
+
+    guard = (result or {}).get('guard')
+    if guard:
+        st.subheader(f"🛡️ Cost guard: {guard['action']} (~{guard['estimated_cost']:,} rows visited)")
+        for reason in guard['reasons']:
+            st.caption(reason)
+        st.code('\n'.join(guard['plan']) or '(no plan)', language='text')
+
+    snapshot = metrics.REGISTRY.snapshot()
+    if snapshot:
+        st.subheader("📈 Stage latency since startup (bucketed)")
+        st.dataframe(pd.DataFrame.from_dict(snapshot, orient='index').round(2), use_container_width=True)
+
+    cache = system.result_cache.stats()
+    st.subheader("♻️ Shared result cache")
+    st.caption(f"{cache['entries']} results, {cache['bytes'] / 2**20:.1f} of {cache['max_bytes'] / 2**20:.0f} MiB, "
+               f"hit rate {cache['hit_rate']:.0%}, {cache['evictions']} evicted, "
+               f"{cache['invalidations']} invalidated by writes")
+
+    if system.model_router is not None:
+        routing = system.model_router.stats()
+        st.subheader(f"🔀 Models ({routing['hedges']} hedged, {routing['hedge_wins']} won by the hedge)")
+        st.dataframe(pd.DataFrame.from_dict(routing['models'], orient='index'), use_container_width=True)
+
+    if system.shard_router is not None:
+        shards = system.shard_router.stats()
+        st.subheader(f"🧩 Shards ({shards['shards']} regions)")
+        st.caption(f"{shards['single']} single-shard, {shards['scattered']} scatter-gather, "
+                   f"{shards['main_database']} on the main database")
+
+    coalesced = metrics.REGISTRY.coalesced
+    st.caption(f"🤝 Coalesced with an identical in-flight call: {coalesced['generate']} generations, "
+               f"{coalesced['execute']} executions")
+
+    slow = system.slow_query_log.tail(10)
+    st.subheader(f"🐢 Slow queries (≥ {system.slow_query_log.threshold_ms:.0f} ms)")
+    if slow:
+        st.dataframe(pd.DataFrame(slow)[['ts', 'user', 'path', 'total_ms', 'rows', 'question']],
+                     use_container_width=True)
+    else:
+        st.caption("None recorded")
+
+    st.download_button("📥 Prometheus metrics", metrics.REGISTRY.render_prometheus(),
+                       file_name="metrics.prom", mime="text/plain", key="debug_metrics")
+
+
+@st.cache_resource
+def get_query_service() -> QueryService:
+    """One warm query service for every browser session served by this process"""
+    return get_service()
+
+
 def create_advanced_streamlit_app():
     """Create advanced Streamlit application"""
 
@@ -482,23 +1020,22 @@ def create_advanced_streamlit_app():
     st.markdown('<div class="main-header"><h1>🤖 Dumroo AI Assistant - Advanced NL2SQL</h1></div>', 
                 unsafe_allow_html=True)
 
-    # Initialize the system
-    if 'nl2sql_system' not in st.session_state:
-        with st.spinner("Initializing AI system..."):
-            try:
-                st.session_state.nl2sql_system = AdvancedDumrooNL2SQL()
-            except Exception as e:
-                st.error(f"Failed to initialize system: {e}")
-                return
+    # Every session shares the process-wide engine; only the first one pays for start-up
+    with st.spinner("Initializing AI system..."):
+        try:
+            service = get_query_service()
+        except Exception as e:
+            st.error(f"Failed to initialize system: {e}")
+            return
 
-    system = st.session_state.nl2sql_system
+    system = service.system
 
     # Sidebar for user authentication
     st.sidebar.header("👤 User Authentication")
 
     # User selection
-    available_users = system.admin_df[['username', 'full_name', 'role']].to_dict('records')
-    user_options = {f"{user['full_name']} ({user['role']})": user['username'] 
+    available_users = system.permission_registry.users()
+    user_options = {f"{user.full_name} ({user.role})": user.username
                    for user in available_users}
 
     selected_user_display = st.sidebar.selectbox(
@@ -507,6 +1044,8 @@ def create_advanced_streamlit_app():
         index=0
     )
     selected_username = user_options[selected_user_display]
+    # Warm the Quick Queries tab for this user while they look around; no-op when already current
+    service.quick_queries.prefetch(selected_username)
 
     # Display user info
     permissions = system.get_user_permissions(selected_username)
@@ -521,6 +1060,8 @@ def create_advanced_streamlit_app():
         </div>
         """, unsafe_allow_html=True)
 
+    show_debug = st.sidebar.checkbox("🐞 Debug panel", value=os.getenv('DEBUG_PANEL', '0') == '1')
+
     # Status indicator
     if LANGCHAIN_AVAILABLE:
         st.success("🚀 **Advanced Mode**: Full LangChain NL2SQL capabilities enabled")
@@ -556,37 +1097,56 @@ def create_advanced_streamlit_app():
         # Query execution
         if st.button("🚀 Execute Query", type="primary"):
             if user_question.strip():
-                with st.spinner("Processing your question..."):
-                    result = system.query_natural_language(user_question, selected_username)
+                with st.status("Processing your question...", expanded=True) as status:
+                    sql_preview = st.empty()
+
+                    def show_progress(event: str, text: str):
+                        sql_preview.code(text, language='sql')
+                        if event == "sql":
+                            status.update(label="Running the secured query...")
+                        else:
+                            status.update(label="Generating SQL...")
+
+                    result = service.query(user_question, selected_username,
+                                           page_size=RESULT_PAGE_SIZE, on_progress=show_progress)
+                    status.update(label="Query failed" if "error" in result else "Done",
+                                  state="error" if "error" in result else "complete", expanded=False)
+                st.session_state.last_result = (selected_username, result)
+            else:
+                st.warning("Please enter a question!")
 
-                if "error" in result:
-                    st.error(f"❌ {result['error']}")
+        # Keep the last result across reruns (page changes) for the same user
+        last_result = st.session_state.get('last_result')
+        if last_result and last_result[0] == selected_username:
+            result = last_result[1]
+            if "error" in result:
+                st.error(f"❌ {result['error']}")
+            else:
+                st.success(f"✅ Query executed successfully!")
+                if result.get('cache_hit'):
+                    st.caption("⚡ SQL served from cache")
+                elif result.get('intent'):
+                    st.caption(f"⚡ Answered locally ({result['intent'].replace('_', ' ')})")
+                if result.get('rollup'):
+                    st.caption(f"📦 Aggregated from {result['rollup']}")
+                if result.get('result_cache_hit'):
+                    st.caption("♻️ Rows served from the shared result cache")
+                guard = result.get('guard') or {}
+                if guard.get('truncated'):
+                    st.warning(f"✂️ Showing the first {guard['row_cap']:,} rows; "
+                               f"ask a narrower question or page through the results")
+
+                # Show results
+                if not result['result'].empty:
+                    st.markdown(f'<div class="query-result">', unsafe_allow_html=True)
+                    render_paged_result(result, key="nl_result")
+                    st.markdown('</div>', unsafe_allow_html=True)
                 else:
-                    st.success(f"✅ Query executed successfully!")
+                    st.info("No results found for your query.")
 
-                    # Show results
-                    if not result['result'].empty:
-                        st.markdown(f'<div class="query-result">', unsafe_allow_html=True)
-                        st.subheader(f"📋 Results ({len(result['result'])} records)")
-                        st.dataframe(result['result'], use_container_width=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
-
-                        # Download option
-                        csv = result['result'].to_csv(index=False)
-                        st.download_button(
-                            "📥 Download Results",
-                            csv,
-                            file_name="query_results.csv",
-                            mime="text/csv"
-                        )
-                    else:
-                        st.info("No results found for your query.")
-
-                    # Show generated SQL
-                    with st.expander("🔍 View Generated SQL"):
-                        st.code(result['sql_query'], language='sql')
-            else:
-                st.warning("Please enter a question!")
+                # Show generated SQL
+                with st.expander("🔍 View Generated SQL"):
+                    st.code(result['sql_query'], language='sql')
 
     with tab2:
         st.header("Quick Access Queries")
@@ -595,28 +1155,44 @@ def create_advanced_streamlit_app():
         # This would use the same queries as the basic implementation
         # but with LangChain-enhanced natural language capabilities
 
-        quick_queries = {
-            "📚 Missing Homework": "Which students haven't submitted their homework?",
-            "📊 Performance Summary": "Show performance summary by grade",
-            "📅 Upcoming Quizzes": "List upcoming quizzes for next week",
-            "⏰ Attendance Issues": "Which students have attendance below 80%?",
-            "🏆 Top Performers": "Who are the top performing students this month?",
-            "📈 Subject Analysis": "Show average performance by subject"
-        }
+        # Precompiled SQL, already running for this user in the background since they were selected
+        quick_queries = service.quick_queries
+        run_all = st.button("⚡ Run All Quick Queries", key="quick_all")
 
         cols = st.columns(2)
-        for i, (title, query) in enumerate(quick_queries.items()):
+        clicked = []
+        for i, query in enumerate(quick_queries.queries.values()):
             col = cols[i % 2]
-            if col.button(title, key=f"quick_{i}"):
-                with st.spinner("Executing query..."):
-                    result = system.query_natural_language(query, selected_username)
-
-                    if "error" in result:
-                        st.error(f"❌ {result['error']}")
-                    else:
-                        st.success(f"✅ {title} - Query executed!")
-                        if not result['result'].empty:
-                            st.dataframe(result['result'])
+            if col.button(query.title, key=f"quick_{i}"):
+                clicked.append(query)
+        if run_all:
+            clicked = list(quick_queries.queries.values())
+
+        if clicked:
+            prefetched = {query.key: quick_queries.ready(query.key, selected_username) for query in clicked}
+            with st.spinner("Executing query..."):
+                results = [quick_queries.get(query.key, selected_username) for query in clicked]
+
+            for query, result in zip(clicked, results):
+                title = query.title
+                if "error" in result:
+                    st.error(f"❌ {title}: {result['error']}")
+                else:
+                    st.success(f"✅ {title} - Query executed!")
+                    if prefetched[query.key]:
+                        st.caption("⚡ Prefetched in the background")
+                    if not result['result'].empty:
+                        if result.get('result_handle') is not None:
+                            total = result['result_handle'].total_estimate()
+                            st.caption(f"Showing first {len(result['result'])} of "
+                                       f"{total['rows']}{'' if total['exact'] else '+'} records")
+                        else:
+                            st.caption(f"{len(result['result'])} records")
+                        st.dataframe(result['result'])
+
+    if show_debug:
+        last_result = st.session_state.get('last_result')
+        render_debug_panel(system, last_result[1] if last_result else None)
 
 if __name__ == "__main__":
     create_advanced_streamlit_app()
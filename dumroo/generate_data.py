@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic data generator for the Dumroo education database
+Builds the same six tables as data/*.csv at a chosen scale factor, with
+NumPy-generated columns written to SQLite in batches. Scale factor 1 is about
+the size of the bundled data (412 students, 16k submissions); 1000 gives
+roughly 412k students and 16M submissions.
+
+Usage:
+    python generate_data.py --scale 100 --db dumroo_sf100.db
+    python generate_data.py --scale 1000 --db dumroo_sf1000.db --seed 7 --batch-size 500000
+"""
+
+import os
+import sys
+import time
+import argparse
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ingest import (TABLE_SCHEMAS, LOAD_ORDER, _insert_sql, create_table, create_indexes,
+                    read_batches)
+from rollups import build_rollups
+
+GRADES = ['Grade 6', 'Grade 7', 'Grade 8', 'Grade 9', 'Grade 10']
+SECTIONS = ['A', 'B', 'C']
+REGIONS = ['North Delhi', 'South Delhi', 'East Delhi', 'West Delhi', 'Central Delhi']
+REGION_WEIGHTS = [0.16, 0.19, 0.21, 0.22, 0.22]
+SUBJECTS = ['Mathematics', 'Science', 'English', 'Social Studies', 'Hindi', 'Computer Science']
+ASSESSMENT_TYPES = ['Quiz', 'Test', 'Project', 'Assignment']
+FIRST_NAMES = ['Vihaan', 'Aarav', 'Pihu', 'Reyansh', 'Anaya', 'Aadhya', 'Anvi', 'Khushi', 'Vivaan', 'Diya',
+               'Aditya', 'Arjun', 'Prisha', 'Shaurya', 'Ishaan', 'Inaya', 'Krishna', 'Riya', 'Ayaan', 'Kavya']
+LAST_NAMES = ['Sharma', 'Mittal', 'Verma', 'Singh', 'Jain', 'Saxena', 'Agarwal', 'Kumar', 'Bansal', 'Gupta']
+QUIZ_TOPICS = ['Basics', 'Applications', 'Problem Solving', 'Advanced']
+QUIZ_TIMES = ['09:00', '09:30', '10:00', '10:30', '11:00', '11:30', '12:00', '13:00', '14:00', '14:30']
+
+# Per-class shape of the bundled data; only the number of students scales
+STUDENTS_PER_SCALE = 412
+HOMEWORK_PER_SUBJECT = 6.5
+ASSESSMENTS_PER_STUDENT = 13.5
+TERM_START = np.datetime64('2025-07-30')
+FIRST_STUDENT_ID = 1000
+
+Columns = Dict[str, np.ndarray]
+
+
+def _rng(seed: int, *stream: int) -> np.random.Generator:
+    """Independent generator per (table, chunk) so output does not depend on batching"""
+    return np.random.default_rng([seed, *stream])
+
+
+def _dates(days: np.ndarray, start: np.datetime64 = TERM_START) -> np.ndarray:
+    """Day offsets -> 'YYYY-MM-DD' strings"""
+    return (start + days.astype('timedelta64[D]')).astype(str)
+
+
+def _rows(columns: Columns, names: Sequence[str]) -> List[Tuple]:
+    return list(zip(*(columns[name].tolist() for name in names)))
+
+
+def class_sizes(scale: float, seed: int) -> np.ndarray:
+    """Students per (grade, section) class, summing to STUDENTS_PER_SCALE * scale"""
+    total = max(len(GRADES) * len(SECTIONS), int(round(STUDENTS_PER_SCALE * scale)))
+    weights = _rng(seed, 0).dirichlet(np.full(len(GRADES) * len(SECTIONS), 200.0))
+    sizes = np.floor(weights * total).astype(np.int64)
+    sizes[:total - sizes.sum()] += 1
+    return sizes
+
+
+def class_of(index: int) -> Tuple[str, str]:
+    return GRADES[index // len(SECTIONS)], SECTIONS[index % len(SECTIONS)]
+
+
+def generate_students(sizes: np.ndarray, seed: int, chunk_rows: int) -> Iterator[Columns]:
+    """Students class by class, ids contiguous per class"""
+    next_id = FIRST_STUDENT_ID
+    for class_index, size in enumerate(sizes):
+        grade, section = class_of(class_index)
+        for offset in range(0, int(size), chunk_rows):
+            n = min(chunk_rows, int(size) - offset)
+            rng = _rng(seed, 1, class_index, offset)
+            ids = np.arange(next_id, next_id + n)
+            next_id += n
+            names = np.char.add(np.char.add(rng.choice(FIRST_NAMES, n), ' '), rng.choice(LAST_NAMES, n))
+            yield {
+                'student_id': ids,
+                'student_name': names,
+                'grade': np.full(n, grade),
+                'section': np.full(n, section),
+                'region': rng.choice(REGIONS, n, p=REGION_WEIGHTS),
+                'enrollment_date': _dates(rng.integers(-325, 7, n)),
+                'parent_contact': rng.integers(6_000_000_000, 10_000_000_000, n),
+                'email': np.char.add(np.char.add('student', ids.astype(str)), '@dumroo.edu'),
+                'attendance_percentage': np.clip(np.rint(rng.normal(86.5, 7.0, n)), 55, 100).astype(np.int64),
+            }
+
+
+def generate_homework(seed: int) -> Columns:
+    """Homework per class and subject, one assignment every ~7 days"""
+    rng = _rng(seed, 2)
+    rows: Dict[str, list] = {name: [] for name, _ in TABLE_SCHEMAS['homework']}
+    homework_id = 1
+    for class_index in range(len(GRADES) * len(SECTIONS)):
+        grade, section = class_of(class_index)
+        for subject in SUBJECTS:
+            count = int(rng.integers(int(HOMEWORK_PER_SUBJECT) - 1, int(HOMEWORK_PER_SUBJECT) + 3))
+            starts = np.cumsum(rng.integers(5, 10, count)) - 5
+            for number, start in enumerate(starts, start=1):
+                rows['homework_id'].append(homework_id)
+                rows['title'].append(f"{subject} Assignment {number}")
+                rows['subject'].append(subject)
+                rows['grade'].append(grade)
+                rows['section'].append(section)
+                rows['assigned_date'].append(int(start))
+                rows['due_date'].append(int(start) + 7)
+                rows['total_marks'].append(int(rng.choice([10, 15, 20, 25])))
+                homework_id += 1
+    columns = {name: np.array(values) for name, values in rows.items()}
+    columns['assigned_date'] = _dates(columns['assigned_date'])
+    columns['due_date'] = _dates(columns['due_date'])
+    return columns
+
+
+def generate_quizzes(seed: int) -> Columns:
+    rng = _rng(seed, 3)
+    rows: Dict[str, list] = {name: [] for name, _ in TABLE_SCHEMAS['quizzes']}
+    quiz_id = 1
+    for class_index in range(len(GRADES) * len(SECTIONS)):
+        grade, section = class_of(class_index)
+        for _ in range(int(rng.integers(3, 7))):
+            subject = str(rng.choice(SUBJECTS))
+            rows['quiz_id'].append(quiz_id)
+            rows['quiz_title'].append(f"{subject} Quiz - Chapter {int(rng.integers(1, 8))}")
+            rows['subject'].append(subject)
+            rows['grade'].append(grade)
+            rows['section'].append(section)
+            rows['scheduled_date'].append(int(rng.integers(38, 52)))
+            rows['scheduled_time'].append(str(rng.choice(QUIZ_TIMES)))
+            rows['duration_minutes'].append(int(rng.choice([30, 45, 60], p=[0.25, 0.3, 0.45])))
+            rows['total_marks'].append(int(rng.choice([20, 25, 30])))
+            rows['syllabus_topics'].append(f"Chapter {int(rng.integers(1, 8))} - {rng.choice(QUIZ_TOPICS)}")
+            quiz_id += 1
+    columns = {name: np.array(values) for name, values in rows.items()}
+    columns['scheduled_date'] = _dates(columns['scheduled_date'])
+    return columns
+
+
+def _ability(student_ids: np.ndarray, seed: int) -> np.ndarray:
+    """Stable per-student ability in [-1, 1], shared by submissions and performance"""
+    return np.tanh(_rng(seed, 4).standard_normal(int(student_ids.max()) + 1)[student_ids] * 0.8)
+
+
+def generate_submissions(sizes: np.ndarray, homework: Columns, seed: int, chunk_rows: int) -> Iterator[Columns]:
+    """One submission row per (homework, student in that homework's class)"""
+    due_days = (homework['due_date'].astype('datetime64[D]') - TERM_START).astype(np.int64)
+    class_keys = np.char.add(homework['grade'], homework['section'])
+    first_ids = FIRST_STUDENT_ID + np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ability = _ability(np.arange(FIRST_STUDENT_ID, FIRST_STUDENT_ID + int(sizes.sum())), seed)
+    next_id = 1
+
+    for class_index, size in enumerate(sizes):
+        grade, section = class_of(class_index)
+        class_homework = np.flatnonzero(class_keys == grade + section)
+        students = np.arange(first_ids[class_index], first_ids[class_index] + size)
+        per_chunk = max(1, chunk_rows // max(1, len(class_homework)))
+        for offset in range(0, int(size), per_chunk):
+            rng = _rng(seed, 5, class_index, offset)
+            chunk_students = students[offset:offset + per_chunk]
+            student_ids = np.tile(chunk_students, len(class_homework))
+            hw_index = np.repeat(class_homework, len(chunk_students))
+            n = len(student_ids)
+            skill = ability[student_ids - FIRST_STUDENT_ID]
+
+            submitted = rng.random(n) < np.clip(0.85 + 0.1 * skill, 0.5, 0.99)
+            late = submitted & (rng.random(n) < np.clip(0.08 - 0.05 * skill, 0.01, 0.2))
+            offsets = np.where(late, rng.integers(1, 5, n), -rng.integers(0, 8, n))
+            total_marks = homework['total_marks'][hw_index]
+            ratio = np.clip(rng.normal(0.74 + 0.15 * skill, 0.12), 0.3, 1.0)
+            marks = np.where(submitted, np.rint(ratio * total_marks), 0).astype(np.int64)
+            dates = _dates(due_days[hw_index] + offsets).astype(object)
+            dates[~submitted] = None
+
+            yield {
+                'submission_id': np.arange(next_id, next_id + n),
+                'homework_id': homework['homework_id'][hw_index],
+                'student_id': student_ids,
+                'submitted_date': dates,
+                'is_submitted': submitted.astype(np.int64),
+                'is_late': late.astype(np.int64),
+                'marks_obtained': marks,
+                'total_marks': total_marks,
+            }
+            next_id += n
+
+
+def generate_performance(sizes: np.ndarray, seed: int, chunk_rows: int) -> Iterator[Columns]:
+    """Poisson-many assessments per student, scores shifted by the student's ability"""
+    total_students = int(sizes.sum())
+    all_ids = np.arange(FIRST_STUDENT_ID, FIRST_STUDENT_ID + total_students)
+    ability = _ability(all_ids, seed)
+    per_chunk = max(1, int(chunk_rows / ASSESSMENTS_PER_STUDENT))
+    next_id = 1
+
+    for offset in range(0, total_students, per_chunk):
+        rng = _rng(seed, 6, offset)
+        chunk_ids = all_ids[offset:offset + per_chunk]
+        counts = rng.poisson(ASSESSMENTS_PER_STUDENT, len(chunk_ids))
+        student_ids = np.repeat(chunk_ids, counts)
+        n = len(student_ids)
+        percentage = np.clip(np.rint(rng.normal(74 + 12 * ability[student_ids - FIRST_STUDENT_ID], 8)),
+                             35, 100).astype(np.int64)
+        letters = np.select([percentage >= 90, percentage >= 80, percentage >= 70, percentage >= 50],
+                            ['A', 'B', 'C', 'D'], 'F')
+        yield {
+            'performance_id': np.arange(next_id, next_id + n),
+            'student_id': student_ids,
+            'subject': rng.choice(SUBJECTS, n),
+            'assessment_type': rng.choice(ASSESSMENT_TYPES, n),
+            'assessment_date': _dates(rng.integers(9, 37, n)),
+            'marks_obtained': percentage,
+            'total_marks': np.full(n, 100, dtype=np.int64),
+            'percentage': percentage,
+            'grade_letter': letters,
+        }
+        next_id += n
+
+
+def _write_batch(conn: sqlite3.Connection, table: str, columns: List[str], batch: List[Tuple]) -> int:
+    conn.execute('BEGIN')
+    conn.executemany(_insert_sql(table, columns, upsert=False), batch)
+    conn.execute('COMMIT')
+    return len(batch)
+
+
+def _write(conn: sqlite3.Connection, table: str, chunks: Iterator[Columns]) -> int:
+    names = [name for name, _ in TABLE_SCHEMAS[table]]
+    return sum(_write_batch(conn, table, names, _rows(columns, names)) for columns in chunks)
+
+
+def generate(db_path: str, scale: float = 1.0, seed: int = 42, batch_size: int = 200000,
+             admin_users_csv: str = 'data/admin_users.csv') -> List[Dict]:
+    """Build a fresh database at db_path; written to a temp file and swapped in at the end"""
+    tmp_path = f"{db_path}.building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    # A throwaway file until the final rename: no journal or fsync needed
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -262144')
+
+    sizes = class_sizes(scale, seed)
+    homework = generate_homework(seed)
+    generators = {
+        'students': lambda: generate_students(sizes, seed, batch_size),
+        'homework': lambda: iter([homework]),
+        'quizzes': lambda: iter([generate_quizzes(seed)]),
+        'submissions': lambda: generate_submissions(sizes, homework, seed, batch_size),
+        'performance': lambda: generate_performance(sizes, seed, batch_size),
+    }
+
+    stats = []
+    try:
+        for table in LOAD_ORDER:
+            start = time.perf_counter()
+            create_table(conn, table)
+            if table == 'admin_users':
+                # RBAC users are real configuration, not synthetic
+                rows = sum(_write_batch(conn, table, columns, batch)
+                           for columns, batch in read_batches(admin_users_csv, table, batch_size))
+            else:
+                rows = _write(conn, table, generators[table]())
+            stats.append({'table': table, 'rows': rows, 'seconds': time.perf_counter() - start})
+            print(f"✅ {table}: {rows:,} rows in {stats[-1]['seconds']:.2f}s")
+
+        start = time.perf_counter()
+        create_indexes(conn)
+        build_rollups(conn)
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA journal_mode = WAL')
+        print(f"✅ Indexes, rollups and ANALYZE in {time.perf_counter() - start:.2f}s")
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(tmp_path, db_path)
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Dumroo database at a given scale")
+    parser.add_argument('--scale', type=float, default=1.0, help="scale factor (1 = bundled data size)")
+    parser.add_argument('--db', help="output SQLite file (default: dumroo_sf<scale>.db)")
+    parser.add_argument('--seed', type=int, default=42, help="same seed and scale give identical data")
+    parser.add_argument('--batch-size', type=int, default=200000, help="rows generated and inserted per batch")
+    parser.add_argument('--admin-users', default=os.getenv('ADMIN_USERS_PATH', 'data/admin_users.csv'),
+                        help="admin users CSV copied into the database")
+    parser.add_argument('--force', action='store_true', help="overwrite an existing database")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or f"dumroo_sf{args.scale:g}.db"
+    if os.path.exists(db_path) and not args.force:
+        print(f"❌ {db_path} exists; pass --force to overwrite")
+        return 1
+
+    start = time.perf_counter()
+    stats = generate(db_path, args.scale, args.seed, args.batch_size, args.admin_users)
+    total_rows = sum(s['rows'] for s in stats)
+    elapsed = time.perf_counter() - start
+    print(f"🎉 Generated {total_rows:,} rows into {db_path} in {elapsed:.1f}s "
+          f"({total_rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Bulk CSV -> SQLite ingestion for the Dumroo education database
+Streams data/*.csv in batches, supports incremental upserts, builds the
+indexes the hot queries rely on, brings the rollup tables up to date and
+finishes with ANALYZE
+
+Usage:
+    python ingest.py                         # full rebuild of dumroo_education.db
+    python ingest.py --mode upsert           # only insert/update changed rows
+    python ingest.py --db other.db --data-dir exports/ --batch-size 20000
+    python ingest.py --shard-dir shards/     # also build one database per region
+"""
+
+import os
+import csv
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from rollups import build_rollups, drop_triggers, refresh_rollups
+from sharding import REPLICATED_TABLES, SHARD_COLUMN, SHARD_DIR, shard_file_name, write_manifest
+
+# Table definitions mirror data/*.csv; the first column is the natural key
+TABLE_SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    'students': [
+        ('student_id', 'INTEGER'), ('student_name', 'TEXT'), ('grade', 'TEXT'),
+        ('section', 'TEXT'), ('region', 'TEXT'), ('enrollment_date', 'TEXT'),
+        ('parent_contact', 'INTEGER'), ('email', 'TEXT'), ('attendance_percentage', 'INTEGER'),
+    ],
+    'homework': [
+        ('homework_id', 'INTEGER'), ('title', 'TEXT'), ('subject', 'TEXT'), ('grade', 'TEXT'),
+        ('section', 'TEXT'), ('assigned_date', 'TEXT'), ('due_date', 'TEXT'), ('total_marks', 'INTEGER'),
+    ],
+    'submissions': [
+        ('submission_id', 'INTEGER'), ('homework_id', 'INTEGER'), ('student_id', 'INTEGER'),
+        ('submitted_date', 'TEXT'), ('is_submitted', 'INTEGER'), ('is_late', 'INTEGER'),
+        ('marks_obtained', 'INTEGER'), ('total_marks', 'INTEGER'),
+    ],
+    'performance': [
+        ('performance_id', 'INTEGER'), ('student_id', 'INTEGER'), ('subject', 'TEXT'),
+        ('assessment_type', 'TEXT'), ('assessment_date', 'TEXT'), ('marks_obtained', 'INTEGER'),
+        ('total_marks', 'INTEGER'), ('percentage', 'INTEGER'), ('grade_letter', 'TEXT'),
+    ],
+    'quizzes': [
+        ('quiz_id', 'INTEGER'), ('quiz_title', 'TEXT'), ('subject', 'TEXT'), ('grade', 'TEXT'),
+        ('section', 'TEXT'), ('scheduled_date', 'TEXT'), ('scheduled_time', 'TEXT'),
+        ('duration_minutes', 'INTEGER'), ('total_marks', 'INTEGER'), ('syllabus_topics', 'TEXT'),
+    ],
+    'admin_users': [
+        ('admin_id', 'INTEGER'), ('username', 'TEXT'), ('email', 'TEXT'), ('full_name', 'TEXT'),
+        ('role', 'TEXT'), ('assigned_grades', 'TEXT'), ('assigned_sections', 'TEXT'),
+        ('assigned_regions', 'TEXT'), ('permissions', 'TEXT'), ('created_date', 'TEXT'),
+    ],
+}
+
+# Load order respects foreign keys (students before their submissions, etc.)
+LOAD_ORDER = ['students', 'homework', 'quizzes', 'submissions', 'performance', 'admin_users']
+
+# Indexes backing RBAC scoping and the common join paths
+INDEXES: Dict[str, Tuple[str, Sequence[str]]] = {
+    'idx_students_scope': ('students', ('grade', 'section', 'region')),
+    'idx_submissions_student_homework': ('submissions', ('student_id', 'homework_id')),
+    'idx_submissions_homework': ('submissions', ('homework_id',)),
+    'idx_performance_student_subject_date': ('performance', ('student_id', 'subject', 'assessment_date')),
+    'idx_homework_grade_section': ('homework', ('grade', 'section')),
+    'idx_quizzes_grade_section': ('quizzes', ('grade', 'section')),
+}
+
+# Older indexes made redundant by a wider one above
+SUPERSEDED_INDEXES = ['idx_students_grade_section', 'idx_submissions_student', 'idx_performance_student']
+
+
+def key_column(table: str) -> str:
+    return TABLE_SCHEMAS[table][0][0]
+
+
+def _to_integer(value: str):
+    if value == '':
+        return None
+    lowered = value.lower()
+    if lowered == 'true':
+        return 1
+    if lowered == 'false':
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _to_text(value: str):
+    return None if value == '' else value
+
+
+def _converters(table: str, header: List[str]) -> List[Callable]:
+    """Per-column converters in CSV header order"""
+    types = dict(TABLE_SCHEMAS[table])
+    missing = [name for name in types if name not in header]
+    if missing:
+        raise ValueError(f"{table}.csv is missing columns: {', '.join(missing)}")
+    return [_to_integer if types.get(name) == 'INTEGER' else _to_text for name in header]
+
+
+def read_batches(csv_path: str, table: str, batch_size: int) -> Iterator[Tuple[List[str], List[Tuple]]]:
+    """Stream typed rows from a CSV in fixed-size batches"""
+    columns = [name for name, _ in TABLE_SCHEMAS[table]]
+    with open(csv_path, newline='', encoding='utf-8') as handle:
+        reader = csv.reader(handle)
+        header = [name.strip() for name in next(reader)]
+        converters = _converters(table, header)
+        positions = [header.index(name) for name in columns]
+        batch = []
+        for raw in reader:
+            if not raw:
+                continue
+            batch.append(tuple(converters[i](raw[i]) for i in positions))
+            if len(batch) >= batch_size:
+                yield columns, batch
+                batch = []
+        if batch:
+            yield columns, batch
+
+
+def create_table(conn: sqlite3.Connection, table: str, name: Optional[str] = None):
+    """Create a table (as name, if given) with its natural key as INTEGER PRIMARY KEY"""
+    columns = TABLE_SCHEMAS[table]
+    definitions = [f'"{columns[0][0]}" INTEGER PRIMARY KEY']
+    definitions += [f'"{column}" {sql_type}' for column, sql_type in columns[1:]]
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{name or table}" (\n  ' + ',\n  '.join(definitions) + '\n)')
+
+
+def staging_name(table: str) -> str:
+    """Where a full reload builds a table before it is swapped in"""
+    return f'{table}__loading'
+
+
+def ensure_key_index(conn: sqlite3.Connection, table: str):
+    """Upserts need a uniqueness constraint on the key; older databases lack one"""
+    key = key_column(table)
+    for column in conn.execute(f'PRAGMA table_info("{table}")'):
+        if column[1] == key and column[5]:
+            return      # already the primary key
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_{key}" ON "{table}"("{key}")')
+
+
+def create_indexes(conn: sqlite3.Connection, tables: Optional[Sequence[str]] = None):
+    """Create hot-path indexes and drop the narrower ones they replace"""
+    for index_name, (table, columns) in INDEXES.items():
+        if tables is not None and table not in tables:
+            continue
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table}"({column_list})')
+    for index_name in SUPERSEDED_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+
+
+def _insert_sql(table: str, columns: List[str], upsert: bool) -> str:
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    placeholders = ', '.join('?' * len(columns))
+    sql = f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})'
+    if upsert:
+        key = columns[0]
+        others = columns[1:]
+        assignments = ', '.join(f'"{c}" = excluded."{c}"' for c in others)
+        changed = ' OR '.join(f'"{table}"."{c}" IS NOT excluded."{c}"' for c in others)
+        sql += f' ON CONFLICT("{key}") DO UPDATE SET {assignments} WHERE {changed}'
+    return sql
+
+
+def load_table(conn: sqlite3.Connection, table: str, csv_path: str, mode: str = 'full',
+               batch_size: int = 5000, swap: bool = True) -> Dict:
+    """Load one CSV; one transaction per batch. Returns row statistics
+
+    A full load builds the table under staging_name() and, unless swap is
+    False (see swap_in_tables), replaces the live table with it in one
+    transaction, so readers never see it empty or half loaded. rows_written
+    counts the rows the statements changed, not rows written by triggers.
+    """
+    start = time.perf_counter()
+    upsert = mode == 'upsert'
+
+    if upsert:
+        target = table
+        create_table(conn, table)
+        ensure_key_index(conn, table)
+    else:
+        target = staging_name(table)
+        conn.execute(f'DROP TABLE IF EXISTS "{target}"')
+        create_table(conn, table, target)
+
+    rows_read = 0
+    rows_written = 0
+    for columns, batch in read_batches(csv_path, table, batch_size):
+        sql = _insert_sql(target, columns, upsert)
+        conn.execute('BEGIN')
+        try:
+            cursor = conn.executemany(sql, batch)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        rows_read += len(batch)
+        rows_written += cursor.rowcount
+
+    if not upsert and swap:
+        swap_in_tables(conn, [table])
+
+    return {
+        'table': table,
+        'rows_read': rows_read,
+        'rows_written': rows_written,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def swap_in_tables(conn: sqlite3.Connection, tables: Sequence[str]):
+    """Replace each live table with its fully loaded staging copy, indexes included, in one transaction"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for table in tables:
+            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.execute(f'ALTER TABLE "{staging_name(table)}" RENAME TO "{table}"')
+        create_indexes(conn, tables)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def connect_for_write(db_path: str) -> sqlite3.Connection:
+    """Writer connection tuned for bulk loads; WAL keeps read-only readers unblocked"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -65536')
+    return conn
+
+
+def ingest(db_path: str, data_dir: str = 'data', mode: str = 'full', batch_size: int = 5000,
+           tables: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Load every table's CSV into db_path, then index, refresh rollups and ANALYZE"""
+    tables = [t for t in LOAD_ORDER if tables is None or t in tables]
+    conn = connect_for_write(db_path)
+    stats = []
+    try:
+        if mode == 'full':
+            # Reloaded tables are re-aggregated once at the end rather than per row
+            drop_triggers(conn)
+        for table in tables:
+            csv_path = os.path.join(data_dir, f'{table}.csv')
+            if not os.path.exists(csv_path):
+                print(f"⚠️ Skipping {table}: {csv_path} not found")
+                continue
+            result = load_table(conn, table, csv_path, mode=mode, batch_size=batch_size, swap=False)
+            stats.append(result)
+            print(f"✅ {table}: {result['rows_read']} rows read, {result['rows_written']} written "
+                  f"in {result['seconds']:.2f}s")
+
+        if mode == 'full':
+            # Every reloaded table goes live at once, like ingest_shards swapping in a whole directory
+            swap_in_tables(conn, [result['table'] for result in stats])
+        create_indexes(conn, tables)
+        start = time.perf_counter()
+        if mode == 'full':
+            build_rollups(conn)
+        else:
+            refresh_rollups(conn)
+        print(f"✅ Rollups up to date in {time.perf_counter() - start:.2f}s")
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return stats
+
+
+def _student_regions(data_dir: str, batch_size: int) -> Dict[int, Optional[str]]:
+    """student_id -> region, used to place every fact row next to its student"""
+    csv_path = os.path.join(data_dir, 'students.csv')
+    regions: Dict[int, Optional[str]] = {}
+    for columns, batch in read_batches(csv_path, 'students', batch_size):
+        key, position = columns.index('student_id'), columns.index(SHARD_COLUMN)
+        regions.update((row[key], row[position]) for row in batch)
+    return regions
+
+
+def ingest_shards(shard_dir: str, data_dir: str = 'data', batch_size: int = 5000) -> Dict[str, int]:
+    """Build one database per region from the CSVs; returns rows written per shard
+
+    Students go to their region's shard and submissions/performance follow the
+    student; homework, quizzes and admin_users are copied to every shard. Rows
+    without a region (or whose student is unknown) go to the first shard. The
+    layout is built next to shard_dir and swapped in whole, manifest last.
+    """
+    student_regions = _student_regions(data_dir, batch_size)
+    regions = sorted({region for region in student_regions.values() if region is not None})
+    if not regions:
+        raise ValueError("students.csv has no regions to shard by")
+    default_region = regions[0]
+
+    building = shard_dir.rstrip(os.sep) + '.building'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    files = {region: shard_file_name(region) for region in regions}
+    conns = {region: connect_for_write(os.path.join(building, name)) for region, name in files.items()}
+    written = dict.fromkeys(regions, 0)
+    try:
+        for table in LOAD_ORDER:
+            csv_path = os.path.join(data_dir, f'{table}.csv')
+            if not os.path.exists(csv_path):
+                print(f"⚠️ Skipping {table}: {csv_path} not found")
+                continue
+            for conn in conns.values():
+                create_table(conn, table)
+            for columns, batch in read_batches(csv_path, table, batch_size):
+                sql = _insert_sql(table, columns, upsert=False)
+                if table in REPLICATED_TABLES:
+                    routed = dict.fromkeys(regions, batch)
+                else:
+                    key = columns.index(SHARD_COLUMN if table == 'students' else 'student_id')
+                    routed = {region: [] for region in regions}
+                    for row in batch:
+                        region = row[key] if table == 'students' else student_regions.get(row[key])
+                        routed[region if region in routed else default_region].append(row)
+                for region, rows in routed.items():
+                    if not rows:
+                        continue
+                    conn = conns[region]
+                    conn.execute('BEGIN')
+                    try:
+                        conn.executemany(sql, rows)
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+                    written[region] += len(rows)
+
+        for conn in conns.values():
+            drop_triggers(conn)
+            create_indexes(conn)
+            build_rollups(conn)
+            conn.execute('ANALYZE')
+            conn.execute('PRAGMA optimize')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+    write_manifest(building, files, default_region)
+    retired = shard_dir.rstrip(os.sep) + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(shard_dir):
+        os.rename(shard_dir, retired)
+    os.rename(building, shard_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+    for region in regions:
+        print(f"✅ Shard {region}: {written[region]} rows in {files[region]}")
+    return written
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load Dumroo CSV exports into SQLite")
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'dumroo_education.db'),
+                        help="target SQLite database (default: %(default)s)")
+    parser.add_argument('--data-dir', default='data', help="directory containing <table>.csv files")
+    parser.add_argument('--mode', choices=['full', 'upsert'], default='full',
+                        help="full: rebuild tables and swap them in; upsert: only insert/update changed rows")
+    parser.add_argument('--batch-size', type=int, default=5000, help="rows per executemany transaction")
+    parser.add_argument('--tables', nargs='+', choices=LOAD_ORDER, help="subset of tables to load")
+    parser.add_argument('--shard-dir', default=SHARD_DIR,
+                        help="also rebuild one database per region in this directory (default: $SHARD_DIR)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        stats = ingest(args.db, args.data_dir, args.mode, args.batch_size, args.tables)
+        if args.shard_dir:
+            # Shards are always rebuilt whole from the CSVs, whatever --mode/--tables say
+            ingest_shards(args.shard_dir, args.data_dir, args.batch_size)
+    except Exception as e:
+        print(f"❌ Ingestion failed: {e}")
+        return 1
+
+    total_rows = sum(s['rows_read'] for s in stats)
+    elapsed = time.perf_counter() - start
+    print(f"🎉 Loaded {total_rows} rows into {args.db} in {elapsed:.2f}s "
+          f"({total_rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""
+Local intent + slot engine for the Dumroo NL2SQL system
+Recognizes the common question shapes (missing homework, late submissions,
+performance, attendance, upcoming quizzes, top performers), extracts grade,
+section, region, subject, date-range and threshold slots, and emits
+parameterized SQL without an LLM round trip
+"""
+
+import os
+import re
+import datetime as dt
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db_engine import QueryExecutor
+
+# Matches at or above this confidence are answered locally, skipping the LLM
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.8'))
+
+DEFAULT_VOCABULARY = {
+    'grades': ['Grade 6', 'Grade 7', 'Grade 8', 'Grade 9', 'Grade 10'],
+    'sections': ['A', 'B', 'C'],
+    'regions': ['North Delhi', 'South Delhi', 'East Delhi', 'West Delhi', 'Central Delhi'],
+    'subjects': ['Mathematics', 'Science', 'English', 'Social Studies', 'Hindi', 'Computer Science'],
+}
+
+SUBJECT_ALIASES = {
+    'math': 'Mathematics', 'maths': 'Mathematics',
+    'computer': 'Computer Science', 'computers': 'Computer Science', 'cs': 'Computer Science',
+    'social science': 'Social Studies', 'sst': 'Social Studies',
+}
+
+# (intent, topic pattern, cue pattern) in priority order; topic alone scores
+# 0.6, topic + cue 0.9
+_INTENT_RULES = [
+    ('late_submissions',
+     r'\b(?:submissions?|submitted|submit|homework|assignments?|turned in)\b',
+     r'\b(?:late|overdue|after (?:the )?due date)\b'),
+    ('missing_homework',
+     r'\b(?:homework|assignments?)\b',
+     r"\b(?:not submitted|(?:haven'?t|have not|hasn'?t|has not|didn'?t|did not|not) (?:yet )?(?:submitted|submit|turned in|done)"
+     r"|unsubmitted|missing|pending|incomplete|outstanding)\b"),
+    ('upcoming_quizzes',
+     r'\b(?:quiz|quizzes|quizes)\b',
+     r'\b(?:upcoming|scheduled|next|coming|future|planned|when)\b'),
+    ('attendance',
+     r'\battendance\b',
+     r'\b(?:low|poor|bad|high|good|excellent|perfect|below|under|less than|lower than|above|over|more than|'
+     r'at least|at most|average|avg|by|per)\b'),
+    ('top_performers',
+     r'\b(?:students?|performers?|pupils?|scorers?|toppers?|achievers?)\b',
+     r'\b(?:top|best|highest|toppers?|lowest|worst|bottom|weakest|struggling|rank(?:ed|ing)?)\b'),
+    ('performance',
+     r'\b(?:performance|scores?|scoring|scored|marks|results?|percentages?|grades? summary)\b',
+     r'\b(?:summary|summari[sz]e|overview|report|average|avg|by|per|below|under|less than|lower than|'
+     r'above|over|more than|at least|at most|show|list)\b'),
+]
+
+# An intent that wins over these when both match
+_SUBSUMES = {
+    'attendance': {'top_performers', 'performance'},
+    'top_performers': {'performance'},
+    'late_submissions': {'missing_homework'},
+}
+
+# Question shapes the templates cannot express; these go to the LLM
+_UNSUPPORTED_RE = re.compile(
+    r'\b(?:why|compare|comparison|compared|versus|vs\.?|correlat\w*|trends?|monthly|weekly|'
+    r'over time|teachers?|parents?|emails?|contacts?|phone|enrol(?:l)?(?:ed|ment)|ratio|difference|'
+    r'increase[sd]?|decrease[sd]?|improv\w*|declin\w*|predict\w*|both|neither|except|excluding|without)\b'
+)
+
+# Ratios ("what percentage of homework was late") are not row listings or counts
+_RATIO_RE = re.compile(
+    r'\b(?:what|which)\s+(?:percentage|percent|proportion|fraction|share)\b'
+    r'|(?<!average )(?<!avg )(?<!mean )\b(?:percentage|percent|proportion|fraction|share)\s+of\b'
+    r'|\b(?:rates?|how many of|how many percent|out of)\b'
+)
+# Negations the templates would silently drop ("no homework pending", "submitted on time");
+# looked for outside the intent's cue and the extracted slots, which already carry "not submitted" etc.
+_NEGATION_RE = re.compile(r"\b(?:no|not|none|never|nothing|nobody|without|zero|on time|in time)\b|n't\b")
+# Due dates only mean something to the missing-homework template (it filters h.due_date)
+_DUE_RE = re.compile(r'\b(?:due|deadlines?)\b')
+_COUNT_RE = re.compile(r'\b(?:how many|count|number of|total number)\b')
+_STUDENTS_RE = re.compile(r'\bstudents?\b')
+_GROUP_RE = re.compile(r'\b(?:by|per|for each|each|across)\s+(grades?|sections?|regions?|subjects?|assessment types?)\b')
+# "Which subjects ..." / "top 3 subjects" ask for one row per subject, like "by subject"
+_WHICH_GROUP_RE = re.compile(
+    r'\b(?:which|what|top|best|highest|lowest|worst|bottom|weakest)\s+(?:\d{1,4}\s+)?'
+    r'(grades?|sections?|regions?|subjects?|assessment types?)\b(?!\s*(?:\d|[a-z]\b))'
+)
+_GROUP_COLUMNS = {'grade': 's.grade', 'section': 's.section', 'region': 's.region',
+                  'subject': 'p.subject', 'assessment type': 'p.assessment_type'}
+
+_GRADE_RE = re.compile(r'\b(?:grade|class|std\.?)\s*(\d{1,2})\s*-?\s*([a-z])?\b(?!\s*%)')
+_GRADE_LIST_RE = re.compile(r'\b(?:grades|classes)\s+(\d{1,2}(?:\s*(?:,|and|&|or|to|-)\s*\d{1,2})+)\b')
+_ORDINAL_GRADE_RE = re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?\s*(?:grade|graders?)\b')
+_SECTION_RE = re.compile(r'\bsections?\s+([a-z](?:\s*(?:,|and|&|or)\s*[a-z])*)\b')
+_THRESHOLD_RE = re.compile(
+    r'(?P<op>below|under|less than|lower than|fewer than|<=|<|above|over|more than|greater than|higher than|'
+    r'>=|>|at least|at most|no more than|not more than)\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<pct>%|percent)?'
+)
+_OPERATORS = {
+    'below': '<', 'under': '<', 'less than': '<', 'lower than': '<', 'fewer than': '<', '<': '<',
+    '<=': '<=', 'at most': '<=', 'no more than': '<=', 'not more than': '<=',
+    'above': '>', 'over': '>', 'more than': '>', 'greater than': '>', 'higher than': '>', '>': '>',
+    '>=': '>=', 'at least': '>=',
+}
+_LIMIT_RE = re.compile(r'\b(?:top|best|highest|lowest|worst|bottom|weakest|first)\s+(\d{1,4})\b')
+_BOTTOM_RE = re.compile(r'\b(?:lowest|worst|bottom|weakest|struggling|poorest)\b')
+_TOP_RE = re.compile(r'\b(?:highest|best|top|strongest)\b')
+_ASSESSMENT_RE = re.compile(r'\b(quiz|test|project|assignment)(?:zes|s)?\b')
+_ISO_DATE = r'(\d{4}-\d{2}-\d{2})'
+_NUMBER_RE = re.compile(r'\d{4}-\d{2}-\d{2}|\d+(?:\.\d+)?')
+
+
+class IntentMatch:
+    """A recognized question: intent name, extracted slots and parameterized SQL"""
+
+    __slots__ = ('intent', 'confidence', 'slots', 'sql', 'params')
+
+    def __init__(self, intent: str, confidence: float, slots: Dict, sql: str, params: Tuple):
+        self.intent = intent
+        self.confidence = confidence
+        self.slots = slots
+        self.sql = sql
+        self.params = params
+
+    def __repr__(self) -> str:
+        return f"IntentMatch(intent={self.intent!r}, confidence={self.confidence:.2f})"
+
+
+def load_vocabulary(executor: QueryExecutor) -> Dict[str, List[str]]:
+    """Distinct grades, sections, regions and subjects from the database"""
+    queries = {
+        'grades': "SELECT DISTINCT grade FROM students",
+        'sections': "SELECT DISTINCT section FROM students",
+        'regions': "SELECT DISTINCT region FROM students",
+        'subjects': "SELECT subject FROM homework UNION SELECT subject FROM quizzes",
+    }
+    vocabulary = {}
+    for name, sql in queries.items():
+        try:
+            values = [row[0] for row in executor.execute(sql).rows if row[0]]
+        except Exception:
+            values = []
+        vocabulary[name] = values or list(DEFAULT_VOCABULARY[name])
+    return vocabulary
+
+
+class _SqlBuilder:
+    """Accumulates clauses and their parameters in placeholder order"""
+
+    def __init__(self, select: List[str], from_clause: str):
+        self.select = select
+        self.from_clause = from_clause
+        self.where: List[str] = []
+        self.where_params: List = []
+        self.group_by: List[str] = []
+        self.having: List[str] = []
+        self.having_params: List = []
+        self.order_by: List[str] = []
+        self.limit: Optional[int] = None
+
+    def filter(self, clause: str, *params):
+        self.where.append(clause)
+        self.where_params.extend(params)
+
+    def filter_in(self, column: str, values):
+        if values:
+            placeholders = ', '.join('?' * len(values))
+            self.filter(f"{column} IN ({placeholders})", *values)
+
+    def build(self) -> Tuple[str, Tuple]:
+        parts = [f"SELECT {', '.join(self.select)} FROM {self.from_clause}"]
+        if self.where:
+            parts.append("WHERE " + " AND ".join(self.where))
+        if self.group_by:
+            parts.append("GROUP BY " + ", ".join(self.group_by))
+        if self.having:
+            parts.append("HAVING " + " AND ".join(self.having))
+        if self.order_by:
+            parts.append("ORDER BY " + ", ".join(self.order_by))
+        params = self.where_params + self.having_params
+        if self.limit is not None:
+            parts.append("LIMIT ?")
+            params.append(self.limit)
+        return " ".join(parts), tuple(params)
+
+
+class IntentEngine:
+    """Deterministic question -> parameterized SQL for the common intents"""
+
+    def __init__(self, vocabulary: Optional[Dict[str, List[str]]] = None,
+                 today: Optional[Callable[[], dt.date]] = None):
+        vocabulary = vocabulary or DEFAULT_VOCABULARY
+        self.today = today or dt.date.today
+        self.grades = {self._grade_number(g): g for g in vocabulary.get('grades', []) if self._grade_number(g)}
+        self.sections = {s.lower(): s for s in vocabulary.get('sections', [])}
+        self.regions = {r.lower(): r for r in vocabulary.get('regions', [])}
+
+        subjects = {s.lower(): s for s in vocabulary.get('subjects', [])}
+        subjects.update({alias: name for alias, name in SUBJECT_ALIASES.items()
+                         if name in subjects.values()})
+        # Longest names first so "computer science" wins over "science"
+        self._subject_re = re.compile(
+            r'\b(' + '|'.join(re.escape(name) for name in sorted(subjects, key=len, reverse=True)) + r')\b'
+        ) if subjects else None
+        self.subjects = subjects
+
+        region_words = {}
+        for lowered, region in self.regions.items():
+            region_words.setdefault(lowered.split()[0], []).append(region)
+        self._region_words = {word: names[0] for word, names in region_words.items() if len(names) == 1}
+        self._rules = [(name, re.compile(topic), re.compile(cue)) for name, topic, cue in _INTENT_RULES]
+        self._cues = {name: cue for name, _, cue in self._rules}
+        self._handlers = {
+            'missing_homework': self._missing_homework,
+            'late_submissions': self._late_submissions,
+            'upcoming_quizzes': self._upcoming_quizzes,
+            'attendance': self._attendance,
+            'top_performers': self._top_performers,
+            'performance': self._performance,
+        }
+
+    @staticmethod
+    def _grade_number(grade: str) -> Optional[str]:
+        match = re.search(r'\d+', str(grade))
+        return match.group() if match else None
+
+    # ----- slot extraction -------------------------------------------------
+
+    def extract_slots(self, question: str) -> Tuple[Dict, List[Tuple[int, int]]]:
+        """Slots found in a lower-cased question, plus the character spans they used"""
+        text = question.lower()
+        slots: Dict = {}
+        spans: List[Tuple[int, int]] = []
+        grades, sections = [], []
+
+        for match in _GRADE_LIST_RE.finditer(text):
+            numbers = re.findall(r'\d{1,2}', match.group(1))
+            if re.search(r'\bto\b|-', match.group(1)) and len(numbers) == 2:
+                numbers = [str(n) for n in range(int(numbers[0]), int(numbers[1]) + 1)]
+            grades.extend(numbers)
+            spans.append(match.span())
+        for pattern in (_GRADE_RE, _ORDINAL_GRADE_RE):
+            for match in pattern.finditer(text):
+                if any(start <= match.start() < end for start, end in spans):
+                    continue
+                grades.append(match.group(1))
+                if pattern is _GRADE_RE and match.group(2):
+                    sections.append(match.group(2))
+                spans.append(match.span())
+        for match in _SECTION_RE.finditer(text):
+            sections.extend(re.findall(r'\b[a-z]\b', match.group(1)))
+            spans.append(match.span())
+
+        if grades:
+            slots['grades'] = self._unique(self.grades.get(n, f"Grade {n}") for n in grades)
+        if sections:
+            slots['sections'] = self._unique(self.sections.get(s, s.upper()) for s in sections)
+
+        regions = [region for lowered, region in self.regions.items() if lowered in text]
+        for word, region in self._region_words.items():
+            if region not in regions and re.search(rf'\b{word}\s+(?:region|zone|side)\b', text):
+                regions.append(region)
+        if regions:
+            slots['regions'] = regions
+
+        if self._subject_re:
+            subjects = [self.subjects[m.group(1)] for m in self._subject_re.finditer(text)]
+            if subjects:
+                slots['subjects'] = self._unique(subjects)
+
+        date_range = self._date_range(text, spans)
+        if date_range:
+            slots['date_range'] = date_range
+
+        threshold = _THRESHOLD_RE.search(text)
+        if threshold:
+            slots['threshold'] = (_OPERATORS[threshold.group('op')], float(threshold.group('value')))
+            spans.append(threshold.span())
+
+        limit = _LIMIT_RE.search(text)
+        if limit:
+            slots['limit'] = int(limit.group(1))
+            spans.append(limit.span())
+
+        group = [g.rstrip('s') if not g.startswith('assessment') else 'assessment type'
+                 for g in _GROUP_RE.findall(text) + _WHICH_GROUP_RE.findall(text)]
+        if group:
+            slots['group_by'] = self._unique(group)
+        if _COUNT_RE.search(text):
+            slots['count'] = True
+        return slots, spans
+
+    @staticmethod
+    def _unique(values) -> List:
+        seen = []
+        for value in values:
+            if value not in seen:
+                seen.append(value)
+        return seen
+
+    def _date_range(self, text: str, spans: List[Tuple[int, int]]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """(start, end) ISO dates, either end open (None)"""
+        today = self.today()
+        week_start = today - dt.timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
+
+        def month_end(day: dt.date) -> dt.date:
+            return (day.replace(day=28) + dt.timedelta(days=4)).replace(day=1) - dt.timedelta(days=1)
+
+        match = re.search(rf'\bbetween\s+{_ISO_DATE}\s+and\s+{_ISO_DATE}', text)
+        if match:
+            spans.append(match.span())
+            return match.group(1), match.group(2)
+        start = re.search(rf'\b(?:since|after|from)\s+{_ISO_DATE}', text)
+        end = re.search(rf'\b(?:before|until|till|to)\s+{_ISO_DATE}', text)
+        if start or end:
+            for found in (start, end):
+                if found:
+                    spans.append(found.span())
+            return (start.group(1) if start else None), (end.group(1) if end else None)
+        match = re.search(rf'\bon\s+{_ISO_DATE}', text)
+        if match:
+            spans.append(match.span())
+            return match.group(1), match.group(1)
+
+        match = re.search(r'\b(?:last|past|previous)\s+(\d{1,3})\s+(day|week|month)s?\b', text)
+        if match:
+            spans.append(match.span())
+            days = int(match.group(1)) * {'day': 1, 'week': 7, 'month': 30}[match.group(2)]
+            return (today - dt.timedelta(days=days)).isoformat(), today.isoformat()
+        match = re.search(r'\bnext\s+(\d{1,3})\s+(day|week|month)s?\b', text)
+        if match:
+            spans.append(match.span())
+            days = int(match.group(1)) * {'day': 1, 'week': 7, 'month': 30}[match.group(2)]
+            return today.isoformat(), (today + dt.timedelta(days=days)).isoformat()
+
+        named = {
+            'today': (today, today),
+            'yesterday': (today - dt.timedelta(days=1), today - dt.timedelta(days=1)),
+            'tomorrow': (today + dt.timedelta(days=1), today + dt.timedelta(days=1)),
+            'this week': (week_start, week_start + dt.timedelta(days=6)),
+            'last week': (week_start - dt.timedelta(days=7), week_start - dt.timedelta(days=1)),
+            'past week': (today - dt.timedelta(days=7), today),
+            'next week': (week_start + dt.timedelta(days=7), week_start + dt.timedelta(days=13)),
+            'this month': (month_start, month_end(month_start)),
+            'last month': (month_end(month_start - dt.timedelta(days=1)).replace(day=1),
+                           month_start - dt.timedelta(days=1)),
+            'next month': (month_end(month_start) + dt.timedelta(days=1),
+                           month_end(month_end(month_start) + dt.timedelta(days=1))),
+        }
+        for phrase, (first, last) in named.items():
+            if re.search(rf'\b{phrase}\b', text):
+                return first.isoformat(), last.isoformat()
+        return None
+
+    # ----- intent scoring --------------------------------------------------
+
+    def _score_intents(self, text: str) -> List[Tuple[str, float]]:
+        scores = []
+        for name, topic, cue in self._rules:
+            if topic.search(text):
+                scores.append((name, 0.9 if cue.search(text) else 0.6))
+        return scores
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        """Best local interpretation of a question, or None if no intent applies"""
+        text = question.lower().strip()
+        scores = self._score_intents(text)
+        if not scores:
+            return None
+        intent, confidence = max(scores, key=lambda item: item[1])  # first wins ties (priority order)
+        for other, score in scores:
+            if other != intent and score >= confidence and other not in _SUBSUMES.get(intent, ()):
+                confidence -= 0.25      # two unrelated intents: probably a compound question
+
+        slots, spans = self.extract_slots(text)
+        if _UNSUPPORTED_RE.search(text) or self._changes_meaning(intent, text, spans):
+            confidence = min(confidence, 0.5)
+
+        # Numbers no slot accounted for are constraints we would silently drop
+        for number in _NUMBER_RE.finditer(text):
+            if not any(start <= number.start() < end for start, end in spans):
+                confidence -= 0.3
+                break
+
+        sql, params, unused = self._handlers[intent](text, slots)
+        confidence -= 0.3 * len(unused)
+        return IntentMatch(intent, round(max(0.0, min(1.0, confidence)), 2), slots, sql, params)
+
+    def _changes_meaning(self, intent: str, text: str, spans: List[Tuple[int, int]]) -> bool:
+        """True for ratio, negation or due-date wording the intent's template cannot express"""
+        if _RATIO_RE.search(text):
+            return True
+        rest = list(text)
+        for start, end in spans + [m.span() for m in self._cues[intent].finditer(text)]:
+            rest[start:end] = ' ' * (end - start)
+        rest = ''.join(rest)
+        return bool(_NEGATION_RE.search(rest) or (intent != 'missing_homework' and _DUE_RE.search(rest)))
+
+    # ----- SQL per intent --------------------------------------------------
+
+    @staticmethod
+    def _scope(builder: _SqlBuilder, slots: Dict, alias: str = 's', regions: bool = True):
+        builder.filter_in(f"{alias}.grade", slots.get('grades'))
+        builder.filter_in(f"{alias}.section", slots.get('sections'))
+        if regions:
+            builder.filter_in(f"{alias}.region", slots.get('regions'))
+
+    @staticmethod
+    def _dates(builder: _SqlBuilder, column: str, slots: Dict):
+        start, end = slots.get('date_range') or (None, None)
+        if start and end:
+            builder.filter(f"{column} BETWEEN ? AND ?", start, end)
+        elif start:
+            builder.filter(f"{column} >= ?", start)
+        elif end:
+            builder.filter(f"{column} <= ?", end)
+
+    @staticmethod
+    def _count(sql: str, params: Tuple) -> Tuple[str, Tuple]:
+        return f"SELECT COUNT(*) AS count FROM ({sql})", params
+
+    @staticmethod
+    def _unused(slots: Dict, supported: Tuple[str, ...]) -> List[str]:
+        return [name for name in slots if name not in supported]
+
+    def _per_student_counts(self, builder: _SqlBuilder, slots: Dict, label: str):
+        """Turn a row listing into per-student counts filtered by the threshold"""
+        op, value = slots['threshold']
+        builder.select = ["s.student_name", "s.grade", "s.section", f"COUNT(*) AS {label}"]
+        builder.group_by = ["s.student_id"]
+        builder.having.append(f"COUNT(*) {op} ?")
+        builder.having_params.append(int(value))
+        builder.order_by = [f"{label} DESC", "s.student_name"]
+
+    def _missing_homework(self, text: str, slots: Dict):
+        builder = _SqlBuilder(
+            ["DISTINCT s.student_name", "s.grade", "s.section", "h.title AS homework_title", "h.due_date", "h.subject"],
+            "students s JOIN submissions sub ON s.student_id = sub.student_id "
+            "JOIN homework h ON sub.homework_id = h.homework_id"
+        )
+        builder.filter("sub.is_submitted = 0")
+        self._scope(builder, slots)
+        builder.filter_in("h.subject", slots.get('subjects'))
+        self._dates(builder, "h.due_date", slots)
+        builder.order_by = ["h.due_date", "s.grade", "s.section", "s.student_name"]
+        if 'threshold' in slots:
+            self._per_student_counts(builder, slots, 'missing_count')
+        elif slots.get('count') and _STUDENTS_RE.search(text):
+            builder.select, builder.order_by = ["DISTINCT s.student_id"], []
+        sql, params = builder.build()
+        if slots.get('count'):
+            sql, params = self._count(sql, params)
+        return sql, params, self._unused(slots, ('grades', 'sections', 'regions', 'subjects', 'date_range',
+                                                 'threshold', 'count'))
+
+    def _late_submissions(self, text: str, slots: Dict):
+        builder = _SqlBuilder(
+            ["s.student_name", "s.grade", "s.section", "h.title AS homework_title", "h.subject",
+             "h.due_date", "sub.submitted_date"],
+            "submissions sub JOIN students s ON sub.student_id = s.student_id "
+            "JOIN homework h ON sub.homework_id = h.homework_id"
+        )
+        builder.filter("sub.is_late = 1")
+        self._scope(builder, slots)
+        builder.filter_in("h.subject", slots.get('subjects'))
+        self._dates(builder, "sub.submitted_date", slots)
+        builder.order_by = ["sub.submitted_date DESC", "s.student_name"]
+        if 'threshold' in slots:
+            self._per_student_counts(builder, slots, 'late_count')
+        elif slots.get('count') and _STUDENTS_RE.search(text):
+            builder.select, builder.order_by = ["DISTINCT s.student_id"], []
+        sql, params = builder.build()
+        if slots.get('count'):
+            sql, params = self._count(sql, params)
+        return sql, params, self._unused(slots, ('grades', 'sections', 'regions', 'subjects', 'date_range',
+                                                 'threshold', 'count'))
+
+    def _upcoming_quizzes(self, text: str, slots: Dict):
+        builder = _SqlBuilder(
+            ["q.quiz_title", "q.subject", "q.grade", "q.section", "q.scheduled_date", "q.scheduled_time",
+             "q.duration_minutes"],
+            "quizzes q"
+        )
+        self._scope(builder, slots, alias='q', regions=False)
+        builder.filter_in("q.subject", slots.get('subjects'))
+        if 'date_range' in slots:
+            self._dates(builder, "q.scheduled_date", slots)
+        elif re.search(r'\b(?:upcoming|next|coming|future)\b', text):
+            builder.filter("q.scheduled_date >= ?", self.today().isoformat())
+        builder.order_by = ["q.scheduled_date", "q.scheduled_time"]
+        if 'limit' in slots:
+            builder.limit = slots['limit']
+        sql, params = builder.build()
+        if slots.get('count'):
+            sql, params = self._count(sql, params)
+        return sql, params, self._unused(slots, ('grades', 'sections', 'subjects', 'date_range', 'limit', 'count'))
+
+    def _attendance(self, text: str, slots: Dict):
+        group = [g for g in slots.get('group_by', []) if g in ('grade', 'section', 'region')]
+        if group and not re.search(r'\b(?:low|poor|bad|high|good|excellent)\b', text) and 'threshold' not in slots:
+            columns = [_GROUP_COLUMNS[g] for g in group]
+            builder = _SqlBuilder(columns + ["ROUND(AVG(s.attendance_percentage), 1) AS avg_attendance",
+                                             "COUNT(*) AS students"], "students s")
+            self._scope(builder, slots)
+            builder.group_by = list(columns)
+            builder.order_by = list(columns)
+            sql, params = builder.build()
+            return sql, params, self._unused(slots, ('grades', 'sections', 'regions', 'group_by'))
+
+        if 'threshold' in slots:
+            op, value = slots['threshold']
+        elif re.search(r'\b(?:high|good|excellent|perfect)\b', text):
+            op, value = '>=', 90.0
+        else:
+            op, value = '<', 80.0
+        builder = _SqlBuilder(["s.student_name", "s.grade", "s.section", "s.attendance_percentage"], "students s")
+        builder.filter(f"s.attendance_percentage {op} ?", value)
+        self._scope(builder, slots)
+        builder.order_by = ["s.attendance_percentage" + (" DESC" if op.startswith('>') else ""), "s.student_name"]
+        if 'limit' in slots:
+            builder.limit = slots['limit']
+        sql, params = builder.build()
+        if slots.get('count'):
+            sql, params = self._count(sql, params)
+        return sql, params, self._unused(slots, ('grades', 'sections', 'regions', 'threshold', 'limit', 'count'))
+
+    def _performance_filters(self, builder: _SqlBuilder, text: str, slots: Dict):
+        self._scope(builder, slots)
+        builder.filter_in("p.subject", slots.get('subjects'))
+        assessment = _ASSESSMENT_RE.search(text)
+        if assessment:
+            builder.filter("p.assessment_type = ?", assessment.group(1).title())
+        self._dates(builder, "p.assessment_date", slots)
+
+    def _performance(self, text: str, slots: Dict):
+        group = slots.get('group_by')
+        if not group and re.search(r'\b(?:summary|summari[sz]e|overview|report|average|avg)\b', text):
+            group = ['grade', 'subject']
+        if group:
+            columns = [_GROUP_COLUMNS[g] for g in group]
+            builder = _SqlBuilder(columns + [
+                "ROUND(AVG(p.percentage), 1) AS avg_percentage", "MIN(p.percentage) AS min_percentage",
+                "MAX(p.percentage) AS max_percentage", "COUNT(*) AS assessments",
+            ], "performance p JOIN students s ON p.student_id = s.student_id")
+            self._performance_filters(builder, text, slots)
+            builder.group_by = list(columns)
+            builder.order_by = list(columns)
+            if _BOTTOM_RE.search(text):
+                builder.order_by.insert(0, "avg_percentage")
+            elif _TOP_RE.search(text):
+                builder.order_by.insert(0, "avg_percentage DESC")
+            if 'limit' in slots:
+                builder.limit = slots['limit']
+            if 'threshold' in slots:
+                op, value = slots['threshold']
+                builder.having.append(f"AVG(p.percentage) {op} ?")
+                builder.having_params.append(value)
+        else:
+            builder = _SqlBuilder(
+                ["s.student_name", "s.grade", "s.section", "p.subject", "p.assessment_type",
+                 "p.assessment_date", "p.percentage"],
+                "performance p JOIN students s ON p.student_id = s.student_id"
+            )
+            if 'threshold' in slots:
+                op, value = slots['threshold']
+                builder.filter(f"p.percentage {op} ?", value)
+            self._performance_filters(builder, text, slots)
+            builder.order_by = ["p.assessment_date DESC", "s.student_name"]
+        sql, params = builder.build()
+        if slots.get('count'):
+            sql, params = self._count(sql, params)
+        supported = ('grades', 'sections', 'regions', 'subjects', 'date_range', 'threshold', 'group_by', 'count')
+        return sql, params, self._unused(slots, supported + (('limit',) if group else ()))
+
+    def _top_performers(self, text: str, slots: Dict):
+        builder = _SqlBuilder(
+            ["s.student_name", "s.grade", "s.section", "ROUND(AVG(p.percentage), 1) AS avg_percentage",
+             "COUNT(*) AS assessments"],
+            "performance p JOIN students s ON p.student_id = s.student_id"
+        )
+        self._performance_filters(builder, text, slots)
+        builder.group_by = ["s.student_id"]
+        builder.order_by = ["avg_percentage" + ("" if _BOTTOM_RE.search(text) else " DESC"), "s.student_name"]
+        if 'threshold' in slots:
+            op, value = slots['threshold']
+            builder.having.append(f"AVG(p.percentage) {op} ?")
+            builder.having_params.append(value)
+        builder.limit = slots.get('limit', 10)
+        sql, params = builder.build()
+        # "Top N per grade" needs window functions; leave those to the LLM
+        return sql, params, self._unused(slots, ('grades', 'sections', 'regions', 'subjects', 'date_range',
+                                                 'threshold', 'limit'))
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and metrics for the Dumroo NL2SQL system
+Spans time each stage of a request into the current trace and into
+process-wide histograms, exposed as Prometheus text (file or HTTP endpoint).
+Requests slower than a threshold are written to a rotating JSON-lines log.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '1000'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'logs/slow_queries.jsonl')
+METRICS_FILE = os.getenv('METRICS_FILE', '')
+METRICS_FILE_INTERVAL = float(os.getenv('METRICS_FILE_INTERVAL', '5'))
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (what histogram_quantile would bracket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """Stage duration histograms plus request counters, safe across threads"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._stages: Dict[str, Histogram] = {}
+        self._requests: Dict[Tuple[str, str], int] = {}
+        self.slow_queries = 0
+        self.prompt_tokens = {'full': 0, 'sent': 0}
+        self._llm_calls: Dict[Tuple[str, str], int] = {}
+        self.hedge_wins = {'primary': 0, 'hedge': 0}
+        self.coalesced = {'generate': 0, 'execute': 0}
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count_request(self, path: str, outcome: str):
+        with self._lock:
+            self._requests[(path, outcome)] = self._requests.get((path, outcome), 0) + 1
+
+    def count_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def count_prompt_tokens(self, full: int, sent: int):
+        """Prompt tokens with the full schema vs. what was actually sent to the LLM"""
+        with self._lock:
+            self.prompt_tokens['full'] += full
+            self.prompt_tokens['sent'] += sent
+
+    def count_llm_call(self, model: str, outcome: str):
+        """One LLM call by model and outcome (ok, error, timeout, cancelled)"""
+        with self._lock:
+            self._llm_calls[(model, outcome)] = self._llm_calls.get((model, outcome), 0) + 1
+
+    def count_hedge(self, winner: str):
+        """A hedged generation, by which call answered first (primary or hedge)"""
+        with self._lock:
+            self.hedge_wins[winner] += 1
+
+    def count_coalesced(self, stage: str):
+        """A call that waited on an identical in-flight one (generate or execute) instead of running"""
+        with self._lock:
+            self.coalesced[stage] = self.coalesced.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-stage count, mean and bucketed p50/p95/p99, in milliseconds"""
+        with self._lock:
+            return {
+                stage: {
+                    'count': h.count,
+                    'mean_ms': h.sum / h.count * 1000 if h.count else 0.0,
+                    'p50_ms': h.quantile(0.50) * 1000,
+                    'p95_ms': h.quantile(0.95) * 1000,
+                    'p99_ms': h.quantile(0.99) * 1000,
+                }
+                for stage, h in sorted(self._stages.items())
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            '# HELP dumroo_stage_duration_seconds Time spent in each query pipeline stage',
+            '# TYPE dumroo_stage_duration_seconds histogram',
+        ]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                running = 0
+                for bound, count in zip(h.buckets + (float('inf'),), h.counts):
+                    running += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'dumroo_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {running}')
+                lines.append(f'dumroo_stage_duration_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'dumroo_stage_duration_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines += ['# HELP dumroo_queries_total Questions answered, by query path and outcome',
+                      '# TYPE dumroo_queries_total counter']
+            for (path, outcome), count in sorted(self._requests.items()):
+                lines.append(f'dumroo_queries_total{{path="{path}",outcome="{outcome}"}} {count}')
+
+            lines += ['# HELP dumroo_slow_queries_total Questions slower than the slow-query threshold',
+                      '# TYPE dumroo_slow_queries_total counter',
+                      f'dumroo_slow_queries_total {self.slow_queries}']
+
+            lines += ['# HELP dumroo_prompt_tokens_total LLM prompt tokens with the full schema and as sent after pruning',
+                      '# TYPE dumroo_prompt_tokens_total counter']
+            for schema, count in sorted(self.prompt_tokens.items()):
+                lines.append(f'dumroo_prompt_tokens_total{{schema="{schema}"}} {count}')
+
+            lines += ['# HELP dumroo_llm_calls_total LLM calls by model and outcome',
+                      '# TYPE dumroo_llm_calls_total counter']
+            for (model, outcome), count in sorted(self._llm_calls.items()):
+                lines.append(f'dumroo_llm_calls_total{{model="{model}",outcome="{outcome}"}} {count}')
+
+            lines += ['# HELP dumroo_llm_hedges_total Hedged generations, by which call answered first',
+                      '# TYPE dumroo_llm_hedges_total counter']
+            for winner, count in sorted(self.hedge_wins.items()):
+                lines.append(f'dumroo_llm_hedges_total{{winner="{winner}"}} {count}')
+
+            lines += ['# HELP dumroo_coalesced_total Calls that shared an identical in-flight generation or execution',
+                      '# TYPE dumroo_coalesced_total counter']
+            for stage, count in sorted(self.coalesced.items()):
+                lines.append(f'dumroo_coalesced_total{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._requests.clear()
+            self.slow_queries = 0
+            self.prompt_tokens = {'full': 0, 'sent': 0}
+            self._llm_calls.clear()
+            self.hedge_wins = {'primary': 0, 'hedge': 0}
+            self.coalesced = {'generate': 0, 'execute': 0}
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Trace:
+    """Stage timings for one request; repeated stages accumulate"""
+
+    def __init__(self):
+        self.timings_ms: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+        self._start = time.perf_counter()
+
+    def add(self, stage: str, ms: float):
+        self.timings_ms[stage] = self.timings_ms.get(stage, 0.0) + ms
+
+    def finish(self):
+        self.timings_ms['total'] = (time.perf_counter() - self._start) * 1000
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('dumroo_trace', default=None)
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Collect spans for one request (asyncio tasks and to_thread calls inherit it)"""
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.finish()
+        REGISTRY.observe_stage('total', current.timings_ms['total'] / 1000)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage into the current trace (if any) and the stage histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe_stage(stage, elapsed)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(stage, elapsed * 1000)
+
+
+def annotate(**labels: str):
+    """Attach labels (e.g. path="intent") to the current trace"""
+    current = _current_trace.get()
+    if current is not None:
+        current.labels.update(labels)
+
+
+class SlowQueryLog:
+    """Rotating JSON-lines log of requests slower than threshold_ms"""
+
+    def __init__(self, path: str = None, threshold_ms: float = None,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3):
+        self.path = path or SLOW_QUERY_LOG
+        self.threshold_ms = SLOW_QUERY_MS if threshold_ms is None else threshold_ms
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._logger: Optional[logging.Logger] = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self) -> logging.Logger:
+        with self._lock:
+            if self._logger is None:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                logger = logging.getLogger(f'dumroo.slow_queries.{os.path.abspath(self.path)}')
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                if not logger.handlers:
+                    handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                  backupCount=self.backup_count, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    logger.addHandler(handler)
+                self._logger = logger
+            return self._logger
+
+    def maybe_log(self, record: Dict) -> bool:
+        """Write the record if its total_ms crosses the threshold"""
+        if record.get('total_ms', 0.0) < self.threshold_ms:
+            return False
+        record = dict(record, ts=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self._get_logger().info(json.dumps(record, default=str))
+        REGISTRY.count_slow_query()
+        return True
+
+    def tail(self, limit: int = 20) -> List[Dict]:
+        """Most recent records from the current log file"""
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                lines = handle.readlines()[-limit:]
+        except OSError:
+            return []
+        return [json.loads(line) for line in reversed(lines) if line.strip()]
+
+
+_file_lock = threading.Lock()
+_last_file_write = 0.0
+
+
+def write_prometheus_file(path: str = None, force: bool = False) -> bool:
+    """Atomically write the exposition text for a node_exporter textfile collector
+
+    Throttled to once per METRICS_FILE_INTERVAL seconds unless force is set.
+    """
+    global _last_file_write
+    path = path or METRICS_FILE
+    if not path:
+        return False
+    with _file_lock:
+        now = time.monotonic()
+        if not force and now - _last_file_write < METRICS_FILE_INTERVAL:
+            return False
+        _last_file_write = now
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            handle.write(REGISTRY.render_prometheus())
+        os.replace(tmp_path, path)
+    return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; later calls reuse the running server"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='dumroo-metrics', daemon=True).start()
+            print(f"✅ Metrics endpoint at http://{host}:{port}/metrics")
+        return _server
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Hedged multi-model routing for the Dumroo NL2SQL system
+Sends each SQL generation to the preferred healthy model and, if it has not
+answered within that model's rolling p95 latency, hedges with the next model;
+the first SQL back wins and the other call is cancelled. A model that errors
+or fails fast gets an immediate failover. Per-model rolling latency and error
+rates drive a circuit breaker, so a model that keeps failing is skipped until
+its cool-down has passed and a single trial call succeeds.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+# Hedge with a second model; 0 sends every call to one model (still with failover)
+LLM_HEDGING = os.getenv('LLM_HEDGING', '1') != '0'
+# The hedge fires after this percentile of the primary's recent successful latencies ...
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+# ... but never sooner than this
+HEDGE_MIN_DELAY_MS = float(os.getenv('HEDGE_MIN_DELAY_MS', '300'))
+# Delay used until a model has HEDGE_MIN_SAMPLES successful calls
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv('HEDGE_DEFAULT_DELAY_MS', '2500'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+# Per-call timeout; a timed-out call counts as a failure
+LLM_TIMEOUT_MS = float(os.getenv('LLM_TIMEOUT_MS', '30000'))
+# Rolling window of calls kept per model
+MODEL_STATS_WINDOW = int(os.getenv('MODEL_STATS_WINDOW', '100'))
+# The breaker opens after this many consecutive failures ...
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '3'))
+# ... or when the window's error rate reaches this (once it has BREAKER_MIN_CALLS calls)
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10'))
+# Seconds an open breaker waits before letting one trial call through
+BREAKER_COOLDOWN_S = float(os.getenv('BREAKER_COOLDOWN_S', '30'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class NoModelAvailable(RuntimeError):
+    """Every model's circuit breaker is open"""
+
+
+class ModelHealth:
+    """Rolling latency/error window and circuit breaker for one model"""
+
+    def __init__(self, window: int = MODEL_STATS_WINDOW):
+        self.calls = deque(maxlen=window)   # (ok, latency_ms)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trips = 0
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        latencies = sorted(ms for ok, ms in self.calls if ok)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, max(0, int(round(percentile / 100 * len(latencies))) - 1))
+        return latencies[index]
+
+    @property
+    def successes(self) -> int:
+        return sum(1 for ok, _ in self.calls if ok)
+
+    @property
+    def error_rate(self) -> float:
+        return sum(1 for ok, _ in self.calls if not ok) / len(self.calls) if self.calls else 0.0
+
+    def allow(self, now: float) -> bool:
+        """Whether a call may go to this model now; claims the trial call when half-open"""
+        if self.state == OPEN and now - self.opened_at >= BREAKER_COOLDOWN_S:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+        return self.state == CLOSED
+
+    def record(self, ok: bool, latency_ms: float, now: float):
+        self.calls.append((ok, latency_ms))
+        self.trial_in_flight = False
+        if ok:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        tripped = (self.state == HALF_OPEN or self.consecutive_failures >= BREAKER_FAILURES
+                   or (len(self.calls) >= BREAKER_MIN_CALLS and self.error_rate >= BREAKER_ERROR_RATE))
+        if tripped and self.state != OPEN:
+            self.state = OPEN
+            self.opened_at = now
+            self.trips += 1
+
+    def release(self):
+        """A cancelled call says nothing about the model; give back a half-open trial"""
+        self.trial_in_flight = False
+
+
+class _Attempt:
+    __slots__ = ('name', 'chain', 'started', 'deadline', 'cancelled', 'hedge')
+
+    def __init__(self, name: str, chain: Any, started: float, hedge: bool):
+        self.name = name
+        self.chain = chain
+        self.started = started
+        self.deadline = started + LLM_TIMEOUT_MS / 1000
+        self.cancelled = threading.Event()
+        self.hedge = hedge
+
+
+class ModelRouter:
+    """Routes generations across models in preference order with hedging and failover
+
+    `call` runs attempts on worker threads and hands them a cancel event to
+    check between streamed chunks; `acall` runs them as tasks and cancels the
+    loser outright. Both return (result, model name).
+    """
+
+    def __init__(self, models: Sequence[Tuple[str, Any]], hedging: bool = None, max_workers: int = 8):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models: List[Tuple[str, Any]] = list(models)
+        self.hedging = LLM_HEDGING if hedging is None else hedging
+        self.health: Dict[str, ModelHealth] = {name: ModelHealth() for name, _ in self.models}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dumroo-llm')
+
+    @property
+    def primary(self) -> str:
+        return self.models[0][0]
+
+    def hedge_delay(self, name: str) -> float:
+        """Seconds to wait on a model before hedging"""
+        with self._lock:
+            health = self.health[name]
+            if health.successes < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_DELAY_MS / 1000
+            return max(HEDGE_MIN_DELAY_MS, health.latency_percentile(HEDGE_PERCENTILE)) / 1000
+
+    def _next(self, tried: set) -> Optional[Tuple[str, Any]]:
+        """Next untried model whose breaker lets a call through"""
+        now = time.monotonic()
+        with self._lock:
+            for name, chain in self.models:
+                if name not in tried and self.health[name].allow(now):
+                    tried.add(name)
+                    return name, chain
+        return None
+
+    def _record(self, attempt: _Attempt, outcome: str):
+        now = time.monotonic()
+        with self._lock:
+            health = self.health[attempt.name]
+            if outcome == 'cancelled':
+                health.release()
+            else:
+                health.record(outcome == 'ok', (now - attempt.started) * 1000, now)
+        metrics.REGISTRY.count_llm_call(attempt.name, outcome)
+
+    def _count_hedge(self, won: Optional[bool] = None):
+        with self._lock:
+            if won is None:
+                self.hedges += 1
+            elif won:
+                self.hedge_wins += 1
+        if won is not None:
+            metrics.REGISTRY.count_hedge('hedge' if won else 'primary')
+
+    def call(self, run: Callable[[str, Any, threading.Event, Callable[[Any], None]], Any],
+             on_progress: Optional[Callable[[Any], None]] = None) -> Tuple[Any, str]:
+        """run(name, chain, cancelled, emit) on worker threads; emit() values reach on_progress on this thread"""
+        events: "queue.Queue[Tuple[_Attempt, str, Any]]" = queue.Queue()
+        tried: set = set()
+        pending: List[_Attempt] = []
+        leader: List[Optional[_Attempt]] = [None]   # the attempt whose partial output is shown
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool) -> bool:
+            chosen = self._next(tried)
+            if chosen is None:
+                return False
+            attempt = _Attempt(chosen[0], chosen[1], time.monotonic(), hedge)
+            pending.append(attempt)
+
+            def work():
+                try:
+                    result = run(attempt.name, attempt.chain, attempt.cancelled,
+                                 lambda value: events.put((attempt, 'progress', value)))
+                    events.put((attempt, 'ok', result))
+                except BaseException as e:
+                    events.put((attempt, 'error', e))
+
+            self._pool.submit(work)
+            return True
+
+        if not launch(False):
+            raise NoModelAvailable("every model's circuit breaker is open")
+        hedge_at = pending[0].started + self.hedge_delay(pending[0].name)
+
+        while True:
+            now = time.monotonic()
+            for attempt in [a for a in pending if now >= a.deadline]:
+                attempt.cancelled.set()
+                pending.remove(attempt)
+                self._record(attempt, 'timeout')
+                last_error = TimeoutError(f"{attempt.name} did not answer within {LLM_TIMEOUT_MS:.0f} ms")
+            if self.hedging and not hedged and now >= hedge_at and pending:
+                hedged = True
+                if launch(True):
+                    self._count_hedge()
+            if not pending and not launch(False):
+                raise last_error or NoModelAvailable("no model answered")
+
+            wake = min(attempt.deadline for attempt in pending)
+            if self.hedging and not hedged:
+                wake = min(wake, hedge_at)
+            try:
+                attempt, kind, value = events.get(timeout=max(0.0, wake - time.monotonic()))
+            except queue.Empty:
+                continue
+
+            if attempt not in pending:
+                continue    # late event from a timed-out call
+            if kind == 'progress':
+                if leader[0] is None or leader[0] not in pending:
+                    leader[0] = attempt
+                if leader[0] is attempt and on_progress is not None:
+                    on_progress(value)
+                continue
+            pending.remove(attempt)
+            if kind == 'ok':
+                self._record(attempt, 'ok')
+                for other in pending:
+                    other.cancelled.set()
+                    self._record(other, 'cancelled')
+                if hedged:
+                    self._count_hedge(attempt.hedge)
+                return value, attempt.name
+            # A failed call fails over at once (top of the loop) rather than waiting for the hedge delay
+            self._record(attempt, 'error')
+            last_error = value
+
+    async def acall(self, arun: Callable[[str, Any], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Async counterpart of call: arun(name, chain) as tasks, the loser is cancelled"""
+        tried: set = set()
+        tasks: Dict[asyncio.Task, _Attempt] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch(hedge: bool) -> bool:
+            chosen = self._next(tried)
+            if chosen is None:
+                return False
+            attempt = _Attempt(chosen[0], chosen[1], time.monotonic(), hedge)
+            tasks[asyncio.ensure_future(arun(attempt.name, attempt.chain))] = attempt
+            return True
+
+        if not launch(False):
+            raise NoModelAvailable("every model's circuit breaker is open")
+        first = next(iter(tasks.values()))
+        hedge_at = first.started + self.hedge_delay(first.name)
+
+        try:
+            while True:
+                now = time.monotonic()
+                wake = min(attempt.deadline for attempt in tasks.values())
+                if self.hedging and not hedged:
+                    wake = min(wake, hedge_at)
+                done, _ = await asyncio.wait(list(tasks), timeout=max(0.0, wake - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt = tasks.pop(task)
+                    if task.exception() is None:
+                        self._record(attempt, 'ok')
+                        if hedged:
+                            self._count_hedge(attempt.hedge)
+                        return task.result(), attempt.name
+                    self._record(attempt, 'error')
+                    last_error = task.exception()
+                now = time.monotonic()
+                for task, attempt in [(t, a) for t, a in tasks.items() if now >= a.deadline]:
+                    task.cancel()
+                    del tasks[task]
+                    self._record(attempt, 'timeout')
+                    last_error = TimeoutError(f"{attempt.name} did not answer within {LLM_TIMEOUT_MS:.0f} ms")
+                if self.hedging and not hedged and now >= hedge_at and tasks:
+                    hedged = True
+                    if launch(True):
+                        self._count_hedge()
+                if not tasks and not launch(False):
+                    raise last_error or NoModelAvailable("no model answered")
+        finally:
+            for task, attempt in tasks.items():
+                task.cancel()
+                self._record(attempt, 'cancelled')
+
+    def stats(self) -> Dict:
+        """Per-model breaker state, rolling p50/p95 and error rate, plus hedge counters"""
+        with self._lock:
+            return {
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'models': {
+                    name: {
+                        'state': health.state,
+                        'calls': len(health.calls),
+                        'error_rate': health.error_rate,
+                        'p50_ms': health.latency_percentile(50),
+                        'p95_ms': health.latency_percentile(95),
+                        'trips': health.trips,
+                    }
+                    for name, health in self.health.items()
+                },
+            }
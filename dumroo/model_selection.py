@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of the Gemini model chosen for each backend
+Lets new sessions skip model discovery until the entry's TTL expires
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+
+class ModelSelectionCache:
+    """JSON file mapping backend name -> {"model": ..., "selected_at": ...}"""
+
+    def __init__(self, cache_path: str = None, ttl_seconds: int = None):
+        self.cache_path = cache_path or os.getenv('MODEL_SELECTION_CACHE_PATH', '.cache/model_selection.json')
+        self.ttl_seconds = ttl_seconds or int(os.getenv('MODEL_SELECTION_TTL_SECONDS', str(24 * 3600)))
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.cache_path, encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: Dict):
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(entries, handle, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def get(self, backend: str) -> Optional[str]:
+        """Cached model name for a backend, or None if missing or expired"""
+        with self._lock:
+            entry = self._read().get(backend)
+        if not entry or time.time() - entry.get('selected_at', 0) > self.ttl_seconds:
+            return None
+        return entry.get('model')
+
+    def put(self, backend: str, model: str):
+        with self._lock:
+            entries = self._read()
+            entries[backend] = {'model': model, 'selected_at': time.time()}
+            self._write(entries)
+
+    def invalidate(self, backend: str):
+        """Forget a backend's model, e.g. after it failed on a real request"""
+        with self._lock:
+            entries = self._read()
+            if entries.pop(backend, None) is not None:
+                self._write(entries)
+
+    def ordered(self, backend: str, candidates: List[str]) -> List[str]:
+        """Candidates with the cached choice (if any) moved to the front"""
+        cached = self.get(backend)
+        if cached in candidates:
+            return [cached] + [name for name in candidates if name != cached]
+        return list(candidates)
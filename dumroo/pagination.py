@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Paginated result delivery for the Dumroo NL2SQL system
+Result handles fetch pages lazily (keyset pagination where the query allows it,
+LIMIT/OFFSET otherwise) and stream CSV exports straight from the cursor
+"""
+
+import csv
+import io
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Any
+
+import pandas as pd
+
+from columnar import write_export
+from db_engine import QueryExecutor, QueryResult
+from rbac import tokenize
+from schema_catalog import SchemaCatalog
+
+# Clauses that make the row order or row identity unsafe for keyset paging
+_KEYSET_BLOCKERS = {'ORDER', 'LIMIT', 'GROUP', 'DISTINCT', 'UNION', 'EXCEPT', 'INTERSECT',
+                    'JOIN', 'WITH', 'HAVING', 'OFFSET', 'WINDOW'}
+_AGGREGATES = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'TOTAL', 'GROUP_CONCAT'}
+
+
+def detect_keyset_column(sql_query: str, catalog: SchemaCatalog) -> Optional[str]:
+    """Key column usable for keyset paging, or None if the query needs LIMIT/OFFSET
+
+    Only plain single-table SELECTs qualify: the table's leading *_id column is
+    unique per row there, so "WHERE key > last ORDER BY key" walks every row once.
+    """
+    tokens = [tok for tok in tokenize(sql_query) if tok.kind not in ('ws', 'comment')]
+    if not tokens or tokens[0].upper != 'SELECT':
+        return None
+
+    depth = 0
+    from_tables = []
+    for i, tok in enumerate(tokens):
+        if tok.text == '(':
+            depth += 1
+            continue
+        if tok.text == ')':
+            depth -= 1
+            continue
+        if depth:
+            continue
+        upper = tok.upper if tok.kind == 'ident' else tok.text
+        if upper in _KEYSET_BLOCKERS or (upper == ',' and from_tables):
+            return None
+        if tok.kind == 'ident' and upper in _AGGREGATES and i + 1 < len(tokens) and tokens[i + 1].text == '(':
+            return None
+        if upper == 'FROM' and i + 1 < len(tokens) and tokens[i + 1].kind == 'ident':
+            from_tables.append(tokens[i + 1].name)
+
+    if len(from_tables) != 1:
+        return None
+    table = catalog.get_table(from_tables[0])
+    if table is None or not table.columns:
+        return None
+    key = table.columns[0][0]
+    return key if key.lower().endswith('_id') else None
+
+
+class ResultHandle:
+    """Lazily paged result set for one secured query"""
+
+    def __init__(self, executor: QueryExecutor, sql_query: str, params: Sequence[Any] = (),
+                 page_size: int = 500, keyset_column: Optional[str] = None, count_cap: int = 100000):
+        self.executor = executor
+        self.sql_query = sql_query.strip().rstrip(';')
+        self.params = tuple(params or ())
+        self.page_size = page_size
+        self.keyset_column = keyset_column
+        self.count_cap = count_cap
+        self.columns: List[str] = []
+        self.first_page_result: Optional[QueryResult] = None
+        self._pages: Dict[int, pd.DataFrame] = {}
+        self._last_keys: Dict[int, Any] = {}
+        self._total: Optional[int] = None
+        self._total_is_exact = False
+        self._lock = threading.Lock()
+
+    @property
+    def pagination_mode(self) -> str:
+        return 'keyset' if self.keyset_column else 'offset'
+
+    def page(self, page_number: int = 0) -> pd.DataFrame:
+        """Fetch one page (0-based), caching it for reruns"""
+        with self._lock:
+            cached = self._pages.get(page_number)
+            if cached is not None:
+                return cached
+            frame = self._fetch_page(page_number)
+            self._pages[page_number] = frame
+            if len(frame) < self.page_size:
+                # A short page pins down the exact total
+                self._total = page_number * self.page_size + len(frame)
+                self._total_is_exact = True
+            return frame
+
+    def first_page(self) -> pd.DataFrame:
+        return self.page(0)
+
+    def _fetch_page(self, page_number: int) -> pd.DataFrame:
+        if self.keyset_column:
+            try:
+                return self._fetch_keyset(page_number)
+            except Exception as e:
+                # Column not in the output (or renamed); fall back for good
+                print(f"⚠️ Keyset pagination unavailable ({e}); using LIMIT/OFFSET")
+                self.keyset_column = None
+                self._last_keys.clear()
+        sql = f"SELECT * FROM (\n{self.sql_query}\n) LIMIT ? OFFSET ?"
+        result = self.executor.execute(sql, self.params + (self.page_size, page_number * self.page_size))
+        return self._accept(page_number, result)
+
+    def _fetch_keyset(self, page_number: int) -> pd.DataFrame:
+        key = '"' + self.keyset_column.replace('"', '""') + '"'
+        if page_number == 0:
+            sql = f"SELECT * FROM (\n{self.sql_query}\n) ORDER BY {key} LIMIT ?"
+            params = self.params + (self.page_size,)
+        elif page_number - 1 in self._last_keys:
+            sql = f"SELECT * FROM (\n{self.sql_query}\n) WHERE {key} > ? ORDER BY {key} LIMIT ?"
+            params = self.params + (self._last_keys[page_number - 1], self.page_size)
+        else:
+            # Jumping ahead: seek by offset once, then continue by key
+            sql = f"SELECT * FROM (\n{self.sql_query}\n) ORDER BY {key} LIMIT ? OFFSET ?"
+            params = self.params + (self.page_size, page_number * self.page_size)
+
+        frame = self._accept(page_number, self.executor.execute(sql, params))
+        if len(frame):
+            last_key = frame[self.keyset_column].iloc[-1]
+            self._last_keys[page_number] = last_key.item() if hasattr(last_key, 'item') else last_key
+        return frame
+
+    def _accept(self, page_number: int, result: QueryResult) -> pd.DataFrame:
+        self.columns = result.columns
+        if page_number == 0:
+            self.first_page_result = result
+        return result.to_dataframe()
+
+    def total_estimate(self) -> Dict:
+        """Row count, exact up to count_cap; 'exact' is False when capped"""
+        with self._lock:
+            if self._total is None:
+                sql = f"SELECT COUNT(*) FROM (SELECT 1 FROM (\n{self.sql_query}\n) LIMIT ?)"
+                count = self.executor.execute(sql, self.params + (self.count_cap + 1,)).rows[0][0]
+                self._total_is_exact = count <= self.count_cap
+                self._total = min(count, self.count_cap)
+            return {'rows': self._total, 'exact': self._total_is_exact}
+
+    def page_count(self) -> int:
+        total = self.total_estimate()['rows']
+        return max(1, -(-total // self.page_size))
+
+    def iter_csv_chunks(self, chunk_rows: int = 5000) -> Iterator[str]:
+        """Stream the full result as CSV text chunks from a single cursor"""
+        with self.executor.pool.connection() as conn:
+            cursor = conn.execute(self.sql_query, self.params)
+            try:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow([col[0] for col in cursor.description or []])
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            finally:
+                cursor.close()
+
+    def csv_file(self, chunk_rows: int = 5000):
+        """Spooled binary file of the CSV export; spills to disk beyond 8 MB"""
+        spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b')
+        for chunk in self.iter_csv_chunks(chunk_rows):
+            spool.write(chunk.encode('utf-8'))
+        spool.seek(0)
+        return spool
+
+    def export_file(self, fmt: str = 'csv', chunk_rows: int = 50000):
+        """Spooled binary file of the full result as csv, parquet or arrow (IPC stream), from one cursor"""
+        if fmt == 'csv':
+            return self.csv_file()
+        spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b')
+        with self.executor.pool.connection() as conn:
+            cursor = conn.execute(self.sql_query, self.params)
+            try:
+                columns = [col[0] for col in cursor.description or []]
+                chunks = iter(lambda: cursor.fetchmany(chunk_rows), [])
+                write_export(fmt, spool, columns, chunks, self.executor.typer)
+            finally:
+                cursor.close()
+        spool.seek(0)
+        return spool
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Materialize every row (use only for bounded results)"""
+        return self.executor.execute(self.sql_query, self.params).to_dataframe()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Permission registry for the Dumroo NL2SQL system
+Compiled, read-only view of data/admin_users.csv with O(1) lookups by username
+"""
+
+import os
+import ast
+import csv
+import time
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+
+def _split_scope(value: str) -> Optional[FrozenSet[str]]:
+    """Split a comma-separated scope field; None means ALL"""
+    value = (value or '').strip()
+    if not value or value.upper() == 'ALL':
+        return None
+    parts = frozenset(part.strip() for part in value.split(',') if part.strip())
+    if any(part.upper() == 'ALL' for part in parts):
+        return None
+    return parts
+
+
+def _parse_permission_list(value: str) -> Tuple[str, ...]:
+    """Parse the "['read_all', ...]" permissions column"""
+    value = (value or '').strip()
+    if not value:
+        return ()
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        parsed = value.strip('[]').split(',')
+    if isinstance(parsed, str):
+        parsed = [parsed]
+    return tuple(str(item).strip().strip("'\"") for item in parsed if str(item).strip())
+
+
+class AdminUser:
+    """Immutable admin record with scope fields pre-split into frozensets"""
+
+    __slots__ = ('admin_id', 'username', 'email', 'full_name', 'role',
+                 'assigned_grades', 'assigned_sections', 'assigned_regions',
+                 'grades', 'sections', 'regions', 'permissions', 'created_date')
+
+    def __init__(self, row: Dict[str, str]):
+        values = {
+            'admin_id': int(row['admin_id']) if row.get('admin_id') else None,
+            'username': row['username'].strip(),
+            'email': row.get('email', ''),
+            'full_name': row.get('full_name', ''),
+            'role': row.get('role', ''),
+            'assigned_grades': row.get('assigned_grades', 'ALL'),
+            'assigned_sections': row.get('assigned_sections', 'ALL'),
+            'assigned_regions': row.get('assigned_regions', 'ALL'),
+            'grades': _split_scope(row.get('assigned_grades')),
+            'sections': _split_scope(row.get('assigned_sections')),
+            'regions': _split_scope(row.get('assigned_regions')),
+            'permissions': _parse_permission_list(row.get('permissions')),
+            'created_date': row.get('created_date', ''),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"AdminUser(username={self.username!r}, role={self.role!r})"
+
+    @property
+    def is_super_admin(self) -> bool:
+        return self.role == 'super_admin'
+
+    def has_permission(self, permission: str) -> bool:
+        return permission in self.permissions
+
+    def to_dict(self) -> Dict:
+        """Permission dict in the shape get_user_permissions has always returned"""
+        return {
+            'role': self.role,
+            'assigned_grades': self.assigned_grades,
+            'assigned_sections': self.assigned_sections,
+            'assigned_regions': self.assigned_regions,
+            'full_name': self.full_name,
+            'permissions': list(self.permissions),
+        }
+
+
+class PermissionRegistry:
+    """Username -> AdminUser map, hot-reloaded when the CSV's mtime changes"""
+
+    def __init__(self, csv_path: str = None, check_interval: float = 1.0):
+        self.csv_path = csv_path or os.getenv('ADMIN_USERS_PATH', 'data/admin_users.csv')
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._users: Dict[str, AdminUser] = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Load (or re-load) the CSV and swap in the new map atomically"""
+        mtime = os.stat(self.csv_path).st_mtime_ns
+        with open(self.csv_path, newline='', encoding='utf-8') as handle:
+            users = {}
+            for row in csv.DictReader(handle):
+                if not row.get('username'):
+                    continue
+                user = AdminUser(row)
+                users[user.username] = user
+        with self._lock:
+            self._users = users
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+            self.reloads += 1
+        print(f"✅ Loaded {len(users)} admin users from {self.csv_path}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.csv_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last good snapshot if the file is mid-write
+                print(f"⚠️ Failed to reload {self.csv_path}: {e}")
+
+    def get(self, username: str) -> Optional[AdminUser]:
+        """O(1) lookup by username"""
+        self._maybe_reload()
+        return self._users.get(username)
+
+    def users(self) -> List[AdminUser]:
+        """All users in file order"""
+        self._maybe_reload()
+        return list(self._users.values())
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def __len__(self) -> int:
+        return len(self._users)
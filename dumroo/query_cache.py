@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Persistent NL question -> SQL cache for the Dumroo NL2SQL system
+Stores the raw (pre-RBAC) SQL generated by the LLM in a local SQLite file
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+def normalize_question(question: str) -> str:
+    """Normalize question text so trivially different phrasings share a cache key"""
+    text = (question or "").strip().lower()
+    text = text.replace("’", "'").replace("‘", "'")
+    text = text.replace("“", '"').replace("”", '"')
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" ?!.")
+
+
+class NLQueryCache:
+    """SQLite-backed LRU/TTL cache of generated SQL keyed by question and schema fingerprint"""
+
+    def __init__(self, cache_path: str = None, max_entries: int = None, ttl_seconds: int = None):
+        self.cache_path = cache_path or os.getenv('NL2SQL_CACHE_PATH', '.cache/nl2sql_cache.db')
+        if max_entries is None:
+            max_entries = int(os.getenv('NL2SQL_CACHE_MAX_ENTRIES', '1000'))
+        if ttl_seconds is None:
+            ttl_seconds = int(os.getenv('NL2SQL_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._current_fingerprint = None
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nl_sql_cache (
+                question_key TEXT NOT NULL,
+                schema_fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql_query TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (question_key, schema_fingerprint)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_nl_sql_cache_last_access ON nl_sql_cache(last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, question: str, schema_fingerprint: str) -> Optional[str]:
+        """Return cached SQL for a question, or None on a miss"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint(schema_fingerprint)
+            row = self._conn.execute(
+                "SELECT sql_query, created_at FROM nl_sql_cache "
+                "WHERE question_key = ? AND schema_fingerprint = ?",
+                (key, schema_fingerprint)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            sql_query, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM nl_sql_cache WHERE question_key = ? AND schema_fingerprint = ?",
+                    (key, schema_fingerprint)
+                )
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE nl_sql_cache SET last_access = ?, hit_count = hit_count + 1 "
+                "WHERE question_key = ? AND schema_fingerprint = ?",
+                (now, key, schema_fingerprint)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return sql_query
+
+    def put(self, question: str, schema_fingerprint: str, sql_query: str):
+        """Store generated SQL and evict least recently used entries over capacity"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint(schema_fingerprint)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nl_sql_cache "
+                "(question_key, schema_fingerprint, question, sql_query, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, schema_fingerprint, question, sql_query, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def discard(self, question: str, schema_fingerprint: str) -> bool:
+        """Drop one question's SQL (e.g. it failed to run); True if it was cached"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM nl_sql_cache WHERE question_key = ? AND schema_fingerprint = ?",
+                (normalize_question(question), schema_fingerprint)
+            )
+            self._conn.commit()
+            self.evictions += cursor.rowcount
+            return cursor.rowcount > 0
+
+    def invalidate(self, schema_fingerprint: str = None) -> int:
+        """Drop every entry, or every entry not built against the given fingerprint"""
+        with self._lock:
+            if schema_fingerprint is None:
+                cursor = self._conn.execute("DELETE FROM nl_sql_cache")
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM nl_sql_cache WHERE schema_fingerprint != ?", (schema_fingerprint,)
+                )
+            self._conn.commit()
+            self.evictions += cursor.rowcount
+            return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM nl_sql_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        """Close the underlying SQLite connection"""
+        with self._lock:
+            self._conn.close()
+
+    def _check_fingerprint(self, schema_fingerprint: str):
+        """Purge entries from older schemas the first time a new fingerprint is seen"""
+        if schema_fingerprint == self._current_fingerprint:
+            return
+        cursor = self._conn.execute(
+            "DELETE FROM nl_sql_cache WHERE schema_fingerprint != ?", (schema_fingerprint,)
+        )
+        self.evictions += cursor.rowcount
+        self._conn.commit()
+        self._current_fingerprint = schema_fingerprint
+
+    def _evict(self, now: float):
+        """Remove expired entries, then least recently used ones beyond max_entries"""
+        cursor = self._conn.execute(
+            "DELETE FROM nl_sql_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self.evictions += cursor.rowcount
+
+        count = self._conn.execute("SELECT COUNT(*) FROM nl_sql_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM nl_sql_cache WHERE rowid IN "
+                "(SELECT rowid FROM nl_sql_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += cursor.rowcount
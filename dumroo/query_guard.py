@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Query cost guard for the Dumroo NL2SQL system
+Reads EXPLAIN QUERY PLAN for the secured SQL, estimates rows visited from
+table sizes and sqlite_stat1, and rejects nested full scans of large tables
+(missing join predicates) or plans over the cost budget. Queries that pass get
+a row cap; the wall-clock budget is enforced by QueryExecutor.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from db_engine import QueryExecutor, QueryResult
+from rbac import ScopeError, find_table_refs, tokenize
+from schema_catalog import SchemaCatalog
+
+# Estimated rows visited above which a plan is rejected
+QUERY_MAX_COST = float(os.getenv('QUERY_MAX_COST', '20000000'))
+# Tables at least this big may not be fully scanned inside another loop
+QUERY_LARGE_TABLE_ROWS = int(os.getenv('QUERY_LARGE_TABLE_ROWS', '50000'))
+# Rows returned by a non-paged query; 0 disables the cap
+QUERY_ROW_CAP = int(os.getenv('QUERY_ROW_CAP', '10000'))
+
+_LOOP_RE = re.compile(
+    r'^(?P<op>SCAN|SEARCH) (?:TABLE )?(?P<name>\S+)(?: AS (?P<alias>\S+))?'
+    r'(?: USING (?P<using>.*?))?(?: \((?P<terms>[^()]*)\))?$'
+)
+_SUBQUERY_RE = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (?P<name>\S+)')
+
+# Rows per probe assumed for automatic indexes and range constraints without statistics
+_AUTOMATIC_INDEX_ROWS = 10
+_RANGE_FACTOR = 0.25
+
+
+class QueryRejected(Exception):
+    """Raised instead of running a query the guard refused"""
+
+    def __init__(self, decision: 'GuardDecision'):
+        super().__init__(f"Query rejected by cost guard: {'; '.join(decision.reasons)}")
+        self.decision = decision
+
+
+class GuardDecision:
+    """Outcome of the guard for one execution"""
+
+    __slots__ = ('action', 'estimated_cost', 'reasons', 'plan', 'row_cap', 'truncated')
+
+    def __init__(self, action: str, estimated_cost: float, reasons: Sequence[str], plan: Sequence[str],
+                 row_cap: Optional[int] = None):
+        self.action = action                    # allow, rewrite (row cap applied) or reject
+        self.estimated_cost = estimated_cost    # rows visited, from the plan
+        self.reasons = list(reasons)
+        self.plan = list(plan)
+        self.row_cap = row_cap
+        self.truncated = False
+
+    @property
+    def rejected(self) -> bool:
+        return self.action == 'reject'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'action': self.action,
+            'estimated_cost': round(self.estimated_cost),
+            'reasons': list(self.reasons),
+            'row_cap': self.row_cap,
+            'truncated': self.truncated,
+            'plan': list(self.plan),
+        }
+
+
+class _PlanNode:
+    __slots__ = ('id', 'parent', 'detail', 'children')
+
+    def __init__(self, node_id: int, parent: int, detail: str):
+        self.id = node_id
+        self.parent = parent
+        self.detail = detail
+        self.children: List['_PlanNode'] = []
+
+
+class QueryGuard:
+    """EXPLAIN-based admission check plus row cap, cached per SQL text and database version"""
+
+    def __init__(self, executor: QueryExecutor, catalog: SchemaCatalog, max_cost: float = None,
+                 large_table_rows: int = None, row_cap: int = None, cache_size: int = 1024):
+        self.executor = executor
+        self.catalog = catalog
+        self.max_cost = QUERY_MAX_COST if max_cost is None else max_cost
+        self.large_table_rows = QUERY_LARGE_TABLE_ROWS if large_table_rows is None else large_table_rows
+        self.row_cap = QUERY_ROW_CAP if row_cap is None else row_cap
+        self.cache_size = cache_size
+        self._analyses: "OrderedDict[Tuple, Tuple[bool, float, Tuple[str, ...], Tuple[str, ...]]]" = OrderedDict()
+        self._index_stats: Dict[str, List[int]] = {}
+        self._stats_version = None
+        self._lock = threading.Lock()
+
+    def check(self, sql_query: str, params: Sequence[Any] = (), paged: bool = False) -> GuardDecision:
+        """Decision for running sql_query; paged queries are bounded by their pages, not the row cap"""
+        self.catalog.refresh()
+        key = (sql_query, self.catalog.schema_version, self.catalog.data_version)
+        with self._lock:
+            analysis = self._analyses.get(key)
+            if analysis is not None:
+                self._analyses.move_to_end(key)
+        if analysis is None:
+            analysis = self._analyze(sql_query, params)
+            with self._lock:
+                self._analyses[key] = analysis
+                while len(self._analyses) > self.cache_size:
+                    self._analyses.popitem(last=False)
+
+        reject, cost, reasons, plan = analysis
+        if reject:
+            return GuardDecision('reject', cost, reasons, plan)
+        row_cap = None if paged or not self.row_cap else self.row_cap
+        return GuardDecision('rewrite' if row_cap else 'allow', cost, reasons, plan, row_cap)
+
+    def execute(self, decision: GuardDecision, sql_query: str, params: Sequence[Any] = ()) -> QueryResult:
+        """Run an admitted query, reading at most one row past its cap; trims that row and flags truncation"""
+        if decision.rejected:
+            raise QueryRejected(decision)
+        if not decision.row_cap:
+            return self.executor.execute(sql_query, params)
+        result = self.executor.execute(sql_query, params, max_rows=decision.row_cap + 1)
+        if len(result.rows) > decision.row_cap:
+            result.rows = result.rows[:decision.row_cap]
+            decision.truncated = True
+        return result
+
+    # -- plan analysis ---------------------------------------------------------
+
+    def _explain(self, sql_query: str, params: Sequence[Any]) -> List[_PlanNode]:
+        with self.executor.pool.connection() as conn:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", tuple(params or ())).fetchall()
+            self._load_index_stats(conn)
+        nodes = {0: _PlanNode(0, -1, '')}
+        for node_id, parent, _, detail in rows:
+            node = nodes[node_id] = _PlanNode(node_id, parent, detail)
+            nodes.get(parent, nodes[0]).children.append(node)
+        return nodes[0].children
+
+    def _load_index_stats(self, conn):
+        """sqlite_stat1 rows per index: [rows, avg rows per 1st key, per 1st+2nd key, ...]"""
+        version = (self.catalog.schema_version, self.catalog.data_version)
+        if version == self._stats_version:
+            return
+        stats = {}
+        try:
+            for _, index, stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL"):
+                values = []
+                for part in (stat or '').split():
+                    if not part.isdigit():
+                        break
+                    values.append(int(part))
+                stats[index] = values
+        except Exception:
+            pass    # no ANALYZE yet
+        self._index_stats = stats
+        self._stats_version = version
+
+    def _aliases(self, sql_query: str) -> Dict[str, str]:
+        """Plan names (alias or table) -> base table"""
+        tokens = tokenize(sql_query)
+        sig = [i for i, tok in enumerate(tokens) if tok.kind not in ('ws', 'comment')]
+        aliases = {}
+        try:
+            refs = find_table_refs(tokens)
+        except ScopeError:
+            return aliases      # estimated without table names; RBAC rejects these for scoped users
+        for ref in refs:
+            aliases[ref.table.lower()] = ref.table
+            if ref.has_alias:
+                pos = sig.index(ref.end) + 1
+                if tokens[sig[pos]].upper == 'AS':
+                    pos += 1
+                if pos < len(sig):
+                    aliases[tokens[sig[pos]].name.lower()] = ref.table
+        return aliases
+
+    def _table_rows(self, table: Optional[str]) -> Optional[int]:
+        return self.catalog.row_count(table) if table else None
+
+    def _probe_rows(self, table_rows: int, using: str, terms: str) -> float:
+        """Rows visited per SEARCH probe"""
+        conditions = [term.strip() for term in terms.split(' AND ') if term.strip()]
+        equalities = sum(1 for term in conditions if re.match(r'^\S+=\?$', term))
+        ranges = len(conditions) - equalities
+        if 'INTEGER PRIMARY KEY' in using or 'ROWID' in using.upper():
+            return 1.0 if equalities else max(1.0, table_rows * (_RANGE_FACTOR ** ranges))
+        if 'AUTOMATIC' in using:
+            return _AUTOMATIC_INDEX_ROWS
+        index = using.split('INDEX', 1)[1].split()[0] if 'INDEX' in using else None
+        stats = self._index_stats.get(index or '')
+        if stats and equalities and len(stats) > equalities:
+            rows = float(stats[equalities])
+        elif stats and not equalities:
+            rows = float(stats[0])
+        else:
+            rows = max(1.0, table_rows / (10 ** equalities)) if equalities else float(table_rows)
+        return max(1.0, rows * (_RANGE_FACTOR ** ranges))
+
+    def _analyze(self, sql_query: str, params: Sequence[Any]):
+        """(reject, estimated cost, reasons, plan lines)"""
+        try:
+            roots = self._explain(sql_query, params)
+        except Exception as e:
+            return True, 0.0, (f"could not plan query: {e}",), ()
+        aliases = self._aliases(sql_query)
+        derived: Dict[str, float] = {}
+        reasons: List[str] = []
+        violations: List[str] = []
+
+        def walk(nodes: List[_PlanNode], outer_rows: float) -> Tuple[float, float]:
+            """(rows visited, rows produced) for one loop nest"""
+            cost, rows = 0.0, 1.0
+            for node in nodes:
+                detail = node.detail
+                loop = _LOOP_RE.match(detail)
+                if loop and detail != 'SCAN CONSTANT ROW':
+                    name = loop.group('name').lower()
+                    table = aliases.get(name) or (name if self._table_rows(name) is not None else None)
+                    table_rows = self._table_rows(table)
+                    if table_rows is None:
+                        table_rows = derived.get(name, 1000.0)
+                    using, terms = loop.group('using') or '', loop.group('terms') or ''
+                    if loop.group('op') == 'SCAN':
+                        level_rows = float(table_rows)
+                        if table is not None and table_rows >= self.large_table_rows:
+                            if rows > 1 or outer_rows > 1:
+                                violations.append(f"nested full scan of {table} (~{table_rows:,} rows per "
+                                                  f"outer row): missing join predicate?")
+                            else:
+                                reasons.append(f"full scan of {table} (~{table_rows:,} rows)")
+                    else:
+                        level_rows = self._probe_rows(int(table_rows), using, terms)
+                        if 'AUTOMATIC' in using:
+                            cost += table_rows      # building the automatic index
+                            reasons.append(f"automatic index built on {table or name}")
+                    rows *= level_rows
+                    cost += rows * outer_rows
+                    continue
+
+                if node.children:
+                    correlated = detail.startswith('CORRELATED')
+                    child_cost, child_rows = walk(node.children, outer_rows * rows if correlated else 1.0)
+                    cost += child_cost
+                    sub = _SUBQUERY_RE.match(detail)
+                    if sub:
+                        derived[sub.group('name').lower()] = child_rows
+                elif detail.startswith('USE TEMP B-TREE'):
+                    reasons.append(detail.lower().replace('use temp b-tree', 'temp b-tree'))
+            return cost, rows
+
+        cost, _ = walk(roots, 1.0)
+        plan = tuple(node_line for node_line in self._plan_lines(roots))
+        if violations:
+            return True, cost, tuple(violations), plan
+        if cost > self.max_cost:
+            return True, cost, (f"estimated cost {cost:,.0f} rows exceeds the budget of {self.max_cost:,.0f}",), plan
+        return False, cost, tuple(reasons), plan
+
+    def _plan_lines(self, nodes: List[_PlanNode], depth: int = 0):
+        for node in nodes:
+            yield '  ' * depth + node.detail
+            yield from self._plan_lines(node.children, depth + 1)
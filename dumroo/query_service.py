@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Shared query service for the Dumroo NL2SQL system
+One long-lived AdvancedDumrooNL2SQL per process - LLM clients, connection
+pool, schema catalog and caches - serving every Streamlit session and script
+through a bounded worker pool, plus an optional small HTTP/JSON server
+
+Usage:
+    python query_service.py --port 8765
+    curl -s localhost:8765/query -d '{"question": "Show average performance by subject", "username": "priya_sharma"}'
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from quick_queries import QuickQueries
+
+# Questions processed at once; more wait in the pool's queue
+SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS', '8'))
+# Address of the optional HTTP/JSON server
+SERVICE_HOST = os.getenv('SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', '8765'))
+# Rows returned per HTTP response (the first page when paging)
+SERVICE_MAX_ROWS = int(os.getenv('SERVICE_MAX_ROWS', '1000'))
+
+
+class QueryService:
+    """One warm NL2SQL engine behind a worker pool"""
+
+    def __init__(self, system=None, workers: int = None):
+        if system is None:
+            from dumroo_advanced_app import AdvancedDumrooNL2SQL
+            system = AdvancedDumrooNL2SQL()
+        self.system = system
+        self.workers = workers or SERVICE_WORKERS
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dumroo-query')
+        # Validated at startup; results are prefetched per user on the same pool
+        self.quick_queries = QuickQueries(system, self.pool)
+        self.started_at = time.time()
+        self.submitted = self.completed = self.failed = 0
+        self._lock = threading.Lock()
+
+    def _run(self, question: str, username: str, page_size: Optional[int],
+             on_progress: Optional[Callable[[str, str], None]]) -> Dict:
+        try:
+            result = self.system.query_natural_language(question, username, page_size=page_size,
+                                                        on_progress=on_progress)
+        except Exception:
+            with self._lock:
+                self.completed += 1
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+            self.failed += "error" in result
+        return result
+
+    def submit(self, question: str, username: str = "super_admin", page_size: Optional[int] = None,
+               on_progress: Optional[Callable[[str, str], None]] = None) -> Future:
+        """Queue a question; on_progress is called from the worker thread"""
+        with self._lock:
+            self.submitted += 1
+        return self.pool.submit(self._run, question, username, page_size, on_progress)
+
+    def query(self, question: str, username: str = "super_admin", page_size: Optional[int] = None,
+              on_progress: Optional[Callable[[str, str], None]] = None, timeout: Optional[float] = None) -> Dict:
+        """Run a question on the pool and wait for it
+
+        Progress events are handed back and delivered on the calling thread,
+        so callbacks may touch thread-bound UI (e.g. Streamlit elements).
+        """
+        if on_progress is None:
+            return self.submit(question, username, page_size).result(timeout)
+        events: queue.Queue = queue.Queue()
+        future = self.submit(question, username, page_size, lambda event, text: events.put((event, text)))
+        future.add_done_callback(lambda _: events.put(None))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            on_progress(*item)
+        return future.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def query_batch(self, questions: List[str], username: str = "super_admin",
+                    page_size: Optional[int] = None) -> List[Dict]:
+        """Generate and run several questions concurrently (one pool slot drives the batch)"""
+        with self._lock:
+            self.submitted += len(questions)
+        results = self.pool.submit(self.system.query_batch, questions, username, page_size).result()
+        with self._lock:
+            self.completed += len(results)
+            self.failed += sum("error" in result for result in results)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'in_flight': self.submitted - self.completed,
+                'uptime_s': round(time.time() - self.started_at, 1),
+            }
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.system.executor.close()
+
+
+_service: Optional[QueryService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> QueryService:
+    """The process-wide query service, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = QueryService()
+        return _service
+
+
+def result_to_json(result: Dict, max_rows: int = None) -> Dict[str, Any]:
+    """JSON-safe form of a query_natural_language result (rows capped at max_rows)"""
+    max_rows = SERVICE_MAX_ROWS if max_rows is None else max_rows
+    payload = {key: value for key, value in result.items()
+               if key not in ('result', 'raw_result', 'result_handle')}
+    frame = result.get('result')
+    if frame is not None:
+        table = json.loads(frame.head(max_rows).to_json(orient='split', index=False, date_format='iso'))
+        payload['columns'] = table['columns']
+        payload['rows'] = table['data']
+        payload['row_count'] = len(frame)
+    handle = result.get('result_handle')
+    payload['has_more'] = bool(frame is not None and len(frame) > max_rows) or (
+        handle is not None and handle.page_count() > 1)
+    return payload
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    service: QueryService = None
+
+    def _send_json(self, status: int, body: Dict):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/health':
+            self._send_json(200, {'status': 'ok', **self.service.stats()})
+        elif path == '/users':
+            self._send_json(200, {'users': [
+                {'username': user.username, 'full_name': user.full_name, 'role': user.role}
+                for user in self.service.system.permission_registry.users()
+            ]})
+        else:
+            self._send_json(404, {'error': f"unknown path {path}"})
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        if path != '/query':
+            self._send_json(404, {'error': f"unknown path {path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            question = str(request['question']).strip()
+            if not question:
+                raise ValueError("question is empty")
+            username = str(request.get('username', 'super_admin'))
+            page_size = int(request['page_size']) if request.get('page_size') else None
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {'error': f"invalid request: {e}"})
+            return
+        try:
+            result = self.service.query(question, username, page_size=page_size)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(400 if 'error' in result else 200, result_to_json(result))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of clients should queue rather than hit SYN retries
+    request_queue_size = 128
+
+
+def make_http_server(service: QueryService = None, port: int = None, host: str = None) -> ThreadingHTTPServer:
+    """HTTP/JSON front end for a query service (not yet serving)"""
+    handler = type('ServiceHandler', (_ServiceHandler,), {'service': service or get_service()})
+    return _ServiceServer((host or SERVICE_HOST, SERVICE_PORT if port is None else port), handler)
+
+
+def start_http_server(service: QueryService = None, port: int = None, host: str = None) -> ThreadingHTTPServer:
+    """Serve the JSON API from a daemon thread"""
+    server = make_http_server(service, port, host)
+    threading.Thread(target=server.serve_forever, name='dumroo-service', daemon=True).start()
+    host, port = server.server_address[:2]
+    print(f"✅ Query service at http://{host}:{port}/query")
+    return server
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve Dumroo NL2SQL queries over HTTP/JSON")
+    parser.add_argument('--host', default=SERVICE_HOST, help="bind address (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help="port (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS,
+                        help="questions processed at once (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    global _service
+    with _service_lock:
+        _service = QueryService(workers=args.workers)
+    server = make_http_server(_service, args.port, args.host)
+    print(f"🚀 Query service on http://{args.host}:{server.server_address[1]} "
+          f"(POST /query, GET /health, GET /users) with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
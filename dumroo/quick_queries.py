@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Precompiled Quick Queries for the Dumroo NL2SQL system
+The Quick Queries tab's questions as fixed, parameterized SQL: checked
+against the database at startup, prefetched in the background under a user's
+RBAC scope once they are selected, and reused until the database version (or
+a date parameter) changes
+"""
+
+import os
+import calendar
+import threading
+import datetime as dt
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rbac import tokenize
+
+# Set to 0 to compute Quick Queries only when clicked
+QUICK_QUERY_PREFETCH = os.getenv('QUICK_QUERY_PREFETCH', '1') == '1'
+
+
+def _next_week(today: dt.date) -> Tuple[str, str]:
+    """Monday to Sunday of the coming week"""
+    start = today + dt.timedelta(days=7 - today.weekday())
+    return start.isoformat(), (start + dt.timedelta(days=6)).isoformat()
+
+
+def _this_month(today: dt.date) -> Tuple[str, str]:
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    return today.replace(day=1).isoformat(), today.replace(day=last_day).isoformat()
+
+
+class QuickQuery:
+    """One Quick Queries button: title, the question it answers and its SQL with parameters"""
+
+    __slots__ = ('key', 'title', 'question', 'sql', 'params')
+
+    def __init__(self, key: str, title: str, question: str, sql: str,
+                 params: Callable[[dt.date], Tuple] = lambda today: ()):
+        self.key = key
+        self.title = title
+        self.question = question
+        self.sql = sql
+        self.params = params            # today -> bound parameters
+
+    def bind(self, today: Optional[dt.date] = None) -> Tuple:
+        return tuple(self.params(today or dt.date.today()))
+
+
+QUICK_QUERIES: List[QuickQuery] = [
+    QuickQuery(
+        'missing_homework', "📚 Missing Homework", "Which students haven't submitted their homework?",
+        "SELECT DISTINCT s.student_name, s.grade, s.section, h.title AS homework_title, h.due_date, h.subject "
+        "FROM students s JOIN submissions sub ON s.student_id = sub.student_id "
+        "JOIN homework h ON sub.homework_id = h.homework_id WHERE sub.is_submitted = 0 "
+        "ORDER BY h.due_date, s.grade, s.section, s.student_name",
+    ),
+    QuickQuery(
+        'performance_summary', "📊 Performance Summary", "Show performance summary by grade",
+        "SELECT s.grade, ROUND(AVG(p.percentage), 1) AS avg_percentage, MIN(p.percentage) AS min_percentage, "
+        "MAX(p.percentage) AS max_percentage, COUNT(*) AS assessments "
+        "FROM performance p JOIN students s ON p.student_id = s.student_id GROUP BY s.grade ORDER BY s.grade",
+    ),
+    QuickQuery(
+        'upcoming_quizzes', "📅 Upcoming Quizzes", "List upcoming quizzes for next week",
+        "SELECT q.quiz_title, q.subject, q.grade, q.section, q.scheduled_date, q.scheduled_time, q.duration_minutes "
+        "FROM quizzes q WHERE q.scheduled_date BETWEEN ? AND ? ORDER BY q.scheduled_date, q.scheduled_time",
+        _next_week,
+    ),
+    QuickQuery(
+        'attendance', "⏰ Attendance Issues", "Which students have attendance below 80%?",
+        "SELECT s.student_name, s.grade, s.section, s.attendance_percentage FROM students s "
+        "WHERE s.attendance_percentage < ? ORDER BY s.attendance_percentage, s.student_name",
+        lambda today: (80.0,),
+    ),
+    QuickQuery(
+        'top_performers', "🏆 Top Performers", "Who are the top performing students this month?",
+        "SELECT s.student_name, s.grade, s.section, ROUND(AVG(p.percentage), 1) AS avg_percentage, "
+        "COUNT(*) AS assessments FROM performance p JOIN students s ON p.student_id = s.student_id "
+        "WHERE p.assessment_date BETWEEN ? AND ? GROUP BY s.student_id "
+        "ORDER BY avg_percentage DESC, s.student_name LIMIT ?",
+        lambda today: _this_month(today) + (10,),
+    ),
+    QuickQuery(
+        'subject_analysis', "📈 Subject Analysis", "Show average performance by subject",
+        "SELECT p.subject, ROUND(AVG(p.percentage), 1) AS avg_percentage, MIN(p.percentage) AS min_percentage, "
+        "MAX(p.percentage) AS max_percentage, COUNT(*) AS assessments "
+        "FROM performance p JOIN students s ON p.student_id = s.student_id GROUP BY p.subject ORDER BY p.subject",
+    ),
+]
+
+
+def validate_quick_queries(executor, queries: Sequence[QuickQuery] = QUICK_QUERIES) -> List[QuickQuery]:
+    """Queries whose SQL prepares against the database with the right parameter count"""
+    valid = []
+    for query in queries:
+        params = query.bind()
+        placeholders = sum(1 for tok in tokenize(query.sql) if tok.kind == 'param')
+        try:
+            if placeholders != len(params):
+                raise ValueError(f"{placeholders} placeholders but {len(params)} parameters")
+            with executor.pool.connection() as conn:
+                conn.execute(f"EXPLAIN QUERY PLAN {query.sql}", params).fetchall()
+        except Exception as e:
+            print(f"⚠️ Quick query {query.key} disabled: {e}")
+            continue
+        valid.append(query)
+    return valid
+
+
+class QuickQueries:
+    """Validated Quick Queries with per-user results computed ahead of the click
+
+    Each (user, query) result is kept with the database version and bound
+    parameters it was computed for; it is recomputed only when either changes
+    or the last run failed.
+    """
+
+    def __init__(self, system, pool: Optional[Executor] = None, queries: Sequence[QuickQuery] = None):
+        self.system = system
+        self.queries: Dict[str, QuickQuery] = {
+            query.key: query for query in validate_quick_queries(system.executor, queries or QUICK_QUERIES)
+        }
+        self.pool = pool or ThreadPoolExecutor(max_workers=2, thread_name_prefix='dumroo-quick')
+        self.prefetch_enabled = QUICK_QUERY_PREFETCH
+        self._results: Dict[Tuple[str, str], Tuple[Tuple, Future]] = {}
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        print(f"✅ {len(self.queries)} quick queries validated")
+
+    def _stamp(self, query: QuickQuery) -> Tuple:
+        return self.system.result_cache.version(self.system.db_path), query.bind()
+
+    @staticmethod
+    def _failed(future: Future) -> bool:
+        if not future.done():
+            return False
+        if future.exception() is not None:
+            return True
+        result = future.result()
+        return "error" in result or str(result.get("raw_result", "")).startswith("Error:")
+
+    def _future(self, key: str, username: str, count: bool = False) -> Future:
+        """Current result for (user, query), starting a run if it is missing or stale"""
+        query = self.queries[key]
+        stamp = self._stamp(query)
+        with self._lock:
+            entry = self._results.get((username, key))
+            if entry is not None and entry[0] == stamp and not self._failed(entry[1]):
+                self.hits += count
+                return entry[1]
+            self.misses += count
+            future = self.pool.submit(self.system.run_quick_query, query, username)
+            self._results[(username, key)] = (stamp, future)
+            return future
+
+    def prefetch(self, username: str) -> List[Future]:
+        """Start computing every quick query for a user; cheap when all are current"""
+        if not self.prefetch_enabled:
+            return []
+        return [self._future(key, username) for key in self.queries]
+
+    def ready(self, key: str, username: str) -> bool:
+        """True when a click would render without waiting"""
+        entry = self._results.get((username, key))
+        return entry is not None and entry[1].done() and entry[0] == self._stamp(self.queries[key]) \
+            and not self._failed(entry[1])
+
+    def get(self, key: str, username: str, timeout: Optional[float] = None) -> Dict:
+        """Result for a click: the prefetched one when current, else computed now"""
+        return self._future(key, username, count=True).result(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'queries': len(self.queries), 'cached': len(self._results), 'hits': self.hits,
+                    'misses': self.misses}
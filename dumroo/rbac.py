@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Role-based access control rewriter for the Dumroo NL2SQL system
+Parses generated SQL into table references and scopes every one of them with
+a precompiled, parameter-bound predicate for the requesting user
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+
+from schema_catalog import SchemaCatalog, TableInfo
+
+# Columns that carry RBAC scope, mapped to the admin_users field that restricts them
+SCOPE_COLUMNS = {
+    'grade': 'assigned_grades',
+    'section': 'assigned_sections',
+    'region': 'assigned_regions',
+}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<ident>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+  | (?P<param>\?\d*|[:@$][A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\|\||<=|>=|<>|!=|==|<<|>>|.)
+""", re.VERBOSE | re.DOTALL)
+
+_KEYWORDS = {
+    'ALL', 'AND', 'AS', 'ASC', 'BETWEEN', 'BY', 'CASE', 'CROSS', 'DESC', 'DISTINCT', 'ELSE',
+    'END', 'EXCEPT', 'EXISTS', 'FILTER', 'FROM', 'FULL', 'GROUP', 'HAVING', 'IN', 'INDEXED',
+    'INNER', 'INTERSECT', 'IS', 'JOIN', 'LEFT', 'LIKE', 'LIMIT', 'MATERIALIZED', 'NATURAL',
+    'NOT', 'NULL', 'OFFSET', 'ON', 'OR', 'ORDER', 'OUTER', 'OVER', 'RECURSIVE', 'RETURNING',
+    'RIGHT', 'SELECT', 'THEN', 'UNION', 'USING', 'VALUES', 'WHEN', 'WHERE', 'WINDOW', 'WITH',
+}
+
+# Keywords that close a FROM clause at the current nesting level
+_FROM_TERMINATORS = {
+    'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT',
+    'WINDOW', 'RETURNING', 'SELECT', 'VALUES',
+}
+
+
+class Token:
+    """Lexical token; kind is one of ws, comment, string, ident, number, param, op"""
+
+    __slots__ = ('kind', 'text')
+
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+    @property
+    def is_keyword(self) -> bool:
+        return self.kind == 'ident' and self.text.upper() in _KEYWORDS
+
+    @property
+    def name(self) -> str:
+        """Identifier with any quoting removed"""
+        text = self.text
+        if text[:1] in ('"', '`', '['):
+            return text[1:-1]
+        return text
+
+
+class TableRef:
+    """A base-table reference in a FROM/JOIN clause"""
+
+    __slots__ = ('start', 'end', 'table', 'has_alias')
+
+    def __init__(self, start: int, end: int, table: str, has_alias: bool):
+        self.start = start          # first token index of the (possibly qualified) name
+        self.end = end              # last token index of the name
+        self.table = table
+        self.has_alias = has_alias
+
+
+# Stands in for a "?" of the original query inside SecuredQuery.params until bind()
+QUERY_PARAM = object()
+
+
+class SecuredQuery:
+    """RBAC-scoped SQL plus its bound parameters and a literal form for display"""
+
+    __slots__ = ('sql', 'params', 'display_sql', 'scoped_tables', 'query_placeholders')
+
+    def __init__(self, sql: str, params: Tuple, display_sql: str, scoped_tables: Tuple[str, ...]):
+        self.sql = sql
+        self.params = params
+        self.display_sql = display_sql
+        self.scoped_tables = scoped_tables
+        self.query_placeholders = sum(1 for value in params if value is QUERY_PARAM)
+
+    def bind(self, query_params: Sequence[Any]) -> 'SecuredQuery':
+        """Fill the original query's "?" placeholders, interleaved with the scope parameters"""
+        query_params = tuple(query_params or ())
+        if len(query_params) != self.query_placeholders:
+            raise ValueError(f"query expects {self.query_placeholders} parameters, got {len(query_params)}")
+        if not query_params:
+            return self
+        values = iter(query_params)
+        params = tuple(next(values) if value is QUERY_PARAM else value for value in self.params)
+        return SecuredQuery(self.sql, params, render_literal_sql(self.display_sql, query_params),
+                            self.scoped_tables)
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Split SQL into tokens that reassemble to the original text"""
+    return [Token(match.lastgroup, match.group()) for match in _TOKEN_RE.finditer(sql)]
+
+
+class ScopeError(ValueError):
+    """SQL has a FROM item the scoper cannot classify, so it cannot be scoped safely"""
+
+
+def _closing(tokens: List[Token], sig: List[int], pos: int) -> int:
+    """Sig position of the ")" closing the parenthesis level at pos (len(sig) at the top level)"""
+    depth = 0
+    while pos < len(sig):
+        text = tokens[sig[pos]].text
+        if text == '(':
+            depth += 1
+        elif text == ')':
+            if depth == 0:
+                return pos
+            depth -= 1
+        pos += 1
+    return len(sig)
+
+
+def find_table_refs(tokens: List[Token], reserved: Collection[str] = ()) -> List[TableRef]:
+    """Locate base-table references in every FROM/JOIN clause, at any nesting depth
+
+    Raises ScopeError for a FROM item that is neither a table name, a
+    subquery, a table-valued function nor a parenthesised join, and for a
+    CTE named after one of the (lower-cased) reserved tables.
+    """
+    sig = [i for i, tok in enumerate(tokens) if tok.kind not in ('ws', 'comment')]
+    refs: List[TableRef] = []
+    # (name, where it is declared, end of the WITH's scope) as token indexes
+    ctes: List[Tuple[str, int, int]] = []
+
+    # One frame per parenthesis level: [in_from, expect_table, in_with, with_scope_end]
+    stack = [[False, False, False, len(tokens)]]
+    pos = 0
+    while pos < len(sig):
+        tok = tokens[sig[pos]]
+        frame = stack[-1]
+        upper = tok.upper if tok.kind == 'ident' else tok.text
+
+        if tok.kind == 'op' and tok.text == '(':
+            nxt = tokens[sig[pos + 1]] if pos + 1 < len(sig) else None
+            if frame[1] and not (nxt is not None and nxt.upper in ('SELECT', 'WITH', 'VALUES')):
+                # Parenthesised table expression: "FROM (students)", "JOIN (a JOIN b ON ...)"
+                frame[1] = False
+                stack.append([True, True, False, len(tokens)])
+            else:
+                frame[1] = False    # derived table, or an expression
+                stack.append([False, False, False, len(tokens)])
+            pos += 1
+            continue
+        if tok.kind == 'op' and tok.text == ')':
+            if frame[1]:
+                raise ScopeError("empty table expression")
+            if len(stack) > 1:
+                stack.pop()
+            pos += 1
+            continue
+
+        if tok.kind == 'ident' and tok.is_keyword:
+            if frame[1] and upper not in ('SELECT', 'WITH', 'VALUES'):
+                raise ScopeError(f"unexpected {tok.text} where a table was expected")
+            if upper == 'WITH':
+                frame[2] = True
+                close = _closing(tokens, sig, pos + 1)
+                frame[3] = sig[close] if close < len(sig) else len(tokens)
+            elif upper == 'FROM':
+                frame[0] = frame[1] = True
+                frame[2] = False
+            elif upper == 'JOIN':
+                frame[1] = True
+            elif upper in ('ON', 'USING'):
+                frame[1] = False
+            elif upper in _FROM_TERMINATORS:
+                frame[0] = frame[1] = False
+                if upper == 'SELECT':
+                    frame[2] = False
+            pos += 1
+            continue
+
+        if frame[2] and tok.kind == 'ident':
+            # Inside a WITH list: "name [(cols)] AS [NOT] [MATERIALIZED] (" declares a CTE
+            look = pos + 1
+            if look < len(sig) and tokens[sig[look]].text == '(':
+                look = _closing(tokens, sig, look + 1) + 1
+            if look < len(sig) and tokens[sig[look]].upper == 'AS':
+                name = tok.name.lower()
+                if name in reserved:
+                    raise ScopeError(f"CTE {tok.name} shadows a table")
+                ctes.append((name, sig[pos], frame[3]))
+            pos += 1
+            continue
+
+        if tok.kind == 'op' and tok.text == ',' and frame[0]:
+            frame[1] = True
+            pos += 1
+            continue
+
+        if frame[1]:
+            if tok.kind != 'ident':
+                raise ScopeError(f"cannot scope FROM item {tok.text}")
+            start = end = pos
+            # schema-qualified name: main.students
+            if (pos + 2 < len(sig) and tokens[sig[pos + 1]].text == '.'
+                    and tokens[sig[pos + 2]].kind == 'ident'):
+                end = pos + 2
+            table_tok = tokens[sig[end]]
+            nxt = tokens[sig[end + 1]] if end + 1 < len(sig) else None
+            frame[1] = False
+
+            if nxt is not None and nxt.text == '(':
+                pos = end + 1           # table-valued function, not a table
+                continue
+
+            has_alias = False
+            if nxt is not None and nxt.kind == 'ident':
+                has_alias = nxt.upper == 'AS' or not nxt.is_keyword
+            refs.append(TableRef(sig[start], sig[end], table_tok.name, has_alias))
+            pos = end + 1
+            continue
+
+        pos += 1
+
+    def is_base_table(ref: TableRef) -> bool:
+        if ref.start != ref.end:
+            return True     # schema-qualified names never mean a CTE
+        # A CTE is visible from its declaration (so recursive CTEs see themselves)
+        # up to the end of the statement its WITH belongs to
+        name = ref.table.lower()
+        return not any(cte == name and declared < ref.start < scope_end for cte, declared, scope_end in ctes)
+
+    return [ref for ref in refs if is_base_table(ref)]
+
+
+def _quote_literal(value: Any) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def render_literal_sql(sql: str, params: Tuple) -> str:
+    """Inline bound parameters as literals, for display and string-only callers"""
+    values = iter(params)
+    parts = []
+    for tok in tokenize(sql):
+        if tok.kind == 'param' and tok.text == '?':
+            parts.append(_quote_literal(next(values)))
+        else:
+            parts.append(tok.text)
+    return ''.join(parts)
+
+
+def _parse_scope_values(value: Any) -> Optional[Tuple[str, ...]]:
+    """Split an admin_users scope field; None means unrestricted"""
+    if value is None:
+        return None
+    if isinstance(value, (set, frozenset, list, tuple)):
+        values = tuple(sorted(str(v).strip() for v in value))
+    else:
+        text = str(value).strip()
+        if text.upper() == 'ALL':
+            return None
+        values = tuple(part.strip() for part in text.split(',') if part.strip())
+    if any(v.upper() == 'ALL' for v in values):
+        return None
+    return values
+
+
+class ScopePolicy:
+    """Per-user scope predicates, compiled once per table in the schema catalog"""
+
+    def __init__(self, username: str, scope: Dict[str, Optional[Tuple[str, ...]]], catalog: SchemaCatalog):
+        self.username = username
+        self.scope = scope
+        self.fingerprint = catalog.get_fingerprint()
+        self.unrestricted = all(values is None for values in scope.values())
+        self.filters: Dict[str, Tuple[str, Tuple, str]] = {}
+        if not self.unrestricted:
+            students = catalog.get_table('students')
+            self._students_where = self._predicate(students) if students else ('0', ())
+            for name in catalog.table_names():
+                self.filters[name.lower()] = self._compile_table(catalog.get_table(name))
+
+    def _predicate(self, table: TableInfo) -> Tuple[str, Tuple]:
+        """AND of IN-lists over the scope columns this table actually has"""
+        clauses, params = [], []
+        for column in SCOPE_COLUMNS:
+            values = self.scope.get(column)
+            if values is None or not table.has_column(column):
+                continue
+            clauses.append(f'"{column}" IN ({",".join("?" * len(values))})' if values else '0')
+            params.extend(values)
+        return ' AND '.join(clauses), tuple(params)
+
+    def _compile_table(self, table: TableInfo) -> Tuple[str, Tuple, str]:
+        # Schema-qualified, so a CTE can never stand in for the table being filtered
+        quoted = 'main."' + table.name.replace('"', '""') + '"'
+        if table.name.lower() == 'students':
+            where, params = self._predicate(table)
+        elif table.has_column('student_id'):
+            students_where, params = self._students_where
+            where = f'"student_id" IN (SELECT "student_id" FROM main."students" WHERE {students_where or "1"})'
+        elif any(table.has_column(column) for column in SCOPE_COLUMNS):
+            where, params = self._predicate(table)
+        else:
+            # Tables with no path to student scope are hidden from scoped users
+            where, params = '0', ()
+        subquery = f"(SELECT * FROM {quoted} WHERE {where or '1'})"
+        return subquery, params, render_literal_sql(subquery, params)
+
+
+class RBACEngine:
+    """Rewrites generated SQL so every scoped table is filtered for the requesting user"""
+
+    def __init__(self, catalog: SchemaCatalog, permissions_lookup: Callable[[str], Optional[Dict]],
+                 cache_size: int = 2048):
+        self.catalog = catalog
+        self.permissions_lookup = permissions_lookup
+        self.cache_size = cache_size
+        self._policies: Dict[str, Tuple[Tuple, ScopePolicy]] = {}
+        self._rewrites: "OrderedDict[Tuple[str, str, str], SecuredQuery]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def policy_for(self, username: str) -> Optional[ScopePolicy]:
+        """Compiled policy for a user, rebuilt if their permissions or the schema changed"""
+        permissions = self.permissions_lookup(username)
+        if not permissions:
+            return None
+
+        if permissions.get('role') == 'super_admin':
+            scope = {column: None for column in SCOPE_COLUMNS}
+        else:
+            scope = {column: _parse_scope_values(permissions.get(field))
+                     for column, field in SCOPE_COLUMNS.items()}
+        scope_key = tuple(scope[column] for column in SCOPE_COLUMNS)
+        fingerprint = self.catalog.get_fingerprint()
+
+        with self._lock:
+            cached = self._policies.get(username)
+            if cached and cached[0] == scope_key and cached[1].fingerprint == fingerprint:
+                return cached[1]
+
+        policy = ScopePolicy(username, scope, self.catalog)
+        with self._lock:
+            self._policies[username] = (scope_key, policy)
+        return policy
+
+    def secure(self, sql_query: str, username: str, params: Sequence[Any] = ()) -> Optional[SecuredQuery]:
+        """Scope every table reference in sql_query; None if the user is unknown
+
+        params bind the query's own "?" placeholders; the rewrite itself is
+        cached per SQL text, so parameterized queries share one entry. Raises
+        ScopeError when a FROM item cannot be classified or scoped.
+        """
+        policy = self.policy_for(username)
+        if policy is None:
+            return None
+
+        key = (sql_query, username, policy.fingerprint)
+        with self._lock:
+            cached = self._rewrites.get(key)
+            if cached is not None and self._policies.get(username, (None, None))[1] is policy:
+                self._rewrites.move_to_end(key)
+                return cached.bind(params)
+
+        secured = self._rewrite(sql_query, policy)
+        with self._lock:
+            self._rewrites[key] = secured
+            self._rewrites.move_to_end(key)
+            while len(self._rewrites) > self.cache_size:
+                self._rewrites.popitem(last=False)
+        return secured.bind(params)
+
+    def _rewrite(self, sql_query: str, policy: ScopePolicy) -> SecuredQuery:
+        """Scoped SQL for a restricted user; raises ScopeError when some FROM item cannot be scoped"""
+        if policy.unrestricted:
+            markers = ()
+            if '?' in sql_query:
+                markers = tuple(QUERY_PARAM for tok in tokenize(sql_query)
+                                if tok.kind == 'param' and tok.text == '?')
+            return SecuredQuery(sql_query, markers, sql_query, ())
+
+        tokens = tokenize(sql_query)
+        replacements = {}
+        scoped = []
+        for ref in find_table_refs(tokens, policy.filters):
+            compiled = policy.filters.get(ref.table.lower())
+            if compiled is None:
+                # Not in the schema catalog (sqlite_master, temp tables, ...): refuse rather than expose it
+                raise ScopeError(f"cannot scope unknown table {ref.table}")
+            subquery, params, display = compiled
+            alias = '' if ref.has_alias else f' AS {tokens[ref.end].text}'
+            replacements[ref.start] = (ref.end, subquery + alias, params, display + alias)
+            scoped.append(ref.table.lower())
+
+        sql_parts, display_parts, params = [], [], []
+        i = 0
+        while i < len(tokens):
+            if i in replacements:
+                end, text, bound, display = replacements[i]
+                sql_parts.append(text)
+                display_parts.append(display)
+                params.extend(bound)
+                i = end + 1
+                continue
+            if tokens[i].kind == 'param' and tokens[i].text == '?':
+                params.append(QUERY_PARAM)
+            sql_parts.append(tokens[i].text)
+            display_parts.append(tokens[i].text)
+            i += 1
+
+        return SecuredQuery(''.join(sql_parts), tuple(params), ''.join(display_parts), tuple(scoped))
+
+    def clear(self):
+        """Drop compiled policies and cached rewrites"""
+        with self._lock:
+            self._policies.clear()
+            self._rewrites.clear()
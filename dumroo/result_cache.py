@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Shared query result cache for the Dumroo NL2SQL system
+Keeps DataFrames for secured SQL keyed by (database, SQL, parameters, database
+version) in a size-aware LRU under a byte budget. The version combines PRAGMA
+schema_version/data_version, read on the cache's own connection, with the file
+mtimes, so any write to the database makes older entries unreachable.
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# Byte budget across every cached result; 0 disables the cache
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+
+
+class CachedResult:
+    """One cached execution; the DataFrame is shared and must be treated as read-only"""
+
+    __slots__ = ('frame', 'text', 'truncated', 'nbytes')
+
+    def __init__(self, frame: pd.DataFrame, text: str, truncated: bool = False):
+        self.frame = frame
+        self.text = text
+        self.truncated = truncated
+        self.nbytes = int(frame.memory_usage(index=True, deep=True).sum()) + sys.getsizeof(text)
+
+
+class ResultCache:
+    """Process-wide, thread-safe LRU of query results bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Tuple, CachedResult]" = OrderedDict()
+        self._versions: Dict[str, Tuple] = {}
+        self._watchers: Dict[str, sqlite3.Connection] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def version(self, db_path: str) -> Tuple:
+        """Current version of a database; a change drops its cached results"""
+        db_path = os.path.abspath(db_path)
+        with self._lock:
+            # data_version is only comparable on one connection, so keep one per database
+            conn = self._watchers.get(db_path)
+            if conn is None:
+                conn = self._watchers[db_path] = sqlite3.connect(
+                    f"file:{db_path}?mode=ro", uri=True, check_same_thread=False
+                )
+            version = (
+                conn.execute("PRAGMA schema_version").fetchone()[0],
+                conn.execute("PRAGMA data_version").fetchone()[0],
+                _mtime_ns(db_path),
+                _mtime_ns(f"{db_path}-wal"),
+            )
+            if self._versions.get(db_path) != version:
+                if db_path in self._versions:
+                    self._drop_database(db_path)
+                self._versions[db_path] = version
+            return version
+
+    def key(self, db_path: str, sql_query: str, params: Sequence[Any] = (),
+            row_cap: Optional[int] = None) -> Optional[Tuple]:
+        """Cache key for a query against the database as it is now, or None when disabled"""
+        if not self.enabled:
+            return None
+        db_path = os.path.abspath(db_path)
+        return db_path, sql_query, tuple(params or ()), self.version(db_path), row_cap
+
+    def get(self, key: Optional[Tuple]) -> Optional[CachedResult]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Optional[Tuple], frame: pd.DataFrame, text: str, truncated: bool = False) -> bool:
+        """Store a result, evicting least recently used ones over budget; False if it does not fit"""
+        if key is None:
+            return False
+        entry = CachedResult(frame, text, truncated)
+        if entry.nbytes > self.max_bytes:
+            return False
+        with self._lock:
+            if self._versions.get(key[0]) != key[3]:
+                return False    # database changed while the query ran
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            self._entries[key] = entry
+            self.bytes += entry.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _drop_database(self, db_path: str):
+        """Remove every entry for a database (caller holds the lock)"""
+        stale = [key for key in self._entries if key[0] == db_path]
+        for key in stale:
+            self.bytes -= self._entries.pop(key).nbytes
+        self.invalidations += len(stale)
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
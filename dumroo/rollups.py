@@ -0,0 +1,784 @@
+#!/usr/bin/env python3
+"""
+Rollup tables and aggregate query routing for the Dumroo NL2SQL system
+Pre-aggregated copies of performance, submissions and students keyed by the
+RBAC scope columns (grade/section/region) plus subject, assessment type, date
+or homework. Triggers mark the class buckets a write touches as dirty and an
+incremental refresh recomputes only those buckets. The router rewrites
+aggregate SQL (LLM or intent templates) onto a fresh rollup before RBAC, so
+scoped users are filtered on the rollup's own scope columns.
+
+Usage:
+    python rollups.py                       # refresh dirty buckets (builds the rollups if missing)
+    python rollups.py --rebuild             # recompute every rollup from scratch
+    python rollups.py --interval 60         # refresh job: keep refreshing every 60 seconds
+    python rollups.py --drop                # remove rollup tables and triggers
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from rbac import SCOPE_COLUMNS, Token, tokenize
+from schema_catalog import SchemaCatalog
+
+ROLLUP_ROUTING = os.getenv('ROLLUP_ROUTING', '1') == '1'
+
+# Class buckets waiting for a refresh: (fact, student_known, grade, section, region)
+DIRTY_TABLE = 'rollup_dirty'
+SCOPE = tuple(SCOPE_COLUMNS)
+
+
+class RollupSpec:
+    """One rollup table: a fact table grouped by student scope plus extra dimensions"""
+
+    def __init__(self, name: str, fact: str, dims: Sequence[str], measures: Sequence[str], key: str):
+        self.name = name
+        self.fact = fact
+        self.dims = tuple(dims)             # fact columns kept as group keys
+        self.measures = tuple(measures)     # fact columns kept as n/sum/cnt/min/max
+        self.key = key                      # fact primary key, so COUNT(key) == COUNT(*)
+
+    @property
+    def by_student(self) -> bool:
+        """Scope comes from the student each fact row belongs to"""
+        return self.fact != 'students'
+
+    @property
+    def bucket_columns(self) -> Tuple[str, ...]:
+        return (('student_known',) if self.by_student else ()) + SCOPE
+
+    @property
+    def key_columns(self) -> Tuple[str, ...]:
+        return self.bucket_columns + self.dims
+
+    @property
+    def measure_columns(self) -> List[str]:
+        return ['n'] + [f'{stat}_{m}' for m in self.measures for stat in ('sum', 'cnt', 'min', 'max')]
+
+
+# Coarsest first: the router picks the first rollup that has every dimension a query uses
+ROLLUPS: List[RollupSpec] = [
+    RollupSpec('rollup_students', 'students', (), ('attendance_percentage',), 'student_id'),
+    RollupSpec('rollup_performance', 'performance', ('subject', 'assessment_type'),
+               ('percentage', 'marks_obtained', 'total_marks'), 'performance_id'),
+    RollupSpec('rollup_performance_daily', 'performance', ('subject', 'assessment_type', 'assessment_date'),
+               ('percentage', 'marks_obtained', 'total_marks'), 'performance_id'),
+    RollupSpec('rollup_submissions', 'submissions', ('homework_id',),
+               ('is_submitted', 'is_late', 'marks_obtained', 'total_marks'), 'submission_id'),
+]
+
+SOURCE_TABLES = ('students', 'performance', 'submissions')
+
+
+def specs_for(fact: str) -> List[RollupSpec]:
+    return [spec for spec in ROLLUPS if spec.fact == fact]
+
+
+def _facts() -> List[str]:
+    return list(OrderedDict.fromkeys(spec.fact for spec in ROLLUPS))
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+def _select_sql(spec: RollupSpec, bucket: Optional[str] = None) -> str:
+    """SELECT computing spec's rows; bucket is None (everything), 'known' or 'unknown'"""
+    if spec.by_student:
+        keys = ['s.student_id IS NOT NULL'] + [f's."{c}"' for c in SCOPE]
+    else:
+        keys = [f'f."{c}"' for c in SCOPE]
+    keys += [f'f."{c}"' for c in spec.dims]
+    stats = ['COUNT(*)']
+    for m in spec.measures:
+        stats += [f'SUM(f."{m}")', f'COUNT(f."{m}")', f'MIN(f."{m}")', f'MAX(f."{m}")']
+
+    scope_match = ' AND '.join(f'{{alias}}."{c}" IS ?' for c in SCOPE)
+    if not spec.by_student:
+        source = f'"{spec.fact}" f'
+        where = '' if bucket is None else ' WHERE ' + scope_match.format(alias='f')
+    elif bucket == 'known':
+        source = f'"students" s JOIN "{spec.fact}" f ON f."student_id" = s."student_id"'
+        where = ' WHERE ' + scope_match.format(alias='s')
+    else:
+        source = f'"{spec.fact}" f LEFT JOIN "students" s ON s."student_id" = f."student_id"'
+        where = '' if bucket is None else ' WHERE s."student_id" IS NULL'
+    group_by = ', '.join(str(i + 1) for i in range(len(keys)))
+    return f'SELECT {", ".join(keys + stats)} FROM {source}{where} GROUP BY {group_by}'
+
+
+def _insert_sql(spec: RollupSpec, bucket: Optional[str] = None) -> str:
+    columns = ', '.join(f'"{c}"' for c in spec.key_columns + tuple(spec.measure_columns))
+    return f'INSERT INTO "{spec.name}" ({columns}) {_select_sql(spec, bucket)}'
+
+
+def create_rollup_tables(conn: sqlite3.Connection):
+    """Rollup tables (untyped columns keep source values as-is), bucket indexes and the dirty list"""
+    for spec in ROLLUPS:
+        columns = [f'"{c}" NOT NULL' if c in ('student_known', 'n') else f'"{c}"'
+                   for c in spec.key_columns + tuple(spec.measure_columns)]
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{spec.name}" (\n  ' + ',\n  '.join(columns) + '\n)')
+        bucket = ', '.join(f'"{c}"' for c in spec.bucket_columns)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{spec.name}_bucket" ON "{spec.name}"({bucket})')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS "{DIRTY_TABLE}" '
+                 '("fact" NOT NULL, "student_known" NOT NULL, "grade", "section", "region")')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{DIRTY_TABLE}" ON "{DIRTY_TABLE}"'
+                 '("fact", "grade", "section", "region")')
+
+
+def _mark_sql(fact: str, known: str, grade: str, section: str, region: str,
+              source: str = '', condition: str = '1') -> str:
+    """Statement adding one bucket to the dirty list unless it is already there"""
+    return (
+        f'INSERT INTO "{DIRTY_TABLE}" ("fact", "student_known", "grade", "section", "region") '
+        f"SELECT '{fact}', {known}, {grade}, {section}, {region}{source} "
+        f'WHERE {condition} AND NOT EXISTS (SELECT 1 FROM "{DIRTY_TABLE}" d '
+        f"WHERE d.\"fact\" = '{fact}' AND d.\"student_known\" = ({known}) AND d.\"grade\" IS {grade} "
+        f'AND d."section" IS {section} AND d."region" IS {region})'
+    )
+
+
+def _mark_student_bucket(fact: str, row: str) -> str:
+    """Dirty the bucket of the student that fact row `row` (NEW/OLD) belongs to"""
+    return _mark_sql(fact, 's."student_id" IS NOT NULL', 's."grade"', 's."section"', 's."region"',
+                     source=f' FROM (SELECT 1) LEFT JOIN "students" s ON s."student_id" = {row}."student_id"')
+
+
+def _student_change_marks(row: str, moved: str = '1', rekeyed: str = '1') -> List[str]:
+    """A student row appearing/disappearing moves its facts between its bucket and the unknown bucket
+
+    moved/rekeyed restrict the marks on UPDATE to scope changes and student_id changes.
+    """
+    marks = []
+    for fact in _facts():
+        if fact == 'students':
+            continue
+        has_rows = f'EXISTS (SELECT 1 FROM "{fact}" WHERE "student_id" = {row}."student_id")'
+        marks.append(_mark_sql(fact, '1', f'{row}."grade"', f'{row}."section"', f'{row}."region"',
+                               condition=f'({moved}) AND {has_rows}'))
+        marks.append(_mark_sql(fact, '0', 'NULL', 'NULL', 'NULL', condition=f'({rekeyed}) AND {has_rows}'))
+    return marks
+
+
+def _trigger_definitions() -> Dict[str, Tuple[str, str, List[str]]]:
+    """name -> (event, table, statements)"""
+    triggers: Dict[str, Tuple[str, str, List[str]]] = {}
+    for fact in _facts():
+        if fact == 'students':
+            continue
+        triggers[f'rollup_{fact}_ai'] = ('INSERT', fact, [_mark_student_bucket(fact, 'NEW')])
+        triggers[f'rollup_{fact}_ad'] = ('DELETE', fact, [_mark_student_bucket(fact, 'OLD')])
+        columns = ['student_id'] + list(OrderedDict.fromkeys(
+            c for spec in specs_for(fact) for c in spec.dims + spec.measures))
+        update = 'UPDATE OF ' + ', '.join(f'"{c}"' for c in columns)
+        triggers[f'rollup_{fact}_au'] = (update, fact, [_mark_student_bucket(fact, 'OLD'),
+                                                          _mark_student_bucket(fact, 'NEW')])
+
+    def own_mark(row: str) -> List[str]:
+        """rollup_students buckets are the student's own scope"""
+        return [_mark_sql('students', '1', f'{row}."grade"', f'{row}."section"', f'{row}."region"')]
+
+    rekeyed = 'OLD."student_id" IS NOT NEW."student_id"'
+    moved = ' OR '.join(f'OLD."{c}" IS NOT NEW."{c}"' for c in ('student_id',) + SCOPE)
+    triggers['rollup_students_ai'] = ('INSERT', 'students', own_mark('NEW') + _student_change_marks('NEW'))
+    triggers['rollup_students_ad'] = ('DELETE', 'students', own_mark('OLD') + _student_change_marks('OLD'))
+    watched = ('student_id',) + SCOPE + tuple(m for spec in specs_for('students') for m in spec.measures)
+    update = 'UPDATE OF ' + ', '.join(f'"{c}"' for c in watched)
+    triggers['rollup_students_au'] = (update, 'students', own_mark('OLD') + own_mark('NEW')
+                                      + _student_change_marks('OLD', moved, rekeyed)
+                                      + _student_change_marks('NEW', moved, rekeyed))
+    return triggers
+
+
+def install_triggers(conn: sqlite3.Connection):
+    for name, (event, table, statements) in _trigger_definitions().items():
+        body = ';\n  '.join(statements)
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS "{name}" AFTER {event} ON "{table}"\n'
+                     f'BEGIN\n  {body};\nEND')
+
+
+def drop_triggers(conn: sqlite3.Connection):
+    """Drop the maintenance triggers, e.g. before a bulk reload that rebuilds anyway"""
+    for name in _trigger_definitions():
+        conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+
+
+def drop_rollups(conn: sqlite3.Connection):
+    drop_triggers(conn)
+    for spec in ROLLUPS:
+        conn.execute(f'DROP TABLE IF EXISTS "{spec.name}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{DIRTY_TABLE}"')
+
+
+def rollups_installed(conn: sqlite3.Connection) -> bool:
+    """Every rollup table, the dirty list and every trigger exist"""
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE 'rollup%'")}
+    expected = {spec.name for spec in ROLLUPS} | {DIRTY_TABLE} | set(_trigger_definitions())
+    return expected <= names
+
+
+def _missing_sources(conn: sqlite3.Connection) -> List[str]:
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [table for table in SOURCE_TABLES if table not in names]
+
+
+def build_rollups(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Recompute every rollup from scratch and install the triggers; returns rows per rollup"""
+    missing = _missing_sources(conn)
+    if missing:
+        print(f"⚠️ Skipping rollups: missing tables {', '.join(missing)}")
+        return {}
+    counts = {}
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        create_rollup_tables(conn)
+        for spec in ROLLUPS:
+            conn.execute(f'DELETE FROM "{spec.name}"')
+            conn.execute(_insert_sql(spec))
+            counts[spec.name] = conn.execute(f'SELECT COUNT(*) FROM "{spec.name}"').fetchone()[0]
+        conn.execute(f'DELETE FROM "{DIRTY_TABLE}"')
+        install_triggers(conn)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return counts
+
+
+def refresh_rollups(conn: sqlite3.Connection) -> int:
+    """Recompute only the buckets marked dirty since the last refresh; returns buckets refreshed
+
+    Builds the rollups from scratch if they are not installed yet.
+    """
+    if not rollups_installed(conn):
+        build_rollups(conn)
+        return 0
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        dirty = conn.execute(
+            f'SELECT DISTINCT "fact", "student_known", "grade", "section", "region" FROM "{DIRTY_TABLE}"'
+        ).fetchall()
+        for fact, known, grade, section, region in dirty:
+            scope = (grade, section, region)
+            for spec in specs_for(fact):
+                match = ' AND '.join(f'"{c}" IS ?' for c in spec.bucket_columns)
+                if spec.by_student:
+                    conn.execute(f'DELETE FROM "{spec.name}" WHERE {match}', (known,) + scope)
+                    if known:
+                        conn.execute(_insert_sql(spec, 'known'), scope)
+                    else:
+                        conn.execute(_insert_sql(spec, 'unknown'))
+                else:
+                    conn.execute(f'DELETE FROM "{spec.name}" WHERE {match}', scope)
+                    conn.execute(_insert_sql(spec, 'known'), scope)
+        conn.execute(f'DELETE FROM "{DIRTY_TABLE}"')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return len(dirty)
+
+
+# ---------------------------------------------------------------------------
+# Routing
+# ---------------------------------------------------------------------------
+
+_AGGREGATES = {'COUNT', 'SUM', 'AVG', 'TOTAL', 'MIN', 'MAX'}
+_CLAUSES = ('FROM', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT')
+# Anything that changes row multiplicity or scoping in ways a rollup cannot reproduce
+_UNSUPPORTED = {
+    'UNION', 'INTERSECT', 'EXCEPT', 'WITH', 'OVER', 'WINDOW', 'FILTER', 'LEFT', 'RIGHT', 'FULL',
+    'CROSS', 'NATURAL', 'OUTER', 'USING', 'EXISTS', 'INDEXED', 'RETURNING', 'VALUES',
+}
+_CONSTANTS = {'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'TRUE', 'FALSE'}
+
+
+class RoutedQuery:
+    """Aggregate SQL rewritten onto a rollup table"""
+
+    __slots__ = ('sql', 'rollup', 'fact')
+
+    def __init__(self, sql: str, rollup: str, fact: str):
+        self.sql = sql
+        self.rollup = rollup
+        self.fact = fact
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Planner:
+    """Token-level rewrite of one SELECT; raises _Unsupported for anything it cannot prove equal"""
+
+    def __init__(self, sql_query: str, catalog: SchemaCatalog):
+        self.tokens = tokenize(sql_query)
+        if any(tok.kind == 'comment' for tok in self.tokens):
+            raise _Unsupported()
+        self.sig = [i for i, tok in enumerate(self.tokens) if tok.kind != 'ws']
+        if self.sig and self.tokens[self.sig[-1]].text == ';':
+            self.sig.pop()
+        self.catalog = catalog
+        self.replacements: Dict[int, Tuple[int, str]] = {}
+        self.suffixes: Dict[int, str] = {}
+        self.select_aliases: Set[str] = set()
+        self.dims_used: Set[str] = set()
+        self.aggregates = 0
+
+    def tok(self, pos: int) -> Optional[Token]:
+        return self.tokens[self.sig[pos]] if 0 <= pos < len(self.sig) else None
+
+    def text(self, start: int, end: int) -> str:
+        """Original text of sig positions start..end inclusive"""
+        return ''.join(tok.text for tok in self.tokens[self.sig[start]:self.sig[end] + 1])
+
+    def replace(self, start: int, end: int, text: str):
+        self.replacements[self.sig[start]] = (self.sig[end], text)
+
+    # -- structure -----------------------------------------------------------
+
+    def split_clauses(self) -> Dict[str, Tuple[int, int, int]]:
+        """clause -> (keyword position, body start, body end exclusive)"""
+        first = self.tok(0)
+        if first is None or first.upper != 'SELECT':
+            raise _Unsupported()
+        marks = [('SELECT', 0, 1)]
+        depth = 0
+        for pos in range(1, len(self.sig)):
+            tok = self.tok(pos)
+            if tok.text == '(':
+                depth += 1
+            elif tok.text == ')':
+                depth -= 1
+            elif tok.text == ';':
+                raise _Unsupported()
+            if tok.kind != 'ident':
+                continue
+            upper = tok.upper
+            if upper in _UNSUPPORTED or upper == 'SELECT':
+                raise _Unsupported()
+            if depth == 0 and upper in _CLAUSES:
+                body = pos + 1
+                if upper in ('GROUP', 'ORDER'):
+                    if self.tok(body) is None or self.tok(body).upper != 'BY':
+                        raise _Unsupported()
+                    body += 1
+                marks.append((upper, pos, body))
+
+        names = [name for name, _, _ in marks[1:]]
+        if 'FROM' not in names or len(set(names)) != len(names) \
+                or names != sorted(names, key=_CLAUSES.index):
+            raise _Unsupported()
+        clauses = {}
+        for i, (name, keyword, body) in enumerate(marks):
+            end = marks[i + 1][1] if i + 1 < len(marks) else len(self.sig)
+            clauses[name] = (keyword, body, end)
+        return clauses
+
+    def parse_from(self, start: int, end: int):
+        """`t [AS] a [[INNER] JOIN t [AS] a ON x.c = y.c]...` over students/homework and one fact table"""
+        self.aliases: Dict[str, str] = {}
+        self.joins: List[frozenset] = []
+        pos = self._read_table(start, end)
+        while pos < end:
+            if self.tok(pos).upper == 'INNER':
+                pos += 1
+            if pos >= end or self.tok(pos).upper != 'JOIN':
+                raise _Unsupported()
+            pos = self._read_table(pos + 1, end)
+            if pos + 8 > end or self.tok(pos).upper != 'ON':
+                raise _Unsupported()
+            left, right = self._column_ref(pos + 1), self._column_ref(pos + 5)
+            if left is None or right is None or self.tok(pos + 4).text not in ('=', '=='):
+                raise _Unsupported()
+            self.joins.append(frozenset((left, right)))
+            pos += 8
+
+        tables = sorted(self.aliases.values())
+        if len(tables) != len(set(tables)):
+            raise _Unsupported()
+        if 'performance' in tables and 'submissions' in tables:
+            raise _Unsupported()
+        self.fact = next((t for t in ('performance', 'submissions') if t in tables), 'students')
+
+        required = []
+        if self.fact != 'students' and 'students' in tables:
+            required.append(frozenset(((self.fact, 'student_id'), ('students', 'student_id'))))
+        if 'homework' in tables:
+            if self.fact != 'submissions':
+                raise _Unsupported()
+            required.append(frozenset((('submissions', 'homework_id'), ('homework', 'homework_id'))))
+        if set(tables) - {self.fact, 'students', 'homework'} or sorted(self.joins, key=sorted) != \
+                sorted(required, key=sorted):
+            raise _Unsupported()
+        self.students_joined = self.fact != 'students' and 'students' in tables
+        self.homework_alias = next((a for a, t in self.aliases.items() if t == 'homework'), None)
+
+    def _read_table(self, pos: int, end: int) -> int:
+        tok = self.tok(pos)
+        if pos >= end or tok.kind != 'ident' or tok.is_keyword:
+            raise _Unsupported()
+        info = self.catalog.get_table(tok.name)
+        if info is None or info.name.lower() not in ('students', 'performance', 'submissions', 'homework'):
+            raise _Unsupported()
+        table = info.name.lower()
+        alias = tok.name.lower()
+        pos += 1
+        nxt = self.tok(pos)
+        if pos < end and nxt.upper == 'AS':
+            pos += 1
+            nxt = self.tok(pos)
+            if pos >= end or nxt.kind != 'ident':
+                raise _Unsupported()
+        if pos < end and nxt.kind == 'ident' and not nxt.is_keyword:
+            alias = nxt.name.lower()
+            pos += 1
+        if alias in self.aliases:
+            raise _Unsupported()
+        self.aliases[alias] = table
+        return pos
+
+    def _column_ref(self, pos: int) -> Optional[Tuple[str, str]]:
+        """Resolve `alias.column` at pos to (table, column)"""
+        a, dot, c = self.tok(pos), self.tok(pos + 1), self.tok(pos + 2)
+        if a is None or c is None or dot.text != '.' or a.kind != 'ident' or c.kind != 'ident':
+            return None
+        table = self.aliases.get(a.name.lower())
+        info = self.catalog.get_table(table) if table else None
+        if info is None or not info.has_column(c.name):
+            raise _Unsupported()
+        return table, c.name.lower()
+
+    def resolve_bare(self, name: str) -> Tuple[str, str]:
+        owners = [table for table in set(self.aliases.values())
+                  if self.catalog.get_table(table).has_column(name)]
+        if len(owners) != 1:
+            raise _Unsupported()
+        return owners[0], name.lower()
+
+    # -- column classification -----------------------------------------------
+
+    def classify(self, table: str, column: str) -> Tuple[str, str]:
+        """(kind, rollup expression); kind is dim, measure, rowkey or student"""
+        family = specs_for(self.fact)
+        if table == 'homework':
+            return 'dim', f'{self.homework_alias}."{column}"'
+        if column in SCOPE and (table == 'students'):
+            return 'dim', f'{self.rollup_alias}."{column}"'
+        if table == self.fact:
+            if any(column in spec.dims for spec in family):
+                self.dims_used.add(column)
+                return 'dim', f'{self.rollup_alias}."{column}"'
+            if column in family[0].measures:
+                return 'measure', column
+            if column == family[0].key:
+                return 'rowkey', column
+        if column == 'student_id' and self.students_joined:
+            return 'student', column
+        raise _Unsupported()
+
+    # -- expressions -----------------------------------------------------------
+
+    def rewrite_clause(self, clause: str, start: int, end: int):
+        pos = start
+        while pos < end:
+            tok = self.tok(pos)
+            if tok.kind == 'op' and tok.text == '*' and clause == 'SELECT':
+                prev = self.tok(pos - 1)
+                if prev.text == ',' or prev.upper in ('SELECT', 'DISTINCT', 'ALL'):
+                    raise _Unsupported()
+            if tok.kind != 'ident' or tok.is_keyword:
+                pos += 1
+                continue
+
+            nxt = self.tok(pos + 1) if pos + 1 < end else None
+            if nxt is not None and nxt.text == '(':
+                if tok.upper in _AGGREGATES:
+                    close = self._matching_paren(pos + 1, end)
+                    self.replace(pos, close, self._aggregate(tok.upper, pos + 2, close))
+                    self.aggregates += 1
+                    pos = close + 1
+                else:
+                    pos += 1        # scalar function: its arguments are rewritten as we go
+                continue
+
+            if nxt is not None and nxt.text == '.':
+                kind, expr = self.classify(*self._column_ref(pos))
+                if kind != 'dim':
+                    raise _Unsupported()
+                self.replace(pos, pos + 2, expr)
+                pos += 3
+                continue
+
+            prev = self.tok(pos - 1)
+            if prev.upper == 'AS' or (clause == 'SELECT' and (
+                    prev.text == ')' or prev.kind in ('number', 'string')
+                    or (prev.kind == 'ident' and not prev.is_keyword))):
+                if clause == 'SELECT':
+                    self.select_aliases.add(tok.name.lower())
+                pos += 1
+                continue
+            if tok.upper in _CONSTANTS:
+                pos += 1
+                continue
+            if clause in ('GROUP', 'HAVING', 'ORDER') and tok.name.lower() in self.select_aliases:
+                # ORDER BY prefers the alias; elsewhere a same-named column would be ambiguous
+                if clause != 'ORDER' and any(self.catalog.get_table(t).has_column(tok.name)
+                                             for t in set(self.aliases.values())):
+                    raise _Unsupported()
+                pos += 1
+                continue
+            kind, expr = self.classify(*self.resolve_bare(tok.name))
+            if kind != 'dim':
+                raise _Unsupported()
+            self.replace(pos, pos, expr)
+            pos += 1
+
+    def _matching_paren(self, pos: int, end: int) -> int:
+        depth = 0
+        while pos < end:
+            text = self.tok(pos).text
+            depth += text == '('
+            depth -= text == ')'
+            if depth == 0:
+                return pos
+            pos += 1
+        raise _Unsupported()
+
+    def _aggregate(self, name: str, start: int, close: int) -> str:
+        """Rollup expression equal to name(args) over the fact rows"""
+        distinct = start < close and self.tok(start).upper == 'DISTINCT'
+        if distinct:
+            start += 1
+        r = self.rollup_alias
+        if close - start == 1 and self.tok(start).text == '*':
+            if name != 'COUNT' or distinct:
+                raise _Unsupported()
+            return f'IFNULL(SUM({r}."n"), 0)'
+
+        if close - start == 3 and self.tok(start + 1).text == '.':
+            ref = self._column_ref(start)
+        elif close - start == 1 and self.tok(start).kind == 'ident' and not self.tok(start).is_keyword:
+            ref = self.resolve_bare(self.tok(start).name)
+        else:
+            raise _Unsupported()
+        kind, expr = self.classify(*ref)
+
+        if kind == 'dim':
+            if name in ('MIN', 'MAX') or (name == 'COUNT' and distinct):
+                return f'{name}({"DISTINCT " if distinct else ""}{expr})'
+        elif kind == 'measure' and not distinct:
+            return {
+                'COUNT': f'IFNULL(SUM({r}."cnt_{expr}"), 0)',
+                'SUM': f'SUM({r}."sum_{expr}")',
+                'TOTAL': f'TOTAL({r}."sum_{expr}")',
+                'AVG': f'(SUM({r}."sum_{expr}") * 1.0 / SUM({r}."cnt_{expr}"))',
+                'MIN': f'MIN({r}."min_{expr}")',
+                'MAX': f'MAX({r}."max_{expr}")',
+            }[name]
+        elif name == 'COUNT' and (kind == 'rowkey' or (kind == 'student' and not distinct)):
+            return f'IFNULL(SUM({r}."n"), 0)'
+        raise _Unsupported()
+
+    def alias_unnamed_items(self, start: int, end: int):
+        """Keep result column names: SQLite names an unaliased expression by its original text"""
+        items, depth, item_start = [], 0, start
+        for pos in range(start, end):
+            text = self.tok(pos).text
+            depth += text == '('
+            depth -= text == ')'
+            if depth == 0 and text == ',':
+                items.append((item_start, pos - 1))
+                item_start = pos + 1
+        items.append((item_start, end - 1))
+
+        for first, last in items:
+            if self.tok(first).upper in ('DISTINCT', 'ALL'):
+                first += 1
+            changed = any(self.sig[first] <= idx <= self.sig[last] for idx in self.replacements)
+            plain_column = last == first or (last - first == 2 and self.tok(first + 1).text == '.')
+            tail, before = self.tok(last), self.tok(last - 1)
+            aliased = last > first and tail.kind == 'ident' and not tail.is_keyword and (
+                before.upper == 'AS' or before.text == ')' or before.kind in ('number', 'string')
+                or (before.kind == 'ident' and not before.is_keyword))
+            if changed and not plain_column and not aliased:
+                original = self.text(first, last).replace('"', '""')
+                self.suffixes[self.sig[last]] = self.suffixes.get(self.sig[last], '') + f' AS "{original}"'
+
+    # -- driver ----------------------------------------------------------------
+
+    def plan(self, available: Sequence[str]) -> RoutedQuery:
+        clauses = self.split_clauses()
+        _, from_start, from_end = clauses['FROM']
+        if from_start >= from_end:
+            raise _Unsupported()
+        self.parse_from(from_start, from_end)
+        self.rollup_alias = 'r' if self.homework_alias != 'r' else 'rr'
+
+        for clause in ('SELECT', 'WHERE', 'GROUP', 'HAVING', 'ORDER'):
+            if clause in clauses:
+                _, start, end = clauses[clause]
+                self.rewrite_clause(clause, start, end)
+        if 'LIMIT' in clauses:
+            _, start, end = clauses['LIMIT']
+            if any(self.tok(pos).kind == 'ident' and self.tok(pos).upper != 'OFFSET' for pos in range(start, end)):
+                raise _Unsupported()
+        if not self.aggregates:
+            raise _Unsupported()
+
+        spec = next((s for s in specs_for(self.fact)
+                     if set(self.dims_used) <= set(s.dims) and s.name in available), None)
+        if spec is None:
+            raise _Unsupported()
+
+        _, select_start, select_end = clauses['SELECT']
+        self.alias_unnamed_items(select_start, select_end)
+
+        r = self.rollup_alias
+        source = f'"{spec.name}" AS {r}'
+        if self.homework_alias:
+            source += f' JOIN "homework" AS {self.homework_alias} ON {self.homework_alias}."homework_id" = {r}."homework_id"'
+        if self.students_joined:
+            # The inner join to students drops facts whose student is missing
+            known = f'{r}."student_known" = 1'
+            if 'WHERE' in clauses:
+                keyword, start, end = clauses['WHERE']
+                # the replacement swallows the whitespace after WHERE: "AND (body)"
+                self.replacements[self.sig[keyword]] = (self.sig[start] - 1,
+                                                        f'{self.tok(keyword).text} {known} AND (')
+                self.suffixes[self.sig[end - 1]] = ')' + self.suffixes.get(self.sig[end - 1], '')
+            else:
+                source += f' WHERE {known}'
+        self.replace(from_start, from_end - 1, source)
+
+        parts, i = [], 0
+        while i < len(self.tokens):
+            if i in self.replacements:
+                last, text = self.replacements[i]
+            else:
+                last, text = i, self.tokens[i].text
+            parts.append(text)
+            for j in range(i, last + 1):
+                if j in self.suffixes:
+                    parts.append(self.suffixes[j])
+            i = last + 1
+        return RoutedQuery(''.join(parts), spec.name, self.fact)
+
+
+def plan_rollup_query(sql_query: str, catalog: SchemaCatalog, available: Sequence[str]) -> Optional[RoutedQuery]:
+    """Rewrite an aggregate query onto the coarsest available rollup, or None if it does not qualify"""
+    try:
+        return _Planner(sql_query, catalog).plan(available)
+    except _Unsupported:
+        return None
+
+
+class RollupRouter:
+    """Routes aggregate SQL to rollups that are installed and have no pending dirty buckets"""
+
+    def __init__(self, catalog: SchemaCatalog, executor, enabled: bool = ROLLUP_ROUTING,
+                 cache_size: int = 512):
+        self.catalog = catalog
+        self.executor = executor
+        self.enabled = enabled
+        self.cache_size = cache_size
+        self.routed = 0
+        self._versions = None
+        self._available: Tuple[str, ...] = ()
+        self._plans: "OrderedDict[Tuple[str, Tuple[str, ...]], Optional[RoutedQuery]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def available(self) -> Tuple[str, ...]:
+        """Rollups safe to read right now; re-checked only when the database changes"""
+        self.catalog.refresh()
+        versions = (self.catalog.schema_version, self.catalog.data_version)
+        with self._lock:
+            if versions == self._versions:
+                return self._available
+
+        available: Tuple[str, ...] = ()
+        if self.catalog.get_table(DIRTY_TABLE) is not None:
+            with self.executor.pool.connection() as conn:
+                if rollups_installed(conn):
+                    stale = {row[0] for row in conn.execute(f'SELECT DISTINCT "fact" FROM "{DIRTY_TABLE}"')}
+                    available = tuple(spec.name for spec in ROLLUPS if spec.fact not in stale)
+        with self._lock:
+            self._versions = versions
+            self._available = available
+        return available
+
+    def route(self, sql_query: str) -> Optional[RoutedQuery]:
+        if not self.enabled:
+            return None
+        available = self.available()
+        if not available:
+            return None
+        key = (sql_query, available)
+        with self._lock:
+            if key in self._plans:
+                self._plans.move_to_end(key)
+                routed = self._plans[key]
+                self.routed += routed is not None
+                return routed
+
+        routed = plan_rollup_query(sql_query, self.catalog, available)
+        with self._lock:
+            self._plans[key] = routed
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+            self.routed += routed is not None
+        return routed
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from ingest import connect_for_write
+
+    parser = argparse.ArgumentParser(description="Build and refresh Dumroo rollup tables")
+    parser.add_argument('--db', default=os.getenv('DATABASE_PATH', 'dumroo_education.db'),
+                        help="SQLite database (default: %(default)s)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--rebuild', action='store_true', help="recompute every rollup from scratch")
+    action.add_argument('--drop', action='store_true', help="remove rollup tables and triggers")
+    action.add_argument('--interval', type=float, help="keep refreshing every N seconds")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ Database not found: {args.db}")
+        return 1
+    conn = connect_for_write(args.db)
+    try:
+        if args.drop:
+            drop_rollups(conn)
+            print("✅ Rollups dropped")
+            return 0
+        if args.rebuild or not rollups_installed(conn):
+            start = time.perf_counter()
+            counts = build_rollups(conn)
+            for name, rows in counts.items():
+                print(f"✅ {name}: {rows:,} rows")
+            print(f"✅ Rollups built in {time.perf_counter() - start:.2f}s")
+            if not args.interval:
+                return 0
+        while True:
+            start = time.perf_counter()
+            buckets = refresh_rollups(conn)
+            if buckets or not args.interval:
+                print(f"✅ Refreshed {buckets} dirty bucket(s) in {time.perf_counter() - start:.3f}s")
+            if not args.interval:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
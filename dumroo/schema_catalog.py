@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Schema catalog for the Dumroo NL2SQL system
+Snapshot of table DDL, column types and sample rows, rebuilt only when SQLite
+reports a schema change; row counts are counted lazily per data version
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Internal tables (rollups) that are kept out of the LLM prompt
+HIDDEN_TABLE_PREFIXES = ('rollup_',)
+
+
+class TableInfo:
+    """Snapshot of a single table"""
+
+    __slots__ = ('name', 'ddl', 'columns', 'sample_rows', 'indexes')
+
+    def __init__(self, name: str, ddl: str, columns: List[Tuple[str, str]],
+                 sample_rows: List[Tuple], indexes: List[Tuple[str, ...]]):
+        self.name = name
+        self.ddl = ddl
+        self.columns = columns
+        self.sample_rows = sample_rows
+        self.indexes = indexes
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    def column_type(self, column: str) -> Optional[str]:
+        """Declared type of a column, or None if the table has no such column"""
+        for name, declared_type in self.columns:
+            if name.lower() == column.lower():
+                return declared_type
+        return None
+
+    def has_column(self, column: str) -> bool:
+        return self.column_type(column) is not None
+
+
+class SchemaCatalog:
+    """Shared schema snapshot keyed by PRAGMA schema_version; row counts by data_version"""
+
+    def __init__(self, db_path: str, sample_rows: int = 3):
+        self.db_path = os.path.abspath(db_path)
+        self.sample_row_count = sample_rows
+        self.tables: Dict[str, TableInfo] = {}
+        self.fingerprint = None
+        self.schema_version = None
+        self.data_version = None
+        self.rebuilds = 0
+        self._table_info_cache: Dict[Tuple[str, ...], str] = {}
+        self._row_counts: Dict[str, Tuple[Tuple[int, int], int]] = {}
+        self._lock = threading.RLock()
+
+        # data_version only changes for commits made by *other* connections,
+        # so the catalog keeps its own long-lived connection to watch it
+        self._conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self.refresh()
+
+    def _versions(self) -> Tuple[int, int]:
+        schema_version = self._conn.execute("PRAGMA schema_version").fetchone()[0]
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return schema_version, data_version
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the snapshot if the schema changed; returns True when rebuilt
+
+        A data-only change just moves data_version on, which makes the row
+        counts stale without touching the DDL snapshot.
+        """
+        with self._lock:
+            versions = self._versions()
+            if not force and versions[0] == self.schema_version:
+                self.data_version = versions[1]
+                return False
+            self._build(versions)
+            return True
+
+    def _build(self, versions: Tuple[int, int]):
+        """Reflect every user table in one pass"""
+        conn = self._conn
+        ddl_rows = conn.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+
+        tables = {}
+        for name, ddl in ddl_rows:
+            quoted = '"' + name.replace('"', '""') + '"'
+            columns = [(row[1], row[2] or '') for row in conn.execute(f"PRAGMA table_info({quoted})")]
+            sample = conn.execute(
+                f"SELECT * FROM {quoted} LIMIT {int(self.sample_row_count)}"
+            ).fetchall()
+            indexes = []
+            for index_row in conn.execute(f"PRAGMA index_list({quoted})"):
+                index_name = '"' + index_row[1].replace('"', '""') + '"'
+                indexes.append(tuple(col[2] for col in conn.execute(f"PRAGMA index_info({index_name})")))
+            tables[name] = TableInfo(name, ddl or '', columns, sample, indexes)
+
+        ddl_text = repr([(name, ddl) for name, ddl in ddl_rows])
+        self.fingerprint = hashlib.sha256(ddl_text.encode('utf-8')).hexdigest()[:16]
+        self.tables = tables
+        self.schema_version, self.data_version = versions
+        self._table_info_cache = {}
+        self.rebuilds += 1
+
+    def get_table(self, name: str) -> Optional[TableInfo]:
+        """Case-insensitive table lookup"""
+        self.refresh()
+        table = self.tables.get(name)
+        if table is not None:
+            return table
+        for table_name, info in self.tables.items():
+            if table_name.lower() == name.lower():
+                return info
+        return None
+
+    def row_count(self, name: str) -> Optional[int]:
+        """Rows in a table as of the current data_version; None for unknown tables
+
+        Counted on first use after a change, on a connection of its own so the
+        scan never holds the catalog lock.
+        """
+        info = self.get_table(name)
+        if info is None:
+            return None
+        version = (self.schema_version, self.data_version)
+        cached = self._row_counts.get(info.name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        quoted = '"' + info.name.replace('"', '""') + '"'
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            count = conn.execute(f"SELECT COUNT(*) FROM {quoted}").fetchone()[0]
+        finally:
+            conn.close()
+        self._row_counts[info.name] = (version, count)
+        return count
+
+    def table_names(self) -> List[str]:
+        self.refresh()
+        return list(self.tables)
+
+    def get_fingerprint(self) -> str:
+        """Hash of the DDL; stable across data-only changes"""
+        self.refresh()
+        return self.fingerprint
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        """Prompt-ready schema text in the same layout as SQLDatabase.get_table_info()"""
+        self.refresh()
+        with self._lock:
+            names = tuple(table_names) if table_names else tuple(
+                name for name in self.tables if not name.startswith(HIDDEN_TABLE_PREFIXES)
+            )
+            cached = self._table_info_cache.get(names)
+            if cached is not None:
+                return cached
+
+            blocks = []
+            for name in names:
+                table = self.tables.get(name)
+                if table is None:
+                    continue
+                header = "\t".join(table.column_names)
+                rows = "\n".join(
+                    "\t".join(str(value)[:100] for value in row) for row in table.sample_rows
+                )
+                blocks.append(
+                    f"{table.ddl.strip()}\n\n/*\n{len(table.sample_rows)} rows from {name} table:\n"
+                    f"{header}\n{rows}\n*/"
+                )
+            text = "\n\n\n".join(blocks)
+            self._table_info_cache[names] = text
+            return text
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
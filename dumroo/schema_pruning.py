@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Question-aware schema pruning for the Dumroo NL2SQL system
+Picks the tables and columns a question needs by matching its words against
+table keywords, column names and known values (grades, regions, subjects),
+closes the selection over foreign keys, and renders a compact schema for the
+LLM prompt in place of the full DDL-plus-sample-rows dump.
+"""
+
+import os
+import re
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from intent_engine import DEFAULT_VOCABULARY, SUBJECT_ALIASES
+from schema_catalog import HIDDEN_TABLE_PREFIXES, SchemaCatalog
+
+SCHEMA_PRUNING = os.getenv('SCHEMA_PRUNING', '1') != '0'
+
+# Word prefixes that pull a table into the prompt
+TABLE_KEYWORDS = {
+    'students': ('student', 'pupil', 'kid', 'child', 'attendance', 'absent', 'present', 'enrol', 'parent',
+                 'contact', 'email', 'topper'),
+    'homework': ('homework', 'assignment', 'due', 'assigned'),
+    'submissions': ('submi', 'late', 'pending', 'missing', 'unsubmitted', 'overdue', 'turned', 'handed'),
+    'performance': ('perform', 'mark', 'score', 'result', 'percent', 'exam', 'test', 'assessment', 'topper',
+                    'fail', 'pass', 'rank', 'best', 'worst', 'weak', 'struggl'),
+    'quizzes': ('quiz', 'upcoming', 'schedul', 'syllabus', 'topic', 'duration'),
+    'admin_users': ('admin', 'teacher', 'principal', 'staff'),
+}
+
+# Extra words that keep a column (but, unlike its own name, do not select its table)
+COLUMN_KEYWORDS = {
+    'marks_obtained': ('score', 'scored'),
+    'percentage': ('score', 'average', 'avg', 'best', 'worst', 'top', 'topper'),
+    'is_submitted': ('pending', 'missing', 'unsubmitted', 'turned', 'handed'),
+    'is_late': ('overdue',),
+    'scheduled_date': ('upcoming', 'when', 'next'),
+    'parent_contact': ('phone', 'parent'),
+}
+
+# Tables only sent when the question asks for them, even when nothing else matched
+ON_REQUEST_TABLES = ('admin_users',)
+
+# Columns left out of a matched table unless the question names them
+DETAIL_COLUMNS = {'parent_contact', 'email', 'enrollment_date', 'syllabus_topics', 'permissions', 'created_date'}
+
+# Name parts too generic to select a column on their own
+_SCOPE_COLUMNS = ('grade', 'section', 'region')
+_GENERIC_PARTS = {'id', 'is', 'date', 'total', 'type', 'name'} | set(_SCOPE_COLUMNS)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base when installed (loaded once), else None"""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                _encoding = None
+        return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """Prompt token count: cl100k_base as a proxy for Gemini's tokenizer, or ~4 characters per token"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text or '', disallowed_special=()))
+    return math.ceil(len(text or '') / 4)
+
+
+class PrunedSchema:
+    """Tables (in catalog order) and their kept columns for one question"""
+
+    __slots__ = ('tables', 'columns', 'matched', 'pruned', 'table_info')
+
+    def __init__(self, tables: List[str], columns: Dict[str, List[str]], matched: Set[str], pruned: bool,
+                 table_info: str):
+        self.tables = tables
+        self.columns = columns
+        self.matched = matched      # tables chosen by the question, not by foreign-key closure
+        self.pruned = pruned        # False when nothing matched and the full schema is used
+        self.table_info = table_info
+
+
+class SchemaPruner:
+    """Keyword/entity matcher over the schema catalog with foreign-key closure"""
+
+    def __init__(self, catalog: SchemaCatalog, vocabulary: Optional[Dict[str, List[str]]] = None):
+        self.catalog = catalog
+        vocabulary = vocabulary or DEFAULT_VOCABULARY
+        self.entities: List[Tuple[str, str]] = []     # (lowercase value, column it implies)
+        for key, column in (('grades', 'grade'), ('regions', 'region'), ('subjects', 'subject')):
+            self.entities += [(value.lower(), column) for value in vocabulary.get(key, [])]
+        self.entities += [(alias, 'subject') for alias in SUBJECT_ALIASES]
+
+    def foreign_keys(self) -> Dict[str, Dict[str, str]]:
+        """table -> {column: referenced table}, inferred from <name>_id columns matching another table's key"""
+        tables = {name: info for name, info in self.catalog.tables.items()
+                  if not name.startswith(HIDDEN_TABLE_PREFIXES)}
+        keys = {info.column_names[0].lower(): name for name, info in tables.items() if info.column_names}
+        references = {}
+        for name, info in tables.items():
+            for column in info.column_names[1:]:
+                target = keys.get(column.lower())
+                if target and target != name and column.lower().endswith('_id'):
+                    references.setdefault(name, {})[column] = target
+        return references
+
+    def prune(self, question: str) -> PrunedSchema:
+        self.catalog.refresh()
+        text = ' '.join(_WORD_RE.findall((question or '').lower()))
+        words = text.split()
+        visible = [name for name in self.catalog.tables if not name.startswith(HIDDEN_TABLE_PREFIXES)]
+
+        wanted_columns: Set[str] = set()
+        for phrase, column in self.entities:
+            if re.search(rf'\b{re.escape(phrase)}\b', text):
+                wanted_columns.add(column)
+        if re.search(r'\b(?:grade|class)\s*\d', text):
+            wanted_columns.add('grade')
+        if re.search(r'\bsections?\b', text):
+            wanted_columns.add('section')
+
+        # A column shared by several tables (grade, subject, ...) says nothing about which one is meant
+        owners: Dict[str, int] = {}
+        for name in visible:
+            for column in self.catalog.tables[name].column_names:
+                owners[column.lower()] = owners.get(column.lower(), 0) + 1
+
+        matched: Set[str] = set()
+        columns: Dict[str, Set[str]] = {}
+        for name in visible:
+            info = self.catalog.tables[name]
+            if _any_prefix(words, TABLE_KEYWORDS.get(name, ())) or _any_prefix(words, _singular_forms(name)):
+                matched.add(name)
+            for column in info.column_names:
+                if self._column_named(column, words):
+                    columns.setdefault(name, set()).add(column)
+                    if owners[column.lower()] == 1 and name not in ON_REQUEST_TABLES:
+                        matched.add(name)
+                elif _any_prefix(words, COLUMN_KEYWORDS.get(column.lower(), ())):
+                    columns.setdefault(name, set()).add(column)
+
+        if not matched:
+            return self._full_schema(visible)
+
+        references = self.foreign_keys()
+        selected = set(matched)
+        pending = list(matched)
+        while pending:
+            for target in references.get(pending.pop(), {}).values():
+                if target not in selected:
+                    selected.add(target)
+                    pending.append(target)
+
+        tables = [name for name in visible if name in selected]
+        kept: Dict[str, List[str]] = {}
+        for name in tables:
+            info = self.catalog.tables[name]
+            mentioned = columns.get(name, set())
+            keep = []
+            for position, column in enumerate(info.column_names):
+                lowered = column.lower()
+                if (position == 0 or column in references.get(name, {}) or column in mentioned
+                        or lowered in _SCOPE_COLUMNS or lowered in wanted_columns
+                        or lowered.endswith(('_name', 'title'))
+                        or (name in matched and lowered not in DETAIL_COLUMNS)):
+                    keep.append(column)
+            kept[name] = keep
+        return PrunedSchema(tables, kept, matched, True, self.render(kept, references))
+
+    def render(self, columns: Dict[str, List[str]], references: Optional[Dict[str, Dict[str, str]]] = None) -> str:
+        """One line per table with typed columns and foreign keys, plus one sample row"""
+        references = self.foreign_keys() if references is None else references
+        lines = []
+        for name, keep in columns.items():
+            info = self.catalog.tables[name]
+            positions = [info.column_names.index(column) for column in keep]
+            parts = []
+            for column, position in zip(keep, positions):
+                part = f"{column} {info.columns[position][1] or 'TEXT'}".rstrip()
+                target = references.get(name, {}).get(column)
+                if target:
+                    part += f" REFERENCES {target}({column})"
+                parts.append(part)
+            lines.append(f"{name}({', '.join(parts)})")
+            if info.sample_rows:
+                sample = tuple(_short(info.sample_rows[0][position]) for position in positions)
+                lines.append(f"  -- e.g. {sample!r}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _column_named(column: str, words: List[str]) -> bool:
+        """True when a word matches a (non-generic) part of the column name"""
+        parts = [part for part in column.lower().split('_') if part not in _GENERIC_PARTS and len(part) >= 4]
+        return any(len(word) >= 4 and (word.startswith(part) or part.startswith(word))
+                   for word in words for part in parts)
+
+    def _full_schema(self, visible: List[str]) -> PrunedSchema:
+        visible = [name for name in visible if name not in ON_REQUEST_TABLES]
+        columns = {name: self.catalog.tables[name].column_names for name in visible}
+        return PrunedSchema(visible, columns, set(), False, self.catalog.get_table_info(visible))
+
+
+def _any_prefix(words: Iterable[str], prefixes: Iterable[str]) -> bool:
+    prefixes = tuple(prefixes)
+    return bool(prefixes) and any(word.startswith(prefixes) for word in words)
+
+
+def _singular_forms(table: str) -> Tuple[str, ...]:
+    name = table.lower()
+    return (name[:-3] if name.endswith('zes') else name.rstrip('s'),)
+
+
+def _short(value, limit: int = 40):
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit - 3] + '...'
+    return value
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Region-sharded execution for the Dumroo NL2SQL system
+An optional layout next to the main database: one SQLite file per region
+holding that region's students with all of their submissions and performance
+rows, plus full copies of the region-free tables (homework, quizzes,
+admin_users). ingest.py builds it; this module routes secured queries onto it.
+
+A user scoped to one region is served entirely by that region's shard. For
+everyone else, SQL that can be split is scattered across the shards on a
+thread pool and merged: each shard returns partial aggregates (AVG travels as
+SUM and COUNT), and a final query over the partials in an in-memory SQLite
+re-aggregates and re-applies HAVING, ORDER BY and LIMIT. SQL that cannot be
+split safely keeps running on the main database.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from db_engine import QueryExecutor, QueryResult
+from rbac import ScopeError, Token, find_table_refs, tokenize
+from metrics import span
+
+# Directory holding the region shards and their manifest; empty disables sharding
+SHARD_DIR = os.getenv('SHARD_DIR', '')
+SHARD_MANIFEST = 'shards.json'
+# Column that assigns a student (and everything keyed by student_id) to a shard
+SHARD_COLUMN = 'region'
+# Tables with no region of their own; every shard holds a full copy
+REPLICATED_TABLES = ('homework', 'quizzes', 'admin_users')
+# Threads running shard queries for scatter-gather
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '8'))
+
+_AGGREGATES = {'COUNT', 'SUM', 'TOTAL', 'AVG', 'MIN', 'MAX'}
+# Aggregates (and window/ordered-set syntax) whose partials cannot be combined
+_UNMERGEABLE = {'GROUP_CONCAT', 'STRING_AGG', 'JSON_GROUP_ARRAY', 'JSON_GROUP_OBJECT', 'OVER', 'FILTER',
+                'WINDOW', 'COLLATE', 'RANDOM'}
+_CLAUSES = ('FROM', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT')
+_CONSTANTS = {'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'TRUE', 'FALSE', 'NULL'}
+
+
+def shard_file_name(region: Optional[str]) -> str:
+    """File name of a region's shard ("North Delhi" -> north_delhi.db)"""
+    slug = re.sub(r'[^a-z0-9]+', '_', (region or 'unassigned').lower()).strip('_')
+    return f"{slug or 'unassigned'}.db"
+
+
+def write_manifest(shard_dir: str, regions: Dict[str, str], default_region: str):
+    """Record region -> file; written last, so a manifest always describes complete shards"""
+    path = os.path.join(shard_dir, SHARD_MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as handle:
+        json.dump({'column': SHARD_COLUMN, 'regions': regions, 'default': default_region,
+                   'replicated': list(REPLICATED_TABLES), 'built_at': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                  handle, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_manifest(shard_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(shard_dir, SHARD_MANIFEST), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+class _Unsplittable(Exception):
+    pass
+
+
+class MergePlan:
+    """Per-shard SQL plus how to combine the shard results
+
+    partial_sql runs on every shard with the secured query's parameters. For
+    aggregate queries final_sql runs over the concatenated partials (table
+    "partials", columns c0, c1, ...); otherwise final_sql is built once the
+    partial column count is known, from sort_keys and limit.
+    """
+
+    __slots__ = ('partial_sql', 'final_sql', 'columns', 'distinct', 'sort_keys', 'limit', 'offset',
+                 'aggregate')
+
+    def __init__(self, partial_sql: str, final_sql: Optional[str] = None, columns: Optional[List[str]] = None,
+                 distinct: bool = False, sort_keys: Sequence[str] = (), limit: Optional[int] = None,
+                 offset: int = 0, aggregate: bool = False):
+        self.partial_sql = partial_sql
+        self.final_sql = final_sql
+        self.columns = columns
+        self.distinct = distinct
+        self.sort_keys = list(sort_keys)    # direction suffixes (" DESC", " ASC NULLS LAST", ...)
+        self.limit = limit
+        self.offset = offset
+        self.aggregate = aggregate
+
+    def final_for(self, width: int) -> str:
+        """Merge query for a row-level result of `width` partial columns"""
+        if self.final_sql is not None:
+            return self.final_sql
+        shown = width - len(self.sort_keys)
+        sql = f"SELECT {'DISTINCT ' if self.distinct else ''}" + ', '.join(f'"c{i}"' for i in range(shown))
+        sql += ' FROM partials'
+        if self.sort_keys:
+            sql += ' ORDER BY ' + ', '.join(f'"c{shown + i}"{suffix}' for i, suffix in enumerate(self.sort_keys))
+        if self.limit is not None:
+            sql += f' LIMIT {self.limit} OFFSET {self.offset}'
+        return sql
+
+
+class _Planner:
+    """Token-level split of one secured SELECT into per-shard and merge queries"""
+
+    def __init__(self, sql_query: str):
+        self.tokens = tokenize(sql_query)
+        self.sig = [i for i, tok in enumerate(self.tokens) if tok.kind not in ('ws', 'comment')]
+        if self.sig and self.tokens[self.sig[-1]].text == ';':
+            self.sig.pop()
+        if any(tok.text == ';' for tok in self.sig_tokens()):
+            raise _Unsplittable()
+
+    def sig_tokens(self) -> List[Token]:
+        return [self.tokens[i] for i in self.sig]
+
+    def tok(self, pos: int) -> Optional[Token]:
+        return self.tokens[self.sig[pos]] if 0 <= pos < len(self.sig) else None
+
+    def text(self, start: int, end: int) -> str:
+        """Original text of sig positions start..end-1 (comments become spaces)"""
+        if start >= end:
+            return ''
+        return ''.join(' ' if tok.kind == 'comment' else tok.text
+                       for tok in self.tokens[self.sig[start]:self.sig[end - 1] + 1])
+
+    def split_clauses(self) -> Dict[str, Tuple[int, int]]:
+        """clause -> (body start, body end) at the top level"""
+        if self.tok(0) is None or self.tok(0).upper != 'SELECT':
+            raise _Unsplittable()
+        marks = [('SELECT', 0, 1)]
+        depth = 0
+        for pos in range(1, len(self.sig)):
+            tok = self.tok(pos)
+            depth += tok.text == '('
+            depth -= tok.text == ')'
+            if tok.kind != 'ident':
+                continue
+            if tok.upper in _UNMERGEABLE:
+                raise _Unsplittable()
+            if depth == 0:
+                if tok.upper in ('UNION', 'EXCEPT', 'INTERSECT', 'VALUES'):
+                    raise _Unsplittable()
+                if tok.upper in _CLAUSES:
+                    body = pos + 1
+                    if tok.upper in ('GROUP', 'ORDER'):
+                        if self.tok(body) is None or self.tok(body).upper != 'BY':
+                            raise _Unsplittable()
+                        body += 1
+                    marks.append((tok.upper, pos, body))
+        names = [name for name, _, _ in marks]
+        if 'FROM' not in names or len(set(names)) != len(names):
+            raise _Unsplittable()
+        clauses = {}
+        for i, (name, _, body) in enumerate(marks):
+            end = marks[i + 1][1] if i + 1 < len(marks) else len(self.sig)
+            clauses[name] = (body, end)
+        return clauses
+
+    def split_list(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Comma-separated items of a clause body as (start, end) spans"""
+        items, depth, item_start = [], 0, start
+        for pos in range(start, end):
+            text = self.tok(pos).text
+            depth += text == '('
+            depth -= text == ')'
+            if depth == 0 and text == ',':
+                items.append((item_start, pos))
+                item_start = pos + 1
+        items.append((item_start, end))
+        if any(s >= e for s, e in items):
+            raise _Unsplittable()
+        return items
+
+    def matching_paren(self, pos: int, end: int) -> int:
+        depth = 0
+        while pos < end:
+            text = self.tok(pos).text
+            depth += text == '('
+            depth -= text == ')'
+            if depth == 0:
+                return pos
+            pos += 1
+        raise _Unsplittable()
+
+    def item_alias(self, start: int, end: int) -> Tuple[int, Optional[str]]:
+        """(end of the expression, alias or None) for a select item"""
+        last = self.tok(end - 1)
+        if end - start >= 2 and last.kind == 'ident' and not last.is_keyword:
+            before = self.tok(end - 2)
+            if before.upper == 'AS':
+                return end - 2, last.name
+            if before.text == ')' or before.kind in ('number', 'string') or (
+                    before.kind == 'ident' and not before.is_keyword):
+                return end - 1, last.name
+        return end, None
+
+    def column_name(self, start: int, end: int) -> str:
+        """Result column name SQLite gives an unaliased expression"""
+        if end - start == 1 and self.tok(start).kind == 'ident':
+            return self.tok(start).name
+        if end - start == 3 and self.tok(start + 1).text == '.' and self.tok(start + 2).kind == 'ident':
+            return self.tok(start + 2).name
+        return self.text(start, end).strip()
+
+    def key(self, start: int, end: int) -> Tuple[str, ...]:
+        """Comparable form of an expression (case- and quote-insensitive identifiers)"""
+        return tuple(tok.name.lower() if tok.kind == 'ident' else tok.text.upper()
+                     for tok in (self.tok(pos) for pos in range(start, end)))
+
+    # -- planning --------------------------------------------------------------
+
+    def plan(self) -> MergePlan:
+        clauses = self.split_clauses()
+        for name in ('SELECT', 'GROUP', 'HAVING', 'ORDER', 'LIMIT'):
+            if name in clauses:
+                start, end = clauses[name]
+                for pos in range(start, end):
+                    tok = self.tok(pos)
+                    if tok.kind == 'param' or tok.upper == 'SELECT':
+                        raise _Unsplittable()   # parameters or subqueries outside FROM/WHERE
+
+        select_start, select_end = clauses['SELECT']
+        distinct = self.tok(select_start).upper in ('DISTINCT', 'ALL')
+        if distinct:
+            distinct = self.tok(select_start).upper == 'DISTINCT'
+            select_start += 1
+        self.items = []
+        for start, end in self.split_list(select_start, select_end):
+            expr_end, alias = self.item_alias(start, end)
+            self.items.append((start, expr_end, alias or self.column_name(start, expr_end)))
+
+        aggregated = 'GROUP' in clauses or 'HAVING' in clauses or any(
+            self._has_aggregate(start, end) for start, end, _ in self.items)
+        limit, offset = self._limit(clauses.get('LIMIT'))
+        if aggregated:
+            if distinct:
+                raise _Unsplittable()
+            return self._plan_aggregate(clauses, limit, offset)
+        return self._plan_rows(clauses, distinct, limit, offset)
+
+    def _has_aggregate(self, start: int, end: int) -> bool:
+        return any(self.tok(pos).upper in _AGGREGATES and self.tok(pos + 1) is not None
+                   and self.tok(pos + 1).text == '(' for pos in range(start, end))
+
+    def _limit(self, span_: Optional[Tuple[int, int]]) -> Tuple[Optional[int], int]:
+        if span_ is None:
+            return None, 0
+        parts = [self.tok(pos) for pos in range(*span_)]
+        if len(parts) == 1 and parts[0].kind == 'number':
+            return int(parts[0].text), 0
+        if len(parts) == 3 and parts[0].kind == 'number' and parts[2].kind == 'number':
+            if parts[1].upper == 'OFFSET':
+                return int(parts[0].text), int(parts[2].text)
+            if parts[1].text == ',':
+                return int(parts[2].text), int(parts[0].text)
+        raise _Unsplittable()
+
+    def _order_terms(self, clauses) -> List[Tuple[int, int, str]]:
+        """(expression start, end, direction suffix) per ORDER BY term"""
+        if 'ORDER' not in clauses:
+            return []
+        terms = []
+        for start, end in self.split_list(*clauses['ORDER']):
+            suffix = []
+            while end - start > 1 and self.tok(end - 1).upper in ('ASC', 'DESC', 'NULLS', 'FIRST', 'LAST'):
+                suffix.insert(0, self.tok(end - 1).upper)
+                end -= 1
+            terms.append((start, end, ''.join(' ' + word for word in suffix)))
+        return terms
+
+    def _resolve_item(self, start: int, end: int) -> Optional[int]:
+        """Select item an ORDER BY/GROUP BY term names by position or alias"""
+        tok = self.tok(start)
+        if end - start == 1 and tok.kind == 'number':
+            index = int(tok.text) - 1
+            if not 0 <= index < len(self.items):
+                raise _Unsplittable()
+            return index
+        if end - start == 1 and tok.kind == 'ident':
+            for index, (item_start, item_end, name) in enumerate(self.items):
+                if name.lower() == tok.name.lower() and self.key(item_start, item_end) != self.key(start, end):
+                    return index
+        return None
+
+    def _plan_rows(self, clauses, distinct: bool, limit: Optional[int], offset: int) -> MergePlan:
+        """Row-level query: shards return rows plus hidden sort keys, the merge re-sorts and re-limits"""
+        hidden, sort_keys = [], []
+        item_keys = [self.key(start, end) for start, end, _ in self.items]
+        for start, end, suffix in self._order_terms(clauses):
+            index = self._resolve_item(start, end)
+            if index is not None:
+                start, end = self.items[index][0], self.items[index][1]
+            elif distinct and self.key(start, end) not in item_keys:
+                raise _Unsplittable()   # a hidden sort column would change what DISTINCT removes
+            if self.tok(start).text == '*' or (end - start == 3 and self.tok(end - 1).text == '*'):
+                raise _Unsplittable()
+            hidden.append(self.text(start, end).strip())
+            sort_keys.append(suffix)
+
+        select_start, select_end = clauses['SELECT']
+        partial = self.text(0, select_end)
+        partial += ''.join(f', {expr} AS "__sort{i}"' for i, expr in enumerate(hidden))
+        rest_end = clauses['LIMIT'][0] - 1 if 'LIMIT' in clauses else len(self.sig)
+        partial += ' ' + self.text(select_end, rest_end).strip()
+        if limit is not None:
+            partial += f' LIMIT {limit + offset}'
+        return MergePlan(partial, distinct=distinct, sort_keys=sort_keys, limit=limit, offset=offset)
+
+    def _plan_aggregate(self, clauses, limit: Optional[int], offset: int) -> MergePlan:
+        """Aggregate query: shards return group keys and partial aggregates, the merge re-aggregates"""
+        # Group keys, each output once by the shards
+        self.group_keys: List[Tuple[str, ...]] = []
+        group_exprs: List[str] = []
+        if 'GROUP' in clauses:
+            for start, end in self.split_list(*clauses['GROUP']):
+                index = self._resolve_item(start, end)
+                if index is not None:
+                    start, end = self.items[index][0], self.items[index][1]
+                if self._has_aggregate(start, end):
+                    raise _Unsplittable()
+                key = self.key(start, end)
+                if key not in self.group_keys:
+                    self.group_keys.append(key)
+                    group_exprs.append(self.text(start, end).strip())
+
+        self.components: List[str] = []      # partial aggregate expressions after the group keys
+        self.names = {name.lower() for _, _, name in self.items}
+        final_items = []
+        for start, end, name in self.items:
+            if self.tok(start).text == '*' or (end - start == 3 and self.tok(end - 1).text == '*'):
+                raise _Unsplittable()
+            expr = self._rewrite(start, end, allow_names=False)
+            final_items.append(f'{expr} AS "{name.replace(chr(34), chr(34) * 2)}"')
+
+        final = 'SELECT ' + ', '.join(final_items) + ' FROM partials'
+        if group_exprs:
+            final += ' GROUP BY ' + ', '.join(f'"c{i}"' for i in range(len(group_exprs)))
+        if 'HAVING' in clauses:
+            final += ' HAVING ' + self._rewrite(*clauses['HAVING'], allow_names=True)
+        terms = self._order_terms(clauses)
+        if terms:
+            final += ' ORDER BY ' + ', '.join(
+                self._rewrite(start, end, allow_names=True) + suffix for start, end, suffix in terms)
+        if limit is not None:
+            final += f' LIMIT {limit} OFFSET {offset}'
+
+        select_start, select_end = clauses['SELECT']
+        outputs = group_exprs + self.components
+        partial = 'SELECT ' + ', '.join(f'{expr} AS "c{i}"' for i, expr in enumerate(outputs))
+        where_end = next((clauses[name][0] - (2 if name in ('GROUP', 'ORDER') else 1)
+                          for name in ('GROUP', 'HAVING', 'ORDER', 'LIMIT') if name in clauses), len(self.sig))
+        partial += ' ' + self.text(select_end, where_end).strip()
+        if group_exprs:
+            partial += ' GROUP BY ' + ', '.join(group_exprs)
+        return MergePlan(partial, final, [name for _, _, name in self.items], aggregate=True)
+
+    def _component(self, expr: str) -> str:
+        """Partials column holding one shard-level aggregate"""
+        if expr not in self.components:
+            self.components.append(expr)
+        return f'"c{len(self.group_keys) + self.components.index(expr)}"'
+
+    def _combine(self, name: str, start: int, close: int) -> str:
+        """Merge expression for aggregate name(args) at sig positions start..close"""
+        args_start = start + 2
+        distinct = self.tok(args_start).upper == 'DISTINCT'
+        if distinct:
+            args_start += 1
+        if args_start >= close:
+            raise _Unsplittable()
+        args = self.text(args_start, close).strip()
+        if distinct:
+            if name in ('MIN', 'MAX'):
+                distinct = False
+            elif name == 'COUNT' and self.tok(close - 1).kind == 'ident' \
+                    and self.tok(close - 1).name.lower() == 'student_id':
+                # Students never span shards, so per-shard distinct counts add up
+                return f'SUM({self._component(f"COUNT(DISTINCT {args})")})'
+            else:
+                raise _Unsplittable()
+        if name == 'AVG':
+            total, count = self._component(f'SUM({args})'), self._component(f'COUNT({args})')
+            return f'(TOTAL({total}) / NULLIF(SUM({count}), 0))'
+        if name == 'COUNT':
+            return f'SUM({self._component(f"COUNT({args})")})'
+        return f'{name}({self._component(f"{name}({args})")})'
+
+    def _rewrite(self, start: int, end: int, allow_names: bool) -> str:
+        """Expression over the partials: aggregates combined, group keys by column, result names kept"""
+        parts, pos = [], start
+        while pos < end:
+            tok = self.tok(pos)
+            nxt = self.tok(pos + 1) if pos + 1 < end else None
+            if tok.upper in _AGGREGATES and nxt is not None and nxt.text == '(':
+                close = self.matching_paren(pos + 1, end)
+                parts.append(self._combine(tok.upper, pos, close))
+                pos = close + 1
+                continue
+            matched = self._match_group_key(pos, end)
+            if matched is not None:
+                index, length = matched
+                parts.append(f'"c{index}"')
+                pos += length
+                continue
+            after_as = pos > start and self.tok(pos - 1).upper == 'AS'   # CAST(... AS REAL)
+            if tok.kind == 'ident' and not tok.is_keyword and tok.upper not in _CONSTANTS \
+                    and not after_as and not (nxt is not None and nxt.text == '('):
+                if allow_names and tok.name.lower() in self.names and (nxt is None or nxt.text != '.'):
+                    parts.append(tok.text)     # a result column alias, resolved by the merge query
+                    pos += 1
+                    continue
+                raise _Unsplittable()       # a column that is neither grouped nor aggregated
+            parts.append(tok.text)
+            pos += 1
+        return ' '.join(parts)
+
+    def _match_group_key(self, pos: int, end: int) -> Optional[Tuple[int, int]]:
+        best = None
+        for index, key in enumerate(self.group_keys):
+            length = len(key)
+            if pos + length <= end and self.key(pos, pos + length) == key:
+                if best is None or length > best[1]:
+                    best = (index, length)
+        return best
+
+
+def plan_merge(secured_sql: str) -> Optional[MergePlan]:
+    """Per-shard and merge SQL for a secured query, or None if it cannot be split"""
+    try:
+        return _Planner(secured_sql).plan()
+    except (_Unsplittable, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _colocated(sql_query: str, partitioned: Sequence[str]) -> bool:
+    """True when every partitioned table in the (pre-RBAC) SQL is joined on student_id
+
+    Facts live in their student's shard, so joins along student_id never cross
+    shards; a subquery over partitioned data would see only one shard.
+    """
+    tokens = tokenize(sql_query)
+    sig = [tok for tok in tokens if tok.kind not in ('ws', 'comment')]
+    refs = [ref for ref in find_table_refs(tokens) if ref.table.lower() in partitioned]
+    if not refs:
+        return True
+    if sum(1 for tok in sig if tok.kind == 'ident' and tok.upper == 'SELECT') > 1:
+        return False
+    if len(refs) == 1:
+        return True
+
+    # alias -> table for the partitioned references
+    index = {id(tok): i for i, tok in enumerate(sig)}
+    aliases = {}
+    using = []      # aliases joined to the preceding tables with USING (student_id)
+    for ref in refs:
+        pos = index[id(tokens[ref.end])]
+        alias = ref.table.lower()
+        nxt = sig[pos + 1] if pos + 1 < len(sig) else None
+        if nxt is not None and nxt.upper == 'AS':
+            pos += 1
+            nxt = sig[pos + 1] if pos + 1 < len(sig) else None
+        if ref.has_alias and nxt is not None and nxt.kind == 'ident':
+            alias = nxt.name.lower()
+            pos += 1
+        if alias in aliases:
+            return False
+        following = [tok.upper if tok.kind != 'ident' else tok.name.upper() for tok in sig[pos + 1:pos + 5]]
+        if aliases and following == ['USING', '(', 'STUDENT_ID', ')']:
+            using.append((alias, list(aliases)[-1]))
+        aliases[alias] = ref
+    parent = {alias: alias for alias in aliases}
+
+    def find(alias):
+        while parent[alias] != alias:
+            alias = parent[alias]
+        return alias
+
+    for i in range(len(sig) - 6):
+        left, dot1, col1, eq, right, dot2, col2 = sig[i:i + 7]
+        if dot1.text == '.' and dot2.text == '.' and eq.text in ('=', '==') \
+                and col1.kind == 'ident' and col2.kind == 'ident' \
+                and col1.name.lower() == 'student_id' and col2.name.lower() == 'student_id':
+            a, b = left.name.lower(), right.name.lower()
+            if a in parent and b in parent:
+                parent[find(a)] = find(b)
+    for a, b in using:
+        parent[find(a)] = find(b)
+    return len({find(alias) for alias in aliases}) == 1
+
+
+class ShardRoute:
+    """Where a secured query runs: one shard, every listed shard (with a merge plan), or the main database"""
+
+    __slots__ = ('mode', 'regions', 'plan')
+
+    def __init__(self, mode: str, regions: Sequence[str], plan: Optional[MergePlan] = None):
+        self.mode = mode            # single or scatter
+        self.regions = list(regions)
+        self.plan = plan
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'mode': self.mode, 'regions': self.regions}
+
+
+class ShardRouter:
+    """Routes secured SQL to region shards and runs scatter-gather with merged results"""
+
+    def __init__(self, shard_dir: str, catalog, typer=None, workers: int = None):
+        manifest = load_manifest(shard_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"no shard manifest in {shard_dir}")
+        self.shard_dir = shard_dir
+        self.catalog = catalog
+        self.regions: Dict[str, str] = manifest['regions']
+        self.default_region: str = manifest.get('default') or sorted(self.regions)[0]
+        self.replicated = {name.lower() for name in manifest.get('replicated', REPLICATED_TABLES)}
+        self.executors: Dict[str, QueryExecutor] = {
+            region: QueryExecutor(os.path.join(shard_dir, file_name), typer=typer)
+            for region, file_name in self.regions.items()
+        }
+        self.scattered = self.single = self.unsplit = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers or SHARD_WORKERS, thread_name_prefix='dumroo-shard')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, catalog, typer=None, shard_dir: str = None) -> Optional['ShardRouter']:
+        """Router for SHARD_DIR when it holds a built layout, else None"""
+        shard_dir = SHARD_DIR if shard_dir is None else shard_dir
+        if not shard_dir or load_manifest(shard_dir) is None:
+            return None
+        return cls(shard_dir, catalog, typer)
+
+    def partitioned_tables(self) -> List[str]:
+        return [name.lower() for name in self.catalog.table_names() if name.lower() not in self.replicated]
+
+    def route(self, sql_query: str, secured_sql: str, regions: Optional[Sequence[str]]) -> Optional[ShardRoute]:
+        """Route for a secured query; regions is the user's region scope (None: every region)
+
+        None means run on the main database.
+        """
+        targets = sorted(self.regions) if regions is None else [r for r in regions if r in self.regions]
+        if not targets:
+            targets = [self.default_region]     # the scope filters every row out anyway
+        partitioned = self.partitioned_tables()
+        try:
+            refs = {ref.table.lower() for ref in find_table_refs(tokenize(sql_query))}
+        except ScopeError:
+            return None
+        if len(targets) == 1 or not refs & set(partitioned):
+            # One region holds everything this user can see; replicated tables are whole everywhere
+            with self._lock:
+                self.single += 1
+            return ShardRoute('single', targets[:1])
+        plan = plan_merge(secured_sql) if _colocated(sql_query, partitioned) else None
+        with self._lock:
+            if plan is None:
+                self.unsplit += 1
+            else:
+                self.scattered += 1
+        return ShardRoute('scatter', targets, plan) if plan is not None else None
+
+    def execute(self, route: ShardRoute, sql_query: str, params: Sequence[Any] = (),
+                row_cap: Optional[int] = None) -> Tuple[QueryResult, bool]:
+        """Run a routed query; returns (result, truncated by row_cap)"""
+        if route.mode == 'single':
+            executor = self.executors[route.regions[0]]
+            if not row_cap:
+                return executor.execute(sql_query, params), False
+            result = executor.execute(sql_query, params, max_rows=row_cap + 1)
+            truncated = len(result.rows) > row_cap
+            result.rows = result.rows[:row_cap]
+            return result, truncated
+
+        plan = route.plan
+        partial_sql = plan.partial_sql
+        if row_cap and not plan.aggregate and plan.limit is None:
+            partial_sql += f' LIMIT {row_cap + 1}'     # no shard needs to return more than the cap
+        start = time.perf_counter()
+        with span('scatter'):
+            futures = [self._pool.submit(self.executors[region].execute, partial_sql, params)
+                       for region in route.regions]
+            partials = [future.result() for future in futures]
+        with span('merge'):
+            width = len(partials[0].columns)
+            final_sql = plan.final_for(width)
+            if row_cap:
+                final_sql = f"SELECT * FROM ({final_sql}) LIMIT {row_cap + 1}"
+            conn = sqlite3.connect(':memory:')
+            try:
+                conn.execute('CREATE TABLE partials (' + ', '.join(f'"c{i}"' for i in range(width)) + ')')
+                insert = f'INSERT INTO partials VALUES ({", ".join("?" * width)})'
+                for partial in partials:
+                    conn.executemany(insert, partial.rows)
+                rows = conn.execute(final_sql).fetchall()
+            finally:
+                conn.close()
+        truncated = bool(row_cap) and len(rows) > row_cap
+        rows = rows[:row_cap] if row_cap else rows
+        columns = plan.columns or partials[0].columns[:width - len(plan.sort_keys)]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return QueryResult(list(columns), rows, elapsed_ms, partials[0].typer), truncated
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'shards': len(self.executors), 'single': self.single, 'scattered': self.scattered,
+                    'main_database': self.unsplit}
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.close()
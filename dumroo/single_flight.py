@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+In-flight request coalescing for the Dumroo NL2SQL system
+Concurrent callers with the same key share one execution of the work: the
+first runs it, the rest wait for its result (or exception). Threads and
+asyncio tasks share the same table, so a sync caller can wait on an async
+leader and vice versa. Keys are dropped once the call finishes; caching the
+result beyond that is the caller's job.
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# Set to 0 to run every call independently
+SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', '1') == '1'
+
+
+class SingleFlight:
+    """Key -> in-flight call; do()/ado() return (result, shared)"""
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = SINGLE_FLIGHT if enabled is None else enabled
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """(future for key, whether this caller leads the call)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            future.set_running_or_notify_cancel()   # followers cannot cancel the leader's call
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once for every concurrent caller with this key"""
+        if not self.enabled:
+            return fn(), False
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async counterpart of do(); a cancelled follower leaves the shared call running"""
+        if not self.enabled:
+            return await fn(), False
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
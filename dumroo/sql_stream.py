@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Streaming SQL extraction for the Dumroo NL2SQL system
+Consumes LLM output chunk by chunk, skips any preamble ("SQLQuery:", prose,
+a ``` fence), and reports the statement as soon as it is complete (a top-level
+semicolon, the closing fence, or the start of an explanation), so the caller
+can stop generation and start executing while the model is still talking.
+"""
+
+import re
+from typing import Optional
+
+_PREFIX = 'SQLQuery:'
+_FENCE = '```'
+_SQL_START_RE = re.compile(r'(?im)^[ \t]*(?:SELECT|WITH)\b')
+# Lines that end the statement even without a semicolon or blank line
+_TRAILER_RE = re.compile(r'(?i)^[ \t]*(?:SQLResult|Answer|Explanation|Note|Notes)\s*:')
+# First words that continue a statement after a blank line
+_CONTINUATION_WORDS = {
+    'SELECT', 'FROM', 'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'ON', 'AND', 'OR', 'NOT',
+    'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'UNION', 'EXCEPT', 'INTERSECT', 'WITH', 'AS', 'CASE',
+    'WHEN', 'THEN', 'ELSE', 'END', 'IN', 'EXISTS', 'BETWEEN', 'LIKE', 'IS', 'NULL', 'DISTINCT', 'ALL',
+}
+_WORD_RE = re.compile(r'[ \t]*([A-Za-z_]+|[^\sA-Za-z_])')
+# First token of a line after a blank line, past any opening parentheses; an
+# identifier continues the clause when a qualifier or comparison follows it
+_CONTINUATION_RE = re.compile(r'[ \t]*(?:[),]|[(\s]*(?:([A-Za-z_][A-Za-z_0-9]*)[ \t]*([.=<>!]?))?)')
+
+
+class SqlStreamExtractor:
+    """Incremental extractor for the first SQL statement in a model response"""
+
+    def __init__(self):
+        self.text = ''
+        self.sql: Optional[str] = None     # set once the statement is complete
+        self._start: Optional[int] = None  # offset of the statement in self.text
+        self._pos = 0                      # next offset to scan
+        self._state = 'code'               # code, string, ident, line_comment, block_comment
+        self._blank_line: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.sql is not None
+
+    @property
+    def partial_sql(self) -> str:
+        """The statement so far (for progressive display)"""
+        if self.sql is not None:
+            return self.sql
+        if self._start is None:
+            return ''
+        return self.text[self._start:self._pos].strip()
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Add a chunk; returns the statement once it is complete, else None"""
+        if self.sql is not None:
+            return self.sql
+        self.text += chunk or ''
+        if self._start is None:
+            self._find_start(final=False)
+        if self._start is not None:
+            self._scan(final=False)
+        return self.sql
+
+    def finish(self) -> Optional[str]:
+        """End of stream: the statement as far as it got, or None if no SQL was seen"""
+        if self.sql is None:
+            if self._start is None:
+                self._find_start(final=True)
+            if self._start is not None:
+                self._scan(final=True)
+                if self.sql is None:
+                    self._complete(len(self.text))
+        return self.sql or None
+
+    def _find_start(self, final: bool):
+        text = self.text
+        candidates = []
+        prefix = text.find(_PREFIX)
+        if prefix >= 0:
+            candidates.append(prefix + len(_PREFIX))
+        fence = text.find(_FENCE)
+        if fence >= 0:
+            newline = text.find('\n', fence)
+            if newline >= 0:
+                candidates.append(newline + 1)
+            elif not final:
+                return      # the fence's language tag may still be arriving
+        keyword = _SQL_START_RE.search(text)
+        if keyword and not candidates:
+            candidates.append(keyword.start())
+        if not candidates:
+            return
+        start = min(candidates)
+        # "SQLQuery: ```sql" - the statement starts after the fence line
+        rest = text[start:].lstrip()
+        if rest.startswith('`'):
+            newline = text.find('\n', start)
+            if newline < 0:
+                if not final:
+                    return
+                newline = len(text)
+            start = newline + 1
+        while start < len(text) and text[start] in ' \t\r\n':
+            start += 1
+        if not final and start >= len(text):
+            return
+        self._start = self._pos = start
+
+    def _scan(self, final: bool):
+        """Advance over self.text from _pos; stops early when lookahead is not available yet"""
+        text = self.text
+        n = len(text)
+        i = self._pos
+        while i < n:
+            ch = text[i]
+            nxt = text[i + 1] if i + 1 < n else None
+            state = self._state
+            if state == 'string' or state == 'ident':
+                quote = "'" if state == 'string' else '"'
+                if ch == quote:
+                    if nxt is None and not final:
+                        break   # could be a doubled quote
+                    if nxt == quote:
+                        i += 2
+                        continue
+                    self._state = 'code'
+                i += 1
+                continue
+            if state == 'line_comment':
+                if ch == '\n':
+                    self._state = 'code'
+                    continue    # let code state see the newline
+                i += 1
+                continue
+            if state == 'block_comment':
+                if ch == '*':
+                    if nxt is None and not final:
+                        break
+                    if nxt == '/':
+                        self._state = 'code'
+                        i += 2
+                        continue
+                i += 1
+                continue
+
+            # code
+            if ch == ';':
+                self._complete(i)
+                return
+            if ch == '`':
+                if n - i < 3 and not final:
+                    break
+                if text.startswith(_FENCE, i):
+                    self._complete(i)
+                    return
+            elif ch == "'":
+                self._state = 'string'
+            elif ch == '"':
+                self._state = 'ident'
+            elif ch in '-/':
+                if nxt is None and not final:
+                    break
+                if ch == '-' and nxt == '-':
+                    self._state = 'line_comment'
+                elif ch == '/' and nxt == '*':
+                    self._state = 'block_comment'
+                    i += 2
+                    continue
+            elif ch == '\n':
+                stop = self._line_ends_statement(i, final)
+                if stop is None:
+                    break       # next line's first word is still arriving
+                if stop:
+                    self._complete(self._blank_line if self._blank_line is not None else i)
+                    return
+            i += 1
+        self._pos = i
+
+    def _line_ends_statement(self, newline: int, final: bool) -> Optional[bool]:
+        """Whether the line after this newline is no longer SQL; None if undecidable yet"""
+        text = self.text
+        line_end = text.find('\n', newline + 1)
+        line = text[newline + 1:] if line_end < 0 else text[newline + 1:line_end]
+        line_complete = line_end >= 0 or final
+        if not line.strip():
+            if not line_complete:
+                return None
+            if self._blank_line is None:
+                self._blank_line = newline
+            return False
+        if _TRAILER_RE.match(line):
+            return True
+        match = _WORD_RE.match(line)
+        if not line_complete and match.end() == len(line):
+            return None     # first word may be cut off
+        if self._blank_line is None:
+            return False
+        match = _CONTINUATION_RE.match(line)
+        if not line_complete and match.end() == len(line):
+            return None     # the token or what follows it is still arriving
+        word, follower = match.group(1), match.group(2)
+        if match.group(0).strip() in (')', ',') or (
+                word and (word.upper() in _CONTINUATION_WORDS or follower)):
+            self._blank_line = None
+            return False
+        return True         # prose after a blank line
+
+    def _complete(self, end: int):
+        sql = self.text[self._start:end].strip()
+        if sql.endswith(_FENCE):
+            sql = sql[:-len(_FENCE)].rstrip()
+        self.sql = sql
+        self._pos = end
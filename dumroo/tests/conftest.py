@@ -0,0 +1,37 @@
+"""Shared fixtures: modules are imported flat from the project directory"""
+
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+DB_PATH = os.path.join(PROJECT_DIR, 'dumroo_education.db')
+ADMIN_USERS_PATH = os.path.join(PROJECT_DIR, 'data', 'admin_users.csv')
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    from schema_catalog import SchemaCatalog
+    return SchemaCatalog(DB_PATH)
+
+
+@pytest.fixture(scope='session')
+def registry():
+    from permissions import PermissionRegistry
+    return PermissionRegistry(ADMIN_USERS_PATH)
+
+
+@pytest.fixture
+def system(monkeypatch, tmp_path):
+    """A fresh app instance on the bundled database, with caches under tmp_path and no LLM"""
+    monkeypatch.chdir(PROJECT_DIR)
+    monkeypatch.setenv('GEMINI_API_KEY', '')
+    monkeypatch.setenv('NL2SQL_CACHE_PATH', str(tmp_path / 'nl2sql_cache.db'))
+    monkeypatch.setenv('MODEL_SELECTION_CACHE_PATH', str(tmp_path / 'model_selection.json'))
+    from dumroo_advanced_app import AdvancedDumrooNL2SQL
+    system = AdvancedDumrooNL2SQL(DB_PATH)
+    yield system
+    system.executor.close()
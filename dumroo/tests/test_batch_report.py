@@ -0,0 +1,42 @@
+"""Batch reports: run on the given database and users, through the app's guarded execution"""
+
+import json
+
+import pandas as pd
+
+import batch_report
+import query_guard
+from conftest import ADMIN_USERS_PATH, DB_PATH
+
+QUESTIONS = ["Show performance summary by grade", "Which students have attendance below 80%?"]
+USERS = ['super_admin', 'priya_sharma']
+
+
+def manifest(summary):
+    with open(summary['manifest'], encoding='utf-8') as handle:
+        return {(r['user'], r['question_id']): r for r in map(json.loads, handle)}
+
+
+def test_batch_uses_its_own_database_and_matches_the_app(system, monkeypatch, tmp_path):
+    expected = {user: [system.query_natural_language(q, user)['result'] for q in QUESTIONS] for user in USERS}
+    # Relative default paths would not resolve from here; only --db/--admin-users can
+    monkeypatch.chdir(tmp_path)
+    summary = batch_report.run_batch(QUESTIONS, USERS, str(tmp_path / 'reports'), DB_PATH, ADMIN_USERS_PATH,
+                                     workers=2)
+    assert summary['failed'] == 0
+    records = manifest(summary)
+    for user in USERS:
+        for question_id, frame in enumerate(expected[user], start=1):
+            record = records[(user, question_id)]
+            written = pd.read_csv(record['file'])
+            assert record['rows'] == len(frame) == len(written)
+            assert list(written.columns) == list(frame.columns)
+
+
+def test_batch_results_are_row_capped(system, monkeypatch, tmp_path):
+    monkeypatch.setattr(query_guard, 'QUERY_ROW_CAP', 5)
+    monkeypatch.chdir(tmp_path)
+    summary = batch_report.run_batch(QUESTIONS[1:], ['super_admin'], str(tmp_path / 'reports'), DB_PATH,
+                                     ADMIN_USERS_PATH, workers=1)
+    record = manifest(summary)[('super_admin', 1)]
+    assert record['rows'] == 5 and record['truncated'] is True
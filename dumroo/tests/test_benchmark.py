@@ -0,0 +1,37 @@
+"""Benchmark harness: each path runs against the models it names and nothing else"""
+
+import pytest
+
+import benchmark
+import dumroo_advanced_app
+from conftest import PROJECT_DIR
+
+
+@pytest.fixture
+def langchain_configured(monkeypatch, tmp_path):
+    """LangChain 'installed' with an API key; building the real models is recorded instead"""
+    built = []
+    monkeypatch.chdir(PROJECT_DIR)
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.setenv('NL2SQL_CACHE_PATH', str(tmp_path / 'nl2sql_cache.db'))
+    monkeypatch.setenv('MODEL_SELECTION_CACHE_PATH', str(tmp_path / 'model_selection.json'))
+    monkeypatch.setattr(dumroo_advanced_app, 'LANGCHAIN_AVAILABLE', True)
+    monkeypatch.setattr(dumroo_advanced_app.AdvancedDumrooNL2SQL, 'setup_langchain',
+                        lambda self: built.append(self))
+    return built
+
+
+def test_basic_path_never_builds_real_models(langchain_configured, tmp_path):
+    system = benchmark.build_system('basic', None, str(tmp_path), use_intents=True, streaming=False)
+    # A question the intent engine leaves to the LLM
+    system.query_natural_language("Why did grade 7 results decline compared to grade 8?", "super_admin")
+    assert langchain_configured == []
+    assert not hasattr(system, 'llm')
+
+
+def test_langchain_path_uses_the_fake_model(langchain_configured, tmp_path):
+    fake_model = benchmark.FakeChatModel(benchmark.CORPUS, latency_ms=0, jitter_ms=0)
+    system = benchmark.build_system('langchain', fake_model, str(tmp_path), use_intents=False, streaming=False)
+    system.query_natural_language(next(iter(benchmark.CORPUS)), "super_admin")
+    assert langchain_configured == []
+    assert fake_model.calls == 1
@@ -0,0 +1,12 @@
+"""Typed columns: categoricals keep the order the rows arrived in"""
+
+from columnar import ColumnTyper
+
+
+def test_category_order_is_first_seen():
+    values = ['Grade 6', 'Grade 7', 'Grade 10', None, 'Grade 6', 'Grade 10']
+    series = ColumnTyper().to_series('grade', values)
+    assert list(series.cat.categories) == ['Grade 6', 'Grade 7', 'Grade 10']
+    assert not series.cat.ordered
+    assert series.isna().sum() == 1
+    assert list(series.value_counts(sort=False).index) == ['Grade 6', 'Grade 7', 'Grade 10']
@@ -0,0 +1,80 @@
+"""CSV ingestion: full reloads swap whole tables in, upserts write only what changed"""
+
+import csv
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import ingest
+from conftest import PROJECT_DIR
+
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+
+
+def csv_rows(table: str) -> int:
+    with open(os.path.join(DATA_DIR, f'{table}.csv'), newline='', encoding='utf-8') as handle:
+        return sum(1 for row in csv.reader(handle) if row) - 1
+
+
+@pytest.fixture(scope='module')
+def loaded(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('ingest') / 'dumroo.db')
+    stats = ingest.ingest(db_path, DATA_DIR)
+    return db_path, {result['table']: result for result in stats}
+
+
+def test_full_load_reads_and_writes_every_row(loaded):
+    db_path, stats = loaded
+    conn = sqlite3.connect(db_path)
+    try:
+        for table in ingest.LOAD_ORDER:
+            expected = csv_rows(table)
+            assert stats[table]['rows_read'] == stats[table]['rows_written'] == expected
+            assert conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] == expected
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    finally:
+        conn.close()
+    assert set(ingest.INDEXES) <= names
+    assert not any(name.endswith('__loading') for name in names)
+
+
+def test_upsert_counts_only_changed_rows(loaded, tmp_path):
+    db_path, _ = loaded
+    db_copy = str(tmp_path / 'upsert.db')
+    shutil.copy(db_path, db_copy)
+    data_dir = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, data_dir)
+    students = data_dir / 'students.csv'
+    with open(students, newline='', encoding='utf-8') as handle:
+        rows = list(csv.reader(handle))
+    column = rows[0].index('attendance_percentage')
+    rows[1][column] = str((int(rows[1][column]) + 1) % 100)
+    with open(students, 'w', newline='', encoding='utf-8') as handle:
+        csv.writer(handle).writerows(rows)
+
+    stats = {result['table']: result for result in ingest.ingest(db_copy, str(data_dir), mode='upsert')}
+    # The rollup triggers' own writes are not counted
+    assert stats['students']['rows_written'] == 1
+    assert all(stats[table]['rows_written'] == 0 for table in ingest.LOAD_ORDER if table != 'students')
+
+
+def test_full_reload_leaves_the_live_table_alone_until_swapped(loaded, tmp_path):
+    db_path, _ = loaded
+    db_copy = str(tmp_path / 'reload.db')
+    shutil.copy(db_path, db_copy)
+    conn = ingest.connect_for_write(db_copy)
+    reader = sqlite3.connect(db_copy)
+    try:
+        conn.execute('DELETE FROM "quizzes" WHERE quiz_id > (SELECT MIN(quiz_id) FROM "quizzes")')
+        csv_path = os.path.join(DATA_DIR, 'quizzes.csv')
+        ingest.load_table(conn, 'quizzes', csv_path, batch_size=10, swap=False)
+        assert reader.execute('SELECT COUNT(*) FROM "quizzes"').fetchone()[0] == 1
+        ingest.swap_in_tables(conn, ['quizzes'])
+        assert reader.execute('SELECT COUNT(*) FROM "quizzes"').fetchone()[0] == csv_rows('quizzes')
+        indexes = {row[1] for row in reader.execute("PRAGMA index_list('quizzes')")}
+        assert 'idx_quizzes_grade_section' in indexes
+    finally:
+        reader.close()
+        conn.close()
@@ -0,0 +1,78 @@
+"""Intent engine: local matches answer the question that was asked, or fall below the threshold"""
+
+import sqlite3
+
+import pytest
+
+from conftest import DB_PATH
+from intent_engine import INTENT_CONFIDENCE_THRESHOLD, IntentEngine
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return IntentEngine()
+
+
+def run(match):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.execute(match.sql, match.params)
+        return [column[0] for column in cursor.description], cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def test_which_subjects_lowest_groups_by_subject_ascending(engine):
+    match = engine.match("Which subjects have the lowest average performance?")
+    assert match.intent == 'performance'
+    assert match.slots['group_by'] == ['subject']
+    columns, rows = run(match)
+    assert columns[0] == 'subject'
+    assert 'grade' not in columns
+    averages = [row[columns.index('avg_percentage')] for row in rows]
+    assert len({row[0] for row in rows}) == len(rows)
+    assert averages == sorted(averages)
+
+
+def test_top_n_dimension_orders_descending_and_limits(engine):
+    match = engine.match("Top 3 subjects by average score")
+    assert match.confidence >= INTENT_CONFIDENCE_THRESHOLD
+    columns, rows = run(match)
+    averages = [row[columns.index('avg_percentage')] for row in rows]
+    assert len(rows) == 3
+    assert averages == sorted(averages, reverse=True)
+
+
+def test_summary_by_grade_keeps_grade_order(engine):
+    match = engine.match("Show performance summary by grade")
+    assert match.slots['group_by'] == ['grade']
+    assert match.sql.endswith("ORDER BY s.grade")
+
+
+def test_grade_filter_is_not_a_dimension(engine):
+    match = engine.match("Which grade 7 students have the lowest performance?")
+    assert 'group_by' not in match.slots
+    assert match.params[0] == 'Grade 7'
+
+
+@pytest.mark.parametrize('question', [
+    "What percentage of homework was submitted late?",
+    "What is the submission rate by grade?",
+    "List students with no homework pending",
+    "List all homework assignments due this week",
+    "Show homework submitted on time",
+    "Show grade 10 students",
+])
+def test_not_confident(engine, question):
+    assert engine.match(question).confidence < INTENT_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize('question', [
+    "Which students haven't submitted their homework?",
+    "How many students haven't submitted homework?",
+    "Students with attendance no more than 75%",
+    "Show students who submitted homework after the due date",
+    "Which students have missing homework due this week?",
+])
+def test_negation_and_due_dates_the_template_carries_stay_confident(engine, question):
+    assert engine.match(question).confidence >= INTENT_CONFIDENCE_THRESHOLD
@@ -0,0 +1,131 @@
+"""Model router: slow primaries are hedged, failures fail over, and broken models are skipped"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import model_router
+from model_router import OPEN, CLOSED, ModelRouter, NoModelAvailable
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(model_router, 'HEDGE_DEFAULT_DELAY_MS', 50)
+    monkeypatch.setattr(model_router, 'LLM_TIMEOUT_MS', 2000)
+    monkeypatch.setattr(model_router, 'BREAKER_FAILURES', 2)
+    monkeypatch.setattr(model_router, 'BREAKER_COOLDOWN_S', 30)
+
+
+def behaviours(**by_model):
+    """run() for ModelRouter.call: 'ok', 'fail' or seconds to sleep (until cancelled) before answering"""
+    cancelled_models = []
+
+    def run(name, chain, cancelled, emit):
+        behaviour = by_model[name]
+        if behaviour == 'fail':
+            raise RuntimeError(f"{name} is down")
+        if behaviour != 'ok':
+            emit(f"{name} thinking")
+            if cancelled.wait(behaviour):
+                cancelled_models.append(name)
+                return None
+        return f"SELECT '{name}'"
+
+    run.cancelled = cancelled_models
+    return run
+
+
+def router(hedging=True):
+    return ModelRouter([('primary', None), ('backup', None)], hedging=hedging)
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    r = router()
+    run = behaviours(primary=1.0, backup='ok')
+    result, name = r.call(run)
+    assert (result, name) == ("SELECT 'backup'", 'backup')
+    assert (r.hedges, r.hedge_wins) == (1, 1)
+    time.sleep(0.05)
+    assert run.cancelled == ['primary']
+    # A cancelled call is neither a success nor a failure for the primary
+    assert len(r.health['primary'].calls) == 0
+
+
+def test_fast_primary_is_not_hedged():
+    r = router()
+    assert r.call(behaviours(primary='ok', backup='ok')) == ("SELECT 'primary'", 'primary')
+    assert r.hedges == 0
+
+
+def test_failure_fails_over_without_waiting_for_the_hedge(monkeypatch):
+    monkeypatch.setattr(model_router, 'HEDGE_DEFAULT_DELAY_MS', 10000)
+    r = router()
+    start = time.monotonic()
+    assert r.call(behaviours(primary='fail', backup='ok'))[1] == 'backup'
+    assert time.monotonic() - start < 1
+    assert r.hedges == 0
+
+
+def test_only_the_leader_streams_progress():
+    r = router()
+    seen = []
+    r.call(behaviours(primary=0.3, backup=0.6), on_progress=seen.append)
+    assert seen == ['primary thinking']
+
+
+def test_breaker_opens_then_lets_one_trial_through(monkeypatch):
+    r = router()
+    for _ in range(2):
+        r.call(behaviours(primary='fail', backup='ok'))
+    assert r.health['primary'].state == OPEN
+    calls = []
+
+    def run(name, chain, cancelled, emit):
+        calls.append(name)
+        return name
+
+    assert r.call(run) == ('backup', 'backup')
+    assert calls == ['backup']
+
+    monkeypatch.setattr(model_router, 'BREAKER_COOLDOWN_S', 0)
+    assert r.call(run) == ('primary', 'primary')
+    assert r.health['primary'].state == CLOSED
+    assert r.stats()['models']['primary']['trips'] == 1
+
+
+def test_every_breaker_open_raises():
+    r = ModelRouter([('only', None)])
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            r.call(behaviours(only='fail'))
+    with pytest.raises(NoModelAvailable):
+        r.call(behaviours(only='ok'))
+
+
+def test_hung_call_times_out(monkeypatch):
+    monkeypatch.setattr(model_router, 'LLM_TIMEOUT_MS', 100)
+    r = ModelRouter([('only', None)])
+    run = behaviours(only=5.0)
+    with pytest.raises(TimeoutError):
+        r.call(run)
+    assert r.health['only'].calls[-1][0] is False
+
+
+def test_async_hedge_cancels_the_loser():
+    r = router()
+    cancelled = threading.Event()
+
+    async def arun(name, chain):
+        if name == 'primary':
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return name
+
+    assert asyncio.run(r.acall(arun)) == ('backup', 'backup')
+    assert cancelled.is_set()
+    assert (r.hedges, r.hedge_wins) == (1, 1)
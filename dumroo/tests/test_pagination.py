@@ -0,0 +1,83 @@
+"""Result handles: every paging mode walks the same rows the full query returns"""
+
+import csv
+import io
+
+import pytest
+
+from conftest import DB_PATH
+from db_engine import QueryExecutor
+from pagination import ResultHandle, detect_keyset_column
+
+STUDENTS = "SELECT student_id, student_name, grade FROM students WHERE grade != ?"
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = QueryExecutor(DB_PATH, pool_size=2)
+    yield executor
+    executor.close()
+
+
+def all_pages(handle):
+    rows, page = [], 0
+    while True:
+        frame = handle.page(page)
+        rows.extend(frame.itertuples(index=False, name=None))
+        if len(frame) < handle.page_size:
+            return rows
+        page += 1
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT * FROM students WHERE grade = 'Grade 7'", 'student_id'),
+    ("SELECT student_id, grade FROM students", 'student_id'),
+    ("SELECT * FROM students ORDER BY student_name", None),
+    ("SELECT COUNT(*) FROM students", None),
+    ("SELECT * FROM students s JOIN performance p ON s.student_id = p.student_id", None),
+    ("SELECT * FROM students, performance", None),
+    ("SELECT DISTINCT grade FROM students", None),
+])
+def test_keyset_only_for_plain_single_table_selects(catalog, sql, expected):
+    assert detect_keyset_column(sql, catalog) == expected
+
+
+@pytest.mark.parametrize('keyset_column', ['student_id', None])
+def test_pages_cover_the_full_result_once(executor, keyset_column):
+    params = ('Grade 6',)
+    expected = sorted(executor.execute(STUDENTS, params).rows)
+    handle = ResultHandle(executor, STUDENTS, params, page_size=50, keyset_column=keyset_column)
+    rows = all_pages(handle)
+    assert sorted(rows) == expected
+    assert len(set(rows)) == len(rows)
+    assert handle.total_estimate() == {'rows': len(expected), 'exact': True}
+    assert handle.page_count() == -(-len(expected) // 50)
+
+
+def test_keyset_jump_ahead_matches_sequential_pages(executor):
+    walked = ResultHandle(executor, STUDENTS, ('Grade 6',), page_size=40, keyset_column='student_id')
+    for page in range(4):
+        walked.page(page)
+    jumped = ResultHandle(executor, STUDENTS, ('Grade 6',), page_size=40, keyset_column='student_id')
+    assert jumped.page(3).equals(walked.page(3))
+    assert jumped.page(4).equals(walked.page(4))
+
+
+def test_missing_keyset_column_falls_back_to_offset(executor):
+    sql = "SELECT student_name FROM students"
+    handle = ResultHandle(executor, sql, page_size=100, keyset_column='student_id')
+    assert len(all_pages(handle)) == len(executor.execute(sql).rows)
+    assert handle.pagination_mode == 'offset'
+
+
+def test_capped_total_is_not_exact(executor):
+    handle = ResultHandle(executor, STUDENTS, ('Grade 6',), count_cap=10)
+    assert handle.total_estimate() == {'rows': 10, 'exact': False}
+
+
+def test_csv_export_streams_every_row(executor):
+    handle = ResultHandle(executor, STUDENTS, ('Grade 6',), page_size=10)
+    text = ''.join(handle.iter_csv_chunks(chunk_rows=30))
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == ['student_id', 'student_name', 'grade']
+    assert len(rows) - 1 == len(executor.execute(STUDENTS, ('Grade 6',)).rows)
@@ -0,0 +1,72 @@
+"""Permission registry: compiled scopes match the CSV, and edits are picked up without a restart"""
+
+import os
+import shutil
+
+import pytest
+
+from conftest import ADMIN_USERS_PATH
+from permissions import PermissionRegistry
+
+NEW_USER = ("99,new_teacher,new.teacher@dumroo.edu,New Teacher,class_teacher,"
+            "\"Grade 9, Grade 10\",A,ALL,\"['read_students']\",2024-06-01\n")
+
+
+@pytest.fixture
+def csv_copy(tmp_path):
+    path = str(tmp_path / 'admin_users.csv')
+    shutil.copy(ADMIN_USERS_PATH, path)
+    return path
+
+
+def touch(path, step):
+    """Move the mtime forward so the change is seen even on coarse clocks"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + step * 1_000_000_000))
+
+
+def test_scopes_and_permissions_are_compiled(registry):
+    admin = registry.get('super_admin')
+    assert admin.is_super_admin
+    assert admin.grades is None and admin.sections is None and admin.regions is None
+    assert admin.has_permission('read_all')
+
+    coordinator = registry.get('priya_sharma')
+    assert coordinator.grades == frozenset({'Grade 6'})
+    assert coordinator.sections is None
+    assert coordinator.regions == frozenset({'North Delhi'})
+    assert coordinator.permissions == ('read_students', 'read_performance', 'write_homework', 'write_quiz')
+    assert coordinator.to_dict()['assigned_grades'] == 'Grade 6'
+    assert registry.get('nobody') is None
+    assert 'nobody' not in registry
+
+
+def test_users_are_immutable(registry):
+    with pytest.raises(AttributeError):
+        registry.get('priya_sharma').role = 'super_admin'
+
+
+def test_edited_csv_is_reloaded(csv_copy):
+    registry = PermissionRegistry(csv_copy, check_interval=0)
+    count = len(registry)
+    with open(csv_copy, 'a', encoding='utf-8') as handle:
+        handle.write(NEW_USER)
+    touch(csv_copy, 1)
+
+    user = registry.get('new_teacher')
+    assert user is not None
+    assert user.grades == frozenset({'Grade 9', 'Grade 10'})
+    assert user.sections == frozenset({'A'})
+    assert len(registry) == count + 1
+
+
+def test_broken_csv_keeps_the_last_good_snapshot(csv_copy):
+    registry = PermissionRegistry(csv_copy, check_interval=0)
+    reloads = registry.reloads
+    with open(csv_copy, 'a', encoding='utf-8') as handle:
+        handle.write("not_a_number,broken_user,,,,,,,,\n")
+    touch(csv_copy, 1)
+
+    assert registry.get('broken_user') is None
+    assert registry.get('priya_sharma') is not None
+    assert registry.reloads == reloads
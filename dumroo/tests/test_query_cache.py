@@ -0,0 +1,62 @@
+"""Question -> SQL cache: what is stored, for how long, and when it is dropped"""
+
+from query_cache import NLQueryCache, normalize_question
+
+
+class FixedChain:
+    """Stands in for the LLM chain: always the same SQL"""
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+
+    def invoke(self, generation_input):
+        self.calls += 1
+        return f"SQLQuery: {self.sql};"
+
+
+def test_normalized_phrasings_share_an_entry(tmp_path):
+    cache = NLQueryCache(str(tmp_path / 'cache.db'))
+    cache.put("Show grade 7 students?", 'fp', "SELECT 1")
+    assert normalize_question("  show   GRADE 7 students ") == normalize_question("Show grade 7 students?")
+    assert cache.get("show grade 7 students", 'fp') == "SELECT 1"
+    assert cache.get("show grade 7 students", 'other') is None
+
+
+def test_explicit_zero_limits_are_not_replaced_by_defaults(tmp_path):
+    cache = NLQueryCache(str(tmp_path / 'cache.db'), max_entries=0, ttl_seconds=0)
+    assert (cache.max_entries, cache.ttl_seconds) == (0, 0)
+    cache.put("q", 'fp', "SELECT 1")
+    assert cache.get("q", 'fp') is None
+
+
+def test_lru_eviction_beyond_max_entries(tmp_path):
+    cache = NLQueryCache(str(tmp_path / 'cache.db'), max_entries=2)
+    cache.put("a", 'fp', "SELECT 'a'")
+    cache.put("b", 'fp', "SELECT 'b'")
+    cache.get("a", 'fp')
+    cache.put("c", 'fp', "SELECT 'c'")
+    assert cache.get("b", 'fp') is None
+    assert cache.get("a", 'fp') == "SELECT 'a'"
+    assert cache.stats()['entries'] == 2
+
+
+def test_sql_that_fails_to_run_is_not_served_again(system):
+    chain = FixedChain("SELECT no_such_column FROM students")
+    system.attach_query_chain(chain)
+    question = "Why are there no such columns?"
+    first = system.query_natural_language(question, "super_admin")
+    assert first["success"] is False
+    assert str(first["raw_result"]).startswith("Error:")
+    assert system.query_cache.get(question, system.get_schema_fingerprint()) is None
+    system.query_natural_language(question, "super_admin")
+    assert chain.calls == 2
+
+
+def test_sql_that_runs_is_cached(system):
+    chain = FixedChain("SELECT COUNT(*) FROM students")
+    system.attach_query_chain(chain)
+    question = "Why is the student count what it is?"
+    assert system.query_natural_language(question, "super_admin")["success"] is True
+    assert system.query_natural_language(question, "super_admin")["cache_hit"] is True
+    assert chain.calls == 1
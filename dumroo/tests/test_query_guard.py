@@ -0,0 +1,73 @@
+"""Cost guard: plans over budget are rejected, the rest run with a row cap that keeps their columns"""
+
+import pytest
+
+from conftest import DB_PATH
+from db_engine import QueryExecutor, QueryTimeout
+from query_guard import QueryGuard, QueryRejected
+
+JOINED = ("SELECT s.student_id, p.student_id, p.percentage FROM students s "
+          "JOIN performance p ON s.student_id = p.student_id ORDER BY p.performance_id")
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = QueryExecutor(DB_PATH, pool_size=2)
+    yield executor
+    executor.close()
+
+
+def guard_for(executor, catalog, **settings):
+    return QueryGuard(executor, catalog, **settings)
+
+
+def test_row_cap_keeps_duplicate_column_names(executor, catalog):
+    guard = guard_for(executor, catalog, row_cap=5)
+    decision = guard.check(JOINED)
+    assert decision.action == 'rewrite' and decision.row_cap == 5
+    result = guard.execute(decision, JOINED)
+    assert result.columns == ['student_id', 'student_id', 'percentage']
+    assert len(result.rows) == 5 and decision.truncated
+    assert result.rows == executor.execute(JOINED).rows[:5]
+
+
+def test_statement_with_its_own_limit_and_semicolon(executor, catalog):
+    guard = guard_for(executor, catalog, row_cap=5)
+    decision = guard.check("SELECT student_id FROM students LIMIT 3;")
+    assert len(guard.execute(decision, "SELECT student_id FROM students LIMIT 3;").rows) == 3
+    assert not decision.truncated
+
+
+def test_paged_queries_have_no_row_cap(executor, catalog):
+    decision = guard_for(executor, catalog, row_cap=5).check(JOINED, paged=True)
+    assert decision.action == 'allow' and decision.row_cap is None
+
+
+def test_nested_full_scan_of_a_large_table_is_rejected(executor, catalog):
+    guard = guard_for(executor, catalog, large_table_rows=1000)
+    sql = "SELECT COUNT(*) FROM submissions a, submissions b WHERE a.marks_obtained > b.marks_obtained"
+    decision = guard.check(sql)
+    assert decision.rejected
+    assert any('nested full scan of submissions' in reason for reason in decision.reasons)
+    with pytest.raises(QueryRejected):
+        guard.execute(decision, sql)
+
+
+def test_plan_over_budget_is_rejected(executor, catalog):
+    guard = guard_for(executor, catalog, max_cost=100)
+    assert guard.check("SELECT * FROM performance").rejected
+    assert not guard_for(executor, catalog).check("SELECT * FROM performance").rejected
+
+
+def test_unplannable_sql_is_rejected(executor, catalog):
+    assert guard_for(executor, catalog).check("SELECT * FROM no_such_table").rejected
+
+
+def test_time_budget_interrupts_the_query():
+    executor = QueryExecutor(DB_PATH, pool_size=1, timeout_ms=50)
+    try:
+        with pytest.raises(QueryTimeout):
+            executor.execute("WITH RECURSIVE c(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM c) "
+                             "SELECT MAX(n) FROM c")
+    finally:
+        executor.close()
@@ -0,0 +1,74 @@
+"""Quick Queries: prefetched per user under their scope, and recomputed once the database changes"""
+
+import datetime as dt
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import quick_queries
+from conftest import DB_PATH, PROJECT_DIR
+from quick_queries import QUICK_QUERIES, QuickQueries, QuickQuery, validate_quick_queries
+
+
+@pytest.fixture
+def quick(monkeypatch, tmp_path):
+    """QuickQueries over an app on a private copy of the database"""
+    monkeypatch.chdir(PROJECT_DIR)
+    monkeypatch.setenv('GEMINI_API_KEY', '')
+    monkeypatch.setenv('NL2SQL_CACHE_PATH', str(tmp_path / 'nl2sql_cache.db'))
+    monkeypatch.setenv('MODEL_SELECTION_CACHE_PATH', str(tmp_path / 'model_selection.json'))
+    monkeypatch.setattr(quick_queries, 'QUICK_QUERY_PREFETCH', True)
+    db_path = str(tmp_path / 'quick.db')
+    shutil.copy(DB_PATH, db_path)
+    from dumroo_advanced_app import AdvancedDumrooNL2SQL
+    system = AdvancedDumrooNL2SQL(db_path)
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield QuickQueries(system, pool)
+    pool.shutdown(wait=True)
+    system.executor.close()
+
+
+def test_date_parameters():
+    wednesday = dt.date(2025, 8, 13)
+    assert quick_queries._next_week(wednesday) == ('2025-08-18', '2025-08-24')
+    assert quick_queries._next_week(dt.date(2025, 8, 18)) == ('2025-08-25', '2025-08-31')
+    assert quick_queries._this_month(dt.date(2024, 2, 10)) == ('2024-02-01', '2024-02-29')
+
+
+def test_broken_queries_are_dropped_at_startup(system):
+    broken = [
+        QuickQuery('bad_column', "Bad", "?", "SELECT no_such_column FROM students"),
+        QuickQuery('bad_params', "Bad", "?", "SELECT * FROM students WHERE grade = ?"),
+    ]
+    valid = validate_quick_queries(system.executor, list(QUICK_QUERIES) + broken)
+    assert [query.key for query in valid] == [query.key for query in QUICK_QUERIES]
+
+
+def test_prefetched_results_are_scoped_and_reused(quick):
+    for future in quick.prefetch('priya_sharma'):
+        future.result()
+    assert all(quick.ready(key, 'priya_sharma') for key in quick.queries)
+    assert not quick.ready('attendance', 'super_admin')
+
+    result = quick.get('attendance', 'priya_sharma')
+    assert set(result['result']['grade']) == {'Grade 6'}
+    assert (quick.hits, quick.misses) == (1, 0)
+    everyone = quick.get('attendance', 'super_admin')
+    assert len(everyone['result']) > len(result['result'])
+
+
+def test_write_makes_results_stale(quick):
+    before = quick.get('attendance', 'super_admin')['result']
+    conn = sqlite3.connect(quick.system.db_path)
+    conn.execute("UPDATE students SET attendance_percentage = 1 "
+                 "WHERE student_id = (SELECT MAX(student_id) FROM students WHERE attendance_percentage >= 80)")
+    conn.commit()
+    conn.close()
+
+    assert not quick.ready('attendance', 'super_admin')
+    after = quick.get('attendance', 'super_admin')['result']
+    assert len(after) == len(before) + 1
+    assert after['attendance_percentage'].iloc[0] == 1
+    assert quick.misses == 2
@@ -0,0 +1,100 @@
+"""RBAC scoping: every FROM item is scoped for restricted users, or the query is rejected"""
+
+import sqlite3
+
+import pytest
+
+from conftest import DB_PATH
+from rbac import RBACEngine, ScopeError
+
+USER = 'priya_sharma'
+
+
+@pytest.fixture(scope='module')
+def engine(catalog, registry):
+    return RBACEngine(catalog, lambda username: registry.get(username).to_dict() if registry.get(username) else None)
+
+
+@pytest.fixture(scope='module')
+def conn():
+    conn = sqlite3.connect(DB_PATH)
+    yield conn
+    conn.close()
+
+
+def run(engine, conn, sql):
+    secured = engine.secure(sql, USER)
+    return conn.execute(secured.sql, secured.params).fetchall()
+
+
+def test_plain_table_is_scoped(engine, conn):
+    total = conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    scoped = len(run(engine, conn, "SELECT * FROM students"))
+    assert 0 < scoped < total
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM (students)",
+    "SELECT * FROM ((students))",
+    "SELECT * FROM main.students",
+])
+def test_parenthesised_table(engine, conn, sql):
+    assert len(run(engine, conn, sql)) == len(run(engine, conn, "SELECT * FROM students"))
+
+
+def test_parenthesised_join(engine, conn):
+    expected = run(engine, conn, "SELECT s.student_name, p.percentage FROM students s "
+                                 "JOIN performance p ON s.student_id = p.student_id ORDER BY p.performance_id")
+    grouped = run(engine, conn, "SELECT s.student_name, p.percentage FROM (students s "
+                                "JOIN performance p ON s.student_id = p.student_id) ORDER BY p.performance_id")
+    assert grouped == expected
+    secured = engine.secure("SELECT * FROM students s, (performance) p WHERE s.student_id = p.student_id", USER)
+    assert set(secured.scoped_tables) == {'students', 'performance'}
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT students.student_id FROM (SELECT 1 FROM (WITH students AS (SELECT 1) "
+    "SELECT * FROM students)) x, students",
+    "WITH students(student_id, grade, region) AS (SELECT value, 'Grade 6', 'North Delhi' "
+    "FROM json_each('[1000, 1001, 1002]')) SELECT COUNT(*), COUNT(DISTINCT student_id) FROM performance",
+    "WITH Performance AS (SELECT 1) SELECT * FROM Performance",
+])
+def test_cte_named_after_a_table_is_rejected(engine, sql):
+    with pytest.raises(ScopeError):
+        engine.secure(sql, USER)
+
+
+def test_scope_filters_name_the_main_schema(engine, conn):
+    expected = run(engine, conn, "SELECT COUNT(*), COUNT(DISTINCT student_id) FROM performance")
+    secured = engine.secure("SELECT COUNT(*) FROM performance", USER)
+    assert 'main."performance"' in secured.sql and 'main."students"' in secured.sql
+    assert expected[0][0] < conn.execute("SELECT COUNT(*) FROM performance").fetchone()[0]
+
+
+def test_recursive_cte_sees_itself(engine, conn):
+    sql = ("WITH RECURSIVE c(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM c WHERE n < 5) "
+           "SELECT COUNT(*) FROM c, students s WHERE s.student_id > 0")
+    assert engine.secure(sql, USER).scoped_tables == ('students',)
+    assert run(engine, conn, sql)[0][0] == 5 * len(run(engine, conn, "SELECT * FROM students"))
+
+
+def test_cte_reference_is_not_rescoped(engine, conn):
+    secured = engine.secure("WITH a AS (SELECT 1), b AS (SELECT * FROM students) SELECT * FROM b", USER)
+    assert secured.scoped_tables == ('students',)
+    assert len(run(engine, conn, "WITH b AS (SELECT * FROM students) SELECT * FROM b")) == \
+        len(run(engine, conn, "SELECT * FROM students"))
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM 'students'",
+    "SELECT * FROM sqlite_master",
+    "SELECT * FROM temp.scratch",
+])
+def test_unclassifiable_from_items_are_rejected(engine, sql):
+    with pytest.raises(ScopeError):
+        engine.secure(sql, USER)
+
+
+def test_super_admin_is_not_rewritten(engine):
+    sql = "SELECT * FROM (students)"
+    assert engine.secure(sql, 'super_admin').sql == sql
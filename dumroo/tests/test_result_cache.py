@@ -0,0 +1,73 @@
+"""Result cache: hits only for the same query on an unchanged database, within the byte budget"""
+
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from conftest import DB_PATH
+from result_cache import CachedResult, ResultCache
+
+SQL = "SELECT student_id FROM students WHERE grade = ?"
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    shutil.copy(DB_PATH, path)
+    return path
+
+
+def frame(rows=10):
+    return pd.DataFrame({'student_id': range(rows)})
+
+
+def test_hit_needs_same_sql_and_params(db_copy):
+    cache = ResultCache(max_bytes=1 << 20)
+    key = cache.key(db_copy, SQL, ('Grade 6',))
+    assert cache.get(key) is None
+    assert cache.put(key, frame(), 'text')
+    assert cache.get(cache.key(db_copy, SQL, ('Grade 6',))).text == 'text'
+    assert cache.get(cache.key(db_copy, SQL, ('Grade 7',))) is None
+    assert cache.get(cache.key(db_copy, SQL, ('Grade 6',), row_cap=5)) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_write_invalidates_the_database(db_copy):
+    cache = ResultCache(max_bytes=1 << 20)
+    key = cache.key(db_copy, SQL, ('Grade 6',))
+    cache.put(key, frame(), 'text')
+
+    conn = sqlite3.connect(db_copy)
+    conn.execute("UPDATE students SET attendance_percentage = 50 WHERE student_id = 1000")
+    conn.commit()
+    conn.close()
+
+    assert cache.get(cache.key(db_copy, SQL, ('Grade 6',))) is None
+    assert cache.stats()['entries'] == 0 and cache.bytes == 0
+    assert cache.invalidations == 1
+    # A result computed before the write is not stored under the old version
+    assert not cache.put(key, frame(), 'stale')
+
+
+def test_lru_eviction_stays_within_budget(db_copy):
+    size = CachedResult(frame(100), 'text').nbytes
+    cache = ResultCache(max_bytes=size * 2)
+    keys = [cache.key(db_copy, SQL, (grade,)) for grade in ('Grade 6', 'Grade 7', 'Grade 8')]
+    cache.put(keys[0], frame(100), 'text')
+    cache.put(keys[1], frame(100), 'text')
+    cache.get(keys[0])
+    cache.put(keys[2], frame(100), 'text')
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.bytes <= cache.max_bytes and cache.evictions == 1
+    assert not cache.put(cache.key(db_copy, SQL, ('Grade 9',)), frame(10000), 'text')
+
+
+def test_zero_budget_disables_the_cache(db_copy):
+    cache = ResultCache(max_bytes=0)
+    assert not cache.enabled
+    assert cache.key(db_copy, SQL) is None
+    assert not cache.put(None, frame(), 'text')
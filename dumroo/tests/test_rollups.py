@@ -0,0 +1,101 @@
+"""Rollups: an incremental refresh matches a full recompute, and routed queries match the base tables"""
+
+import shutil
+
+import pytest
+
+import rollups
+from conftest import DB_PATH
+from db_engine import QueryExecutor
+from ingest import connect_for_write
+from schema_catalog import SchemaCatalog
+
+WRITES = [
+    ("INSERT INTO performance (student_id, subject, assessment_type, assessment_date, marks_obtained, "
+     "total_marks, percentage, grade_letter) VALUES (1000, 'Mathematics', 'Quiz', '2025-09-01', 90, 100, 90, 'A')"),
+    "UPDATE performance SET percentage = percentage - 5 WHERE performance_id IN (2, 3, 4)",
+    # Moves a student (and every fact row they own) to another class bucket
+    "UPDATE students SET grade = 'Grade 9', section = 'C' WHERE student_id = 1001",
+    "DELETE FROM submissions WHERE submission_id IN (1, 2)",
+    # A fact row whose student does not exist lands in the 'unknown' bucket
+    ("INSERT INTO submissions (homework_id, student_id, submitted_date, is_submitted, is_late, "
+     "marks_obtained, total_marks) VALUES (1, 999999, '2025-08-20', 1, 1, 10, 25)"),
+    "DELETE FROM students WHERE student_id = 1002",
+]
+
+ROUTABLE = [
+    "SELECT s.grade, ROUND(AVG(p.percentage), 1) AS avg_percentage, COUNT(*) AS assessments "
+    "FROM performance p JOIN students s ON p.student_id = s.student_id GROUP BY s.grade ORDER BY s.grade",
+    "SELECT subject, AVG(percentage), COUNT(*) FROM performance GROUP BY subject ORDER BY subject",
+    "SELECT s.section, SUM(sub.is_late) AS late, COUNT(sub.submission_id) AS total FROM submissions sub "
+    "JOIN students s ON sub.student_id = s.student_id GROUP BY s.section ORDER BY s.section",
+    "SELECT s.grade, ROUND(AVG(s.attendance_percentage), 1) AS avg_attendance, COUNT(*) AS students "
+    "FROM students s GROUP BY s.grade ORDER BY s.grade",
+]
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    path = str(tmp_path / 'rollups.db')
+    shutil.copy(DB_PATH, path)
+    conn = connect_for_write(path)
+    rollups.build_rollups(conn)
+    yield path, conn
+    conn.close()
+
+
+def normalize(rows):
+    return sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows)
+
+
+def recomputed(conn, spec):
+    return normalize(conn.execute(rollups._select_sql(spec)).fetchall())
+
+
+def stored(conn, spec):
+    columns = ', '.join(f'"{c}"' for c in spec.key_columns + tuple(spec.measure_columns))
+    return normalize(conn.execute(f'SELECT {columns} FROM "{spec.name}"').fetchall())
+
+
+def test_incremental_refresh_matches_full_recompute(db_copy):
+    _, conn = db_copy
+    for sql in WRITES:
+        conn.execute(sql)
+    dirty = conn.execute(f'SELECT COUNT(*) FROM "{rollups.DIRTY_TABLE}"').fetchone()[0]
+    assert dirty > 0
+
+    assert rollups.refresh_rollups(conn) > 0
+    for spec in rollups.ROLLUPS:
+        assert stored(conn, spec) == recomputed(conn, spec), spec.name
+    assert conn.execute(f'SELECT COUNT(*) FROM "{rollups.DIRTY_TABLE}"').fetchone()[0] == 0
+
+
+def test_routed_queries_match_base_tables(db_copy):
+    path, conn = db_copy
+    catalog = SchemaCatalog(path)
+    executor = QueryExecutor(path, pool_size=1)
+    try:
+        router = rollups.RollupRouter(catalog, executor, enabled=True)
+        for sql in ROUTABLE:
+            routed = router.route(sql)
+            assert routed is not None, sql
+            assert normalize(executor.execute(routed.sql).rows) == normalize(executor.execute(sql).rows)
+
+        # A pending write takes that fact's rollups out of routing until the refresh
+        conn.execute(WRITES[0])
+        assert router.route(ROUTABLE[1]) is None
+        rollups.refresh_rollups(conn)
+        routed = router.route(ROUTABLE[1])
+        assert routed is not None
+        assert normalize(executor.execute(routed.sql).rows) == normalize(executor.execute(ROUTABLE[1]).rows)
+    finally:
+        executor.close()
+        catalog.close()
+
+
+def test_non_aggregate_queries_are_not_routed(catalog):
+    available = [spec.name for spec in rollups.ROLLUPS]
+    assert rollups.plan_rollup_query("SELECT * FROM performance", catalog, available) is None
+    assert rollups.plan_rollup_query(
+        "SELECT s.student_name, AVG(p.percentage) FROM performance p "
+        "JOIN students s ON p.student_id = s.student_id GROUP BY s.student_id", catalog, available) is None
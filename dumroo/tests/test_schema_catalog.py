@@ -0,0 +1,59 @@
+"""Schema catalog: data changes leave the schema snapshot alone and only recount rows"""
+
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import DB_PATH
+from schema_catalog import SchemaCatalog
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    path = str(tmp_path / 'catalog.db')
+    shutil.copy(DB_PATH, path)
+    return path
+
+
+def write(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_data_change_recounts_without_a_rebuild(db_copy):
+    catalog = SchemaCatalog(db_copy)
+    try:
+        fingerprint = catalog.get_fingerprint()
+        info_text = catalog.get_table_info()
+        before = catalog.row_count('students')
+        rebuilds = catalog.rebuilds
+
+        write(db_copy, "DELETE FROM students WHERE rowid IN (SELECT rowid FROM students LIMIT 2)")
+        assert catalog.refresh() is False
+        assert catalog.rebuilds == rebuilds
+        assert catalog.get_fingerprint() == fingerprint
+        assert catalog.get_table_info() is info_text
+        assert catalog.row_count('students') == before - 2
+        assert catalog.row_count('no_such_table') is None
+    finally:
+        catalog.close()
+
+
+def test_schema_change_rebuilds(db_copy):
+    catalog = SchemaCatalog(db_copy)
+    try:
+        fingerprint = catalog.get_fingerprint()
+        rebuilds = catalog.rebuilds
+
+        write(db_copy, "CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+        assert catalog.refresh() is True
+        assert catalog.rebuilds == rebuilds + 1
+        assert catalog.get_fingerprint() != fingerprint
+        assert catalog.row_count('notes') == 0
+    finally:
+        catalog.close()
@@ -0,0 +1,46 @@
+"""Schema pruning: the prompt keeps the tables a question needs plus their foreign-key parents"""
+
+import pytest
+
+from schema_pruning import SchemaPruner, estimate_tokens
+
+
+@pytest.fixture(scope='module')
+def pruner(catalog):
+    return SchemaPruner(catalog)
+
+
+def test_foreign_keys_are_inferred_from_id_columns(pruner):
+    assert pruner.foreign_keys() == {
+        'performance': {'student_id': 'students'},
+        'submissions': {'homework_id': 'homework', 'student_id': 'students'},
+    }
+
+
+def test_matched_tables_pull_in_their_parents(pruner):
+    pruned = pruner.prune("Average score in Mathematics by region")
+    assert pruned.pruned
+    assert pruned.matched == {'performance'}
+    assert pruned.tables == ['performance', 'students']
+    # The parent keeps its key, names and scope columns, but not the detail columns
+    assert pruned.columns['students'] == ['student_id', 'student_name', 'grade', 'section', 'region']
+    assert 'students(student_id' in pruned.table_info
+    assert 'student_id INTEGER REFERENCES students(student_id)' in pruned.table_info
+
+
+def test_detail_columns_only_when_named(pruner):
+    assert 'parent_contact' not in pruner.prune("List grade 7 students").columns['students']
+    assert 'parent_contact' in pruner.prune("Show parent contact for grade 7 students").columns['students']
+
+
+def test_admin_table_only_on_request(pruner):
+    assert pruner.prune("List admin users").tables == ['admin_users']
+    assert 'admin_users' not in pruner.prune("Which students submitted homework late?").tables
+
+
+def test_unmatched_question_falls_back_to_the_full_schema(pruner, catalog):
+    pruned = pruner.prune("hello there")
+    assert not pruned.pruned
+    assert 'admin_users' not in pruned.tables
+    assert pruned.table_info == catalog.get_table_info(pruned.tables)
+    assert estimate_tokens(pruner.prune("Upcoming quizzes").table_info) < estimate_tokens(pruned.table_info)
@@ -0,0 +1,89 @@
+"""Region shards: scatter-gather merges give the main database's answer"""
+
+import os
+
+import pytest
+
+import ingest
+from conftest import PROJECT_DIR
+from db_engine import QueryExecutor
+from schema_catalog import SchemaCatalog
+from sharding import ShardRouter, plan_merge
+
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+
+SCATTERED = [
+    "SELECT COUNT(*), SUM(marks_obtained), AVG(marks_obtained) FROM submissions WHERE is_late = 1",
+    "SELECT grade, AVG(attendance_percentage) AS avg_att, COUNT(*) FROM students GROUP BY grade ORDER BY avg_att DESC",
+    "SELECT subject, ROUND(AVG(percentage), 2) avg_pct, MAX(percentage), MIN(percentage) FROM performance "
+    "GROUP BY subject HAVING COUNT(*) > 5 ORDER BY 2 DESC LIMIT 3",
+    "SELECT s.student_name, p.percentage FROM students s JOIN performance p ON s.student_id = p.student_id "
+    "ORDER BY p.percentage DESC, s.student_name LIMIT 7",
+    "SELECT region, COUNT(DISTINCT student_id) n FROM submissions JOIN students USING (student_id) "
+    "GROUP BY region ORDER BY region",
+    "SELECT DISTINCT grade FROM students ORDER BY grade",
+    "SELECT student_name FROM students ORDER BY attendance_percentage DESC, student_id LIMIT 5 OFFSET 3",
+    "SELECT CAST(AVG(percentage) AS INTEGER) FROM performance",
+]
+
+
+@pytest.fixture(scope='module')
+def layout(tmp_path_factory):
+    root = tmp_path_factory.mktemp('shards')
+    main_path = str(root / 'main.db')
+    ingest.ingest(main_path, DATA_DIR)
+    ingest.ingest_shards(str(root / 'shards'), DATA_DIR)
+    catalog = SchemaCatalog(main_path)
+    executor = QueryExecutor(main_path, pool_size=1)
+    router = ShardRouter(str(root / 'shards'), catalog)
+    yield router, executor
+    router.close()
+    executor.close()
+    catalog.close()
+
+
+def normalize(rows):
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+@pytest.mark.parametrize('sql', SCATTERED)
+def test_merged_result_matches_main_database(layout, sql):
+    router, executor = layout
+    route = router.route(sql, sql, None)
+    assert route is not None and route.mode == 'scatter'
+    expected = executor.execute(sql)
+    got, truncated = router.execute(route, sql)
+    assert not truncated
+    assert got.columns == expected.columns
+    assert normalize(got.rows) == normalize(expected.rows)
+
+
+def test_row_cap_on_a_merge_flags_truncation(layout):
+    router, executor = layout
+    sql = "SELECT student_id, student_name FROM students ORDER BY student_id"
+    route = router.route(sql, sql, None)
+    got, truncated = router.execute(route, sql, row_cap=10)
+    assert truncated
+    assert got.rows == executor.execute(sql).rows[:10]
+
+
+def test_single_region_keeps_duplicate_column_names(layout):
+    router, executor = layout
+    sql = ("SELECT s.student_id, p.student_id, p.percentage FROM students s "
+           "JOIN performance p ON s.student_id = p.student_id WHERE s.region = ? ORDER BY p.performance_id")
+    route = router.route(sql, sql, ['North Delhi'])
+    assert route.mode == 'single' and route.regions == ['North Delhi']
+    got, truncated = router.execute(route, sql, ('North Delhi',), row_cap=5)
+    assert truncated
+    assert got.columns == ['student_id', 'student_id', 'percentage']
+    assert got.rows == executor.execute(sql, ('North Delhi',)).rows[:5]
+
+
+def test_cross_shard_queries_stay_on_the_main_database(layout):
+    router, _ = layout
+    subquery = ("SELECT student_name FROM students WHERE attendance_percentage > "
+                "(SELECT AVG(attendance_percentage) FROM students)")
+    assert router.route(subquery, subquery, None) is None
+    joined_off_key = "SELECT COUNT(*) FROM performance p JOIN submissions sub ON p.marks_obtained = sub.marks_obtained"
+    assert router.route(joined_off_key, joined_off_key, None) is None
+    assert plan_merge("SELECT grade, GROUP_CONCAT(student_name) FROM students GROUP BY grade") is None
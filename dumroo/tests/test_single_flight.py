@@ -0,0 +1,110 @@
+"""Single flight: concurrent callers with one key share one call, results and errors alike"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def gated(result=None, error=None):
+    """fn that blocks until released and counts its runs"""
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    return fn, release, runs
+
+
+def let_followers_join():
+    """Followers block on the leader's future; give them time to join before it finishes"""
+    time.sleep(0.1)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(enabled=True)
+    fn, release, runs = gated(result='rows')
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flight.do, 'key', fn) for _ in range(5)]
+        let_followers_join()
+        release.set()
+        outcomes = [future.result() for future in futures]
+    assert len(runs) == 1
+    assert sorted(shared for _, shared in outcomes) == [False, True, True, True, True]
+    assert {result for result, _ in outcomes} == {'rows'}
+    assert flight.in_flight() == 0
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    flight = SingleFlight(enabled=True)
+    fn, release, runs = gated(error=ValueError('boom'))
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flight.do, 'key', fn) for _ in range(3)]
+        let_followers_join()
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert len(runs) == 1
+    assert flight.do('key', lambda: 'fresh') == ('fresh', False)
+
+
+def test_different_keys_and_disabled_flights_run_separately():
+    flight = SingleFlight(enabled=True)
+    assert flight.do('a', lambda: 1) == (1, False)
+    assert flight.do('b', lambda: 2) == (2, False)
+
+    disabled = SingleFlight(enabled=False)
+    fn, release, runs = gated(result='rows')
+    release.set()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        outcomes = list(pool.map(lambda _: disabled.do('key', fn), range(3)))
+    assert len(runs) == 3 and outcomes == [('rows', False)] * 3
+
+
+def test_async_followers_share_and_a_cancelled_follower_leaves_the_call_running():
+    flight = SingleFlight(enabled=True)
+    runs = []
+
+    async def fn():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return 'rows'
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.ado('key', fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.ado('key', fn))
+        quitter = asyncio.ensure_future(flight.ado('key', fn))
+        await asyncio.sleep(0.01)
+        quitter.cancel()
+        return await leader, await follower, quitter.cancelled()
+
+    leader, follower, quitter_cancelled = asyncio.run(scenario())
+    assert leader == ('rows', False) and follower == ('rows', True)
+    assert quitter_cancelled and len(runs) == 1
+
+
+def test_sync_caller_can_wait_on_an_async_leader():
+    flight = SingleFlight(enabled=True)
+    started = threading.Event()
+
+    async def fn():
+        started.set()
+        await asyncio.sleep(0.2)
+        return 'rows'
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(asyncio.run, flight.ado('key', fn))
+        started.wait(5)
+        assert flight.do('key', lambda: 'own') == ('rows', True)
+        assert leader.result() == ('rows', False)
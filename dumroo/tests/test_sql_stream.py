@@ -0,0 +1,42 @@
+"""Streaming SQL extraction: the same statement whatever the chunking"""
+
+import random
+
+import pytest
+
+from sql_stream import SqlStreamExtractor
+
+CASES = [
+    ("SQLQuery: SELECT a FROM t WHERE x = 'a;b';\nSQLResult: blah", "SELECT a FROM t WHERE x = 'a;b'"),
+    ("Here is the query:\n```sql\nSELECT s.student_name\nFROM students s\n```\n\nThis query lists...",
+     "SELECT s.student_name\nFROM students s"),
+    ("SELECT x FROM t\n\nThe query returns x", "SELECT x FROM t"),
+    ("SELECT x\nFROM t\n\nWHERE y = 1", "SELECT x\nFROM t\n\nWHERE y = 1"),
+    ("SELECT x FROM t WHERE y IN\n\n(SELECT y FROM u)", "SELECT x FROM t WHERE y IN\n\n(SELECT y FROM u)"),
+    ("SELECT x FROM t WHERE\n\ns.grade = 'Grade 7'", "SELECT x FROM t WHERE\n\ns.grade = 'Grade 7'"),
+    ("SELECT s.grade, AVG(p.percentage)\nFROM performance p GROUP BY s.grade\n\n(Note the grouping by grade)",
+     "SELECT s.grade, AVG(p.percentage)\nFROM performance p GROUP BY s.grade"),
+    ("SELECT x FROM t\n\n* Returns one row per x", "SELECT x FROM t"),
+    ("SELECT x FROM t\n\n1. Selects x", "SELECT x FROM t"),
+    ("I cannot answer that.", None),
+]
+
+
+def extract(text: str, rng: random.Random):
+    extractor = SqlStreamExtractor()
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 6)
+        got = extractor.feed(text[pos:pos + size])
+        pos += size
+        if got is not None:
+            return got
+    return extractor.finish()
+
+
+@pytest.mark.parametrize('text, expected', CASES)
+def test_statement_is_independent_of_chunking(text, expected):
+    rng = random.Random(1)
+    assert SqlStreamExtractor().feed(text) in (expected, None)
+    for _ in range(100):
+        assert extract(text, rng) == expected